@@ -1,4 +1,26 @@
-from .main import DataService, KnowledgeService, InMemoryDataService, InMemoryKnowledgeService
+from .main import DataService, KnowledgeService, InMemoryDataService, value_order
+from .cid import CID
+from .inmemds import BoundedInMemoryDataService
+from .inmemks import InMemoryKnowledgeService
 from .filebasedds import FileBasedDataService
-from .typers import typers, archive_typers, extractors
+from .typers import typers, archive_typers, extractors, detect, archive_type, extract_recursive
 from .picklefileds import PickleFileBasedDataService
+from .stripeds import StripedDataService
+from .manifest import StatManifest
+from .ingest import ingest, ingest_path, IngestRecord
+from .triples import decode_triple, annotated_subject, migrate_triples, stored_triple_encoding, record_triple_encoding
+from .metrics import Observer, Metrics, ProgressDots
+from .cidindex import CidIndex, page_cids
+from .textindex import TextIndex
+
+
+def __getattr__(name):
+    # the http server and client pull in http.server/http.client, so they're only
+    # imported when used to keep cli startup fast
+    if name == 'CidServer':
+        from .server import CidServer
+        return CidServer
+    if name == 'HttpDataService':
+        from .httpds import HttpDataService
+        return HttpDataService
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,223 @@
+"""
+Copyright © 2025 Joseph Kendall-Morwick
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+# benchmarks for the data services and knowledge service
+#
+#     python -m cidnilib.bench --objects 2000 --sizes 64:0.7,4096:0.25,1048576:0.05 --backend file -o bench.json
+#
+# every run uses a seeded synthetic corpus so results are comparable between commits;
+# results are written as json (one record per measurement) so regressions can be diffed
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable
+
+from .main import DataService, InMemoryDataService
+from .filebasedds import FileBasedDataService
+from .picklefileds import PickleFileBasedDataService
+from .dssplitter import SplitterDataService
+from .stripeds import StripedDataService
+from .inmemks import InMemoryKnowledgeService
+
+
+def parse_sizes(spec: str) -> list[tuple[int, float]]:
+    """parse a size distribution such as '64:0.7,4096:0.3' into (size, weight) pairs"""
+    sizes = []
+    for part in spec.split(','):
+        size, _, weight = part.partition(':')
+        sizes.append((int(size), float(weight or 1)))
+    return sizes
+
+
+def corpus(count: int, sizes: list[tuple[int, float]], seed: int = 0) -> list[bytes]:
+    """generate count distinct objects with sizes drawn from the given distribution"""
+    rng = random.Random(seed)
+    population = [size for size, _ in sizes]
+    weights = [weight for _, weight in sizes]
+    objects = []
+    for i in range(count):
+        size = rng.choices(population, weights)[0]
+        prefix = i.to_bytes(8, 'big')
+        objects.append(prefix + rng.randbytes(max(size - len(prefix), 0)))
+    return objects
+
+
+def timed(operation: Callable[[], object]) -> float:
+    start = time.perf_counter()
+    operation()
+    return time.perf_counter() - start
+
+
+def record(results: list, benchmark: str, backend: str, seconds: float, count: int, nbytes: int = 0, **extra):
+    entry = {
+        'benchmark': benchmark,
+        'backend': backend,
+        'seconds': seconds,
+        'count': count,
+        'ops_per_second': count / seconds if seconds else None,
+    }
+    if nbytes:
+        entry['bytes'] = nbytes
+        entry['mb_per_second'] = nbytes / seconds / 1e6 if seconds else None
+    entry.update(extra)
+    results.append(entry)
+
+
+def backends(root: str) -> dict[str, Callable[[], DataService]]:
+    """factories for each data service backend, each storing under its own directory in root"""
+    def directory(name):
+        path = os.path.join(root, name)
+        os.makedirs(path, exist_ok=True)
+        return path
+    return {
+        'memory': lambda: InMemoryDataService(),
+        'file': lambda: FileBasedDataService(directory('file')),
+        'pickle': lambda: PickleFileBasedDataService(directory('pickle')),
+        'splitter': lambda: SplitterDataService(PickleFileBasedDataService(directory('splitter-small')),
+                                                FileBasedDataService(directory('splitter-large'))),
+        'striped': lambda: StripedDataService([FileBasedDataService(directory('striped%d' % i)) for i in range(4)]),
+    }
+
+
+def flush(ds: DataService):
+    for service in (ds, getattr(ds, 'ds1', None), getattr(ds, 'ds2', None)):
+        if hasattr(service, 'flush'):
+            service.flush()
+
+
+def bench_dataservice(results: list, name: str, ds: DataService, objects: list[bytes]):
+    nbytes = sum(map(len, objects))
+    ids = []
+    record(results, 'know', name, timed(lambda: ids.extend(ds.know_binary(o)[0] for o in objects)), len(objects), nbytes)
+    flush(ds)
+    record(results, 'recall', name, timed(lambda: [ds.recall_binary(i) for i in ids]), len(ids), nbytes)
+    record(results, 'known', name, timed(lambda: [ds.known_binary(i) for i in ids]), len(ids))
+    record(results, 'list', name, timed(lambda: list(ds.list_known_cids())), len(ids))
+
+
+def synthetic_triples(count: int, seed: int = 0) -> list[tuple[str, str, str]]:
+    """triples shaped like those the cli believes: a few properties over many subjects"""
+    rng = random.Random(seed)
+    properties = ['had_path', 'mime_type', 'mime_subtype', 'last_modified', 'HAS_TYPE', 'CONTAINS']
+    subjects = max(count // len(properties), 1)
+    return [('subject%d' % rng.randrange(subjects),
+             properties[i % len(properties)],
+             'value%d' % rng.randrange(subjects)) for i in range(count)]
+
+
+def bench_knowledgeservice(results: list, root: str, triples: list[tuple[str, str, str]], queries: int = 200):
+    path = os.path.join(root, 'knowledge')
+    os.makedirs(path, exist_ok=True)
+    with PickleFileBasedDataService(path, levels=0) as ds:
+        ks = InMemoryKnowledgeService(ds)
+        record(results, 'believe_many', 'pickle', timed(lambda: ks.believe_many(triples)), len(triples))
+
+    # tracing allocations slows python down, so the rebuild is timed and measured in separate runs
+    with PickleFileBasedDataService(path, levels=0) as ds:
+        seconds = timed(lambda: InMemoryKnowledgeService(ds))
+    with PickleFileBasedDataService(path, levels=0) as ds:
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        ks = InMemoryKnowledgeService(ds)
+        after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+    record(results, 'rebuild', 'pickle', seconds, len(triples),
+           bytes_per_triple=(after - before) / max(len(triples), 1))
+
+    rng = random.Random(1)
+    sample = [rng.choice(triples) for _ in range(queries)]
+    shapes = {
+        'spo': lambda s, p, v: (s, p, v),
+        'sp?': lambda s, p, v: (s, p, None),
+        's??': lambda s, p, v: (s, None, None),
+        '?po': lambda s, p, v: (None, p, v),
+        '?p?': lambda s, p, v: (None, p, None),
+        '??o': lambda s, p, v: (None, None, v),
+    }
+    for shape, pattern in shapes.items():
+        patterns = [pattern(*t) for t in (sample if shape not in ('?p?', '??o') else sample[:10])]
+        seconds = timed(lambda: [list(ks.inquire(*p)) for p in patterns])
+        record(results, 'inquire', 'memory', seconds, len(patterns), shape=shape,
+               latency_ms=seconds / len(patterns) * 1000)
+
+
+def bench_cli_startup(results: list, root: str, runs: int = 5):
+    """time cold starts of `cidni list` on an empty store (skipped if the cli isn't installed)"""
+    store = os.path.join(root, 'cli')
+    os.makedirs(store, exist_ok=True)
+    env = {**os.environ, 'PYTHONPATH': os.pathsep.join(sys.path)}
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        done = subprocess.run([sys.executable, '-m', 'cidni', '--dataservice', store, 'list'],
+                              capture_output=True, env=env)
+        timings.append(time.perf_counter() - start)
+        if done.returncode != 0:
+            return
+    record(results, 'cli_startup', 'file', min(timings), 1, mean_seconds=sum(timings) / len(timings))
+
+
+def run(objects: int = 1000, sizes: str = '64:0.7,1024:0.25,8192:0.05', triples: int = 10000,
+        backend_names: list[str] | None = None, seed: int = 0, cli: bool = True) -> dict:
+    """run the benchmark suite, returning the results as a json-serializable dict"""
+    results = []
+    data = corpus(objects, parse_sizes(sizes), seed)
+    with tempfile.TemporaryDirectory() as root:
+        factories = backends(root)
+        for name in backend_names or list(factories):
+            ds = factories[name]()
+            bench_dataservice(results, name, ds, data)
+            flush(ds)
+        bench_knowledgeservice(results, root, synthetic_triples(triples, seed))
+        if cli:
+            bench_cli_startup(results, root)
+    return {
+        'meta': {
+            'timestamp': time.time(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'objects': objects,
+            'sizes': sizes,
+            'triples': triples,
+            'seed': seed,
+        },
+        'results': results,
+    }
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description='benchmark cidnilib data and knowledge services')
+    parser.add_argument('--objects', type=int, default=1000, help='number of objects in the synthetic corpus')
+    parser.add_argument('--sizes', default='64:0.7,1024:0.25,8192:0.05', help='object size distribution as size:weight,...')
+    parser.add_argument('--triples', type=int, default=10000, help='number of triples for knowledge service benchmarks')
+    parser.add_argument('--backend', action='append', dest='backends', help='only benchmark this backend (repeatable)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-cli', action='store_true', help='skip the cli cold-start benchmark')
+    parser.add_argument('-o', '--output', help='write results to this file instead of stdout')
+    args = parser.parse_args(argv)
+    report = run(args.objects, args.sizes, args.triples, args.backends, args.seed, not args.no_cli)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as fp:
+            fp.write(text)
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""
+Copyright © 2025 Joseph Kendall-Morwick
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+# content ids and their base58 text form
+#
+# ids move between their binary (multihash) and base58 forms on nearly every operation,
+# so the conversions are memoized for id-sized values and done a chunk of digits at a
+# time rather than with a big-integer division per digit. the text is identical to
+# that of multihash.to_b58_string (the bitcoin alphabet, a '1' per leading zero byte).
+
+from functools import lru_cache
+
+ALPHABET = '123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz'
+PAIRS = [a + b for a in ALPHABET for b in ALPHABET]    # 58 ** 2 two digit strings
+PAIR_VALUES = {pair: i for i, pair in enumerate(PAIRS)}
+DIGIT_VALUES = {digit: i for i, digit in enumerate(ALPHABET)}
+CHUNK = 10                  # digits converted per big-integer operation (58 ** 10 < 2 ** 63)
+CHUNK_BASE = 58 ** CHUNK
+MEMO_SIZE = 65536           # ids remembered in each direction
+MEMO_LIMIT = 128            # longest value (in bytes or characters) memoized; stored data isn't
+
+
+def b58encode(data: bytes) -> str:
+    n = int.from_bytes(data, 'big')
+    digits = []
+    while n >= CHUNK_BASE:
+        n, chunk = divmod(n, CHUNK_BASE)
+        for _ in range(CHUNK // 2):
+            chunk, pair = divmod(chunk, 3364)
+            digits.append(PAIRS[pair])
+    while n:
+        n, pair = divmod(n, 3364)
+        digits.append(PAIRS[pair])
+    zeros = len(data) - len(data.lstrip(b'\0'))
+    return '1' * zeros + ''.join(reversed(digits)).lstrip('1')
+
+
+def b58decode(text: str) -> bytes:
+    digits = text.lstrip('1')
+    n = 0
+    head = len(digits) % CHUNK
+    values = PAIR_VALUES
+    try:
+        for digit in digits[:head]:
+            n = n * 58 + DIGIT_VALUES[digit]
+        for i in range(head, len(digits), CHUNK):
+            c = digits[i:i + CHUNK]
+            n = n * CHUNK_BASE + ((((values[c[0:2]] * 3364 + values[c[2:4]]) * 3364 + values[c[4:6]])
+                                   * 3364 + values[c[6:8]]) * 3364 + values[c[8:10]])
+    except KeyError:
+        raise ValueError('invalid base58 string {text!r}'.format(text=text[:64])) from None
+    zeros = len(text) - len(digits)
+    return b'\0' * zeros + n.to_bytes((n.bit_length() + 7) // 8, 'big')
+
+
+_memo_encode = lru_cache(MEMO_SIZE)(b58encode)
+_memo_decode = lru_cache(MEMO_SIZE)(b58decode)
+
+
+def to_b58_string(id: 'bytes|CID') -> str:
+    """the base58 text of a binary id (drop-in for multihash.to_b58_string)"""
+    if type(id) is CID:
+        return id.text
+    if not isinstance(id, bytes):
+        raise TypeError('id should be bytes, not {type}'.format(type=type(id)))
+    return _memo_encode(id) if len(id) <= MEMO_LIMIT else b58encode(id)
+
+
+def from_b58_string(text: 'str|CID') -> bytes:
+    """the binary id of base58 text (drop-in for multihash.from_b58_string)"""
+    if type(text) is CID:
+        return text.binary
+    if not isinstance(text, str):
+        raise TypeError('id should be str, not {type}'.format(type=type(text)))
+    return _memo_decode(text) if len(text) <= MEMO_LIMIT else b58decode(text)
+
+
+class CID:
+    """a content id holding its binary and base58 text forms, each converted at most once
+
+        data services accept a CID wherever they accept a binary or text id. CIDs are
+        equal (and hash alike) when their binary forms are, and sort by their text as
+        paged listings do. use CID.of to share one instance per id"""
+
+    __slots__ = ('_binary', '_text')
+
+    def __init__(self, binary: bytes | None = None, text: str | None = None):
+        if binary is None and text is None:
+            raise ValueError('a CID needs its binary or text form')
+        self._binary = binary
+        self._text = text
+
+    @classmethod
+    def of(cls, id: 'CID|bytes|str') -> 'CID':
+        """the CID for a binary or text id, reusing the instance of recently seen ids
+
+            instances are shared by binary form, so an id given as text and as bytes
+            gets the same one (text is decoded through the memoized codec)"""
+        if type(id) is cls:
+            return id
+        if isinstance(id, str):
+            cid = _intern(from_b58_string(id))
+            if cid._text is None:
+                cid._text = id
+            return cid
+        if isinstance(id, bytes):
+            return _intern(id)
+        raise TypeError('id should be bytes or str, not {type}'.format(type=type(id)))
+
+    @property
+    def binary(self) -> bytes:
+        if self._binary is None:
+            self._binary = from_b58_string(self._text)
+        return self._binary
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = to_b58_string(self._binary)
+        return self._text
+
+    def __bytes__(self):
+        return self.binary
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return 'CID({text!r})'.format(text=self.text)
+
+    def __eq__(self, other):
+        if type(other) is CID:
+            return self.binary == other.binary
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.binary)
+
+    def __lt__(self, other):
+        if type(other) is CID:
+            return self.text < other.text
+        return NotImplemented
+
+
+@lru_cache(MEMO_SIZE)
+def _intern(binary: bytes) -> CID:
+    return CID(binary=binary)
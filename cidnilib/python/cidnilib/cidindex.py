@@ -0,0 +1,232 @@
+"""
+Copyright © 2025 Joseph Kendall-Morwick
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+from bisect import bisect_left, bisect_right
+from collections.abc import Callable, Iterable
+from contextlib import contextmanager
+from heapq import merge
+import os
+import threading
+
+from .locks import file_lock, lock_path, owner_alive, owner_tag
+
+INDEX_NAME = 'cids.idx'
+
+
+def page_cids(cids: list[str], prefix: str | None = None, after: str | None = None,
+              limit: int | None = None) -> list[str]:
+    """select from sorted encoded cids those starting with prefix that sort after the cursor
+
+        after is the last cid of the previous page (exclusive), limit the page size"""
+    start = bisect_right(cids, after) if after else 0
+    if prefix:
+        start = max(start, bisect_left(cids, prefix))
+    end = len(cids) if limit is None else min(len(cids), start + limit)
+    page = cids[start:end]
+    if prefix and page and not page[-1].startswith(prefix):
+        page = page[:bisect_right(page, prefix + '\U0010ffff')]
+    return page
+
+
+def scan_parallel(roots: Iterable[str], scan: Callable[[str], list[str]], workers: int | None = None) -> list[str]:
+    """run scan over each shard root in a thread pool and gather the cids found"""
+    roots = list(roots)
+    if len(roots) < 2:
+        return [cid for root in roots for cid in scan(root)]
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(workers) as pool:
+        return [cid for cids in pool.map(scan, roots) for cid in cids]
+
+
+def shard_dirs(path: str, levels: int) -> list[str]:
+    """the top level shard directories of a store (or the store itself without levels)"""
+    if levels == 0:
+        return [path]
+    with os.scandir(path) as entries:
+        return [entry.path for entry in entries if entry.is_dir() and not entry.name.startswith('.')]
+
+
+class CidIndex:
+    """a sorted index of the encoded cids in a store, persisted at path
+
+        the index file holds the cids known when it was last compacted, one per line in
+        sorted order. cids added ('+') or removed ('-') since then are appended to a log
+        alongside it, so keeping the index current costs a line per change rather than
+        a rewrite. changes are appended in batches of flush_every (and on flush), so other
+        processes may list a store slightly behind its writers. the index is only read
+        (and the log folded into it) when listing.
+
+        changes made to the store (see changing) but not logged yet are covered by a
+        marker file naming the writing process. if it dies before logging them the
+        marker stays behind, and recover drops the index to have it rebuilt by a scan."""
+
+    def __init__(self, path: str, compact_bytes: int = 16 * 1048576, flush_every: int = 256):
+        self.path = path
+        self.log_path = path + '.log'
+        self.compact_bytes = compact_bytes
+        self.flush_every = flush_every
+        self.pending = []
+        self._cids = None
+        self._changes = []
+        self._lock = threading.RLock()
+        self.marker = path + '.' + owner_tag() + '.dirty'
+        self.marked = False
+        self.in_flight = 0      # changes being made to the store, not recorded yet
+        self.active = os.path.exists(path)
+        self.log_size = os.path.getsize(self.log_path) if os.path.exists(self.log_path) else 0
+
+    def build(self, cids: Iterable[str]) -> None:
+        """replace the index with the given cids (e.g. from a scan of the store)"""
+        with self._lock:
+            self.pending = []
+            self._changes = []
+            self._cids = sorted(set(cids))
+            with file_lock(self.path):
+                self._write()
+            self.active = True
+
+    def create_if_empty(self, store: str) -> None:
+        """start an empty index for a store with nothing in it yet"""
+        if self.active:
+            return
+        lock = os.path.basename(lock_path(self.path))
+        with self._lock:
+            with file_lock(self.path):
+                self.active = os.path.exists(self.path)
+                if not self.active and not [name for name in os.listdir(store) if name != lock]:
+                    self._cids = []
+                    self._write()
+                    self.active = True
+
+    def recover(self) -> bool:
+        """drop the index if a writer died with changes it hadn't logged, returning whether it did"""
+        head, name = os.path.split(self.path)
+        stale = [entry for entry in os.listdir(head or '.')
+                 if entry.startswith(name + '.') and entry.endswith('.dirty')
+                 and owner_alive(entry[len(name) + 1:-len('.dirty')]) is False]
+        if not stale:
+            return False
+        with self._lock:
+            with file_lock(self.path):
+                for path in [self.path, self.log_path] + [os.path.join(head, entry) for entry in stale]:
+                    if os.path.exists(path):
+                        os.remove(path)
+            self.active = False
+            self._cids = None
+            self.pending = []
+        return True
+
+    @contextmanager
+    def changing(self):
+        """wrap a change to the store that is recorded with add or discard inside the block
+
+            the marker is in place before the store changes and only removed once the
+            change is logged"""
+        with self._lock:
+            self.in_flight += 1
+            if not self.marked:
+                open(self.marker, 'w').close()
+                self.marked = True
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def add(self, cid: str) -> None:
+        self._change('+', cid)
+
+    def discard(self, cid: str) -> None:
+        self._change('-', cid)
+
+    def _change(self, op: str, cid: str) -> None:
+        with self._lock:
+            self.pending.append(op + cid + '\n')
+            if self._cids is not None:
+                self._changes.append((op, cid))
+            if len(self.pending) >= self.flush_every:
+                self.flush()
+
+    def flush(self) -> None:
+        """append pending changes to the log, compacting it once it grows large"""
+        if not self.pending and not self.marked:
+            return
+        self.flush_log()
+        if self.log_size > self.compact_bytes:
+            self.compact()
+
+    def flush_log(self) -> None:
+        with self._lock:
+            if self.pending:
+                with file_lock(self.path):
+                    # changes are dropped while the store has no index; it is built by a scan
+                    self.active = self.active or os.path.exists(self.path)
+                    if self.active:
+                        with open(self.log_path, 'a') as fp:
+                            fp.write(''.join(self.pending))
+                        self.log_size = os.path.getsize(self.log_path)
+                self.pending = []
+            if self.marked and not self.in_flight:
+                if os.path.exists(self.marker):
+                    os.remove(self.marker)
+                self.marked = False
+
+    def cids(self) -> list[str]:
+        """all indexed cids in sorted order"""
+        with self._lock:
+            if self._cids is None:
+                with file_lock(self.path, shared=True):
+                    self._load()
+            return self._fold()
+
+    def _load(self):
+        with open(self.path) as fp:
+            self._cids = fp.read().split()
+        self._changes = []
+        if os.path.exists(self.log_path):
+            with open(self.log_path) as fp:
+                self._changes = [(line[0], line[1:].rstrip('\n')) for line in fp if len(line) > 1]
+        self._changes += [(line[0], line[1:-1]) for line in self.pending]
+
+    def _fold(self) -> list[str]:
+        if self._changes:
+            state = dict()
+            for op, cid in self._changes:
+                state[cid] = op
+            self._changes = []
+            kept = [cid for cid in self._cids if state.get(cid) != '-']
+            added = sorted(cid for cid, op in state.items() if op == '+' and not self._contains(cid))
+            self._cids = list(merge(kept, added))
+        return self._cids
+
+    def _contains(self, cid: str) -> bool:
+        i = bisect_left(self._cids, cid)
+        return i < len(self._cids) and self._cids[i] == cid
+
+    def page(self, prefix: str | None = None, after: str | None = None, limit: int | None = None) -> list[str]:
+        return page_cids(self.cids(), prefix, after, limit)
+
+    def compact(self) -> None:
+        """fold the log (including changes logged by other processes) into the index file"""
+        self.flush_log()
+        with self._lock:
+            with file_lock(self.path):
+                self._load()
+                self._fold()
+                self._write()
+
+    def _write(self):
+        temp = self.path + '.tmp'
+        with open(temp, 'w') as fp:
+            fp.writelines(cid + '\n' for cid in self._cids)
+        os.replace(temp, self.path)
+        if os.path.exists(self.log_path):
+            os.remove(self.log_path)
+        self.log_size = 0
@@ -9,6 +9,9 @@ THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR I
 """
 
 from .main import DataService
+from heapq import merge
+from itertools import islice
+from typing import Iterator
 
 
 class SplitterDataService(DataService):
@@ -39,7 +42,12 @@ class SplitterDataService(DataService):
     def forget_binary(self, id:bytes) -> bytes:
         return self.ds1.forget_binary(id) or self.ds2.forget_binary(id)
 
-    def list_known_cids(self) -> Iterator[bytes]:
-        yield from self.ds1.list_known_cids()
-        yield from self.ds2.list_known_cids()
+    def list_known_cids(self, prefix:str|None = None, after:str|None = None, limit:int|None = None) -> Iterator[bytes]:
+        if prefix is None and after is None and limit is None:
+            yield from self.ds1.list_known_cids()
+            yield from self.ds2.list_known_cids()
+            return
+        merged = merge(self.ds1.list_known_cids(prefix, after, limit),
+                       self.ds2.list_known_cids(prefix, after, limit), key=self.encode)
+        yield from islice(merged, limit)
         
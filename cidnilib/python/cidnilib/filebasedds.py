@@ -9,13 +9,23 @@ THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR I
 """
 
 from .main import DataService, KnowledgeService, HashAlgorithm, MultiHashEncoder
+from .cidindex import CidIndex, INDEX_NAME, scan_parallel, shard_dirs
+from .locks import StripedLock, owner_alive, owner_tag
 from collections.abc import Callable
 from typing import BinaryIO, Iterator
-from io import BytesIO
+from io import BytesIO, UnsupportedOperation
+import functools
 import os
+import stat
 import sys
+import tempfile
+import threading
+import time
 from os.path import exists
-from multihash import to_b58_string, from_b58_string
+from .cid import to_b58_string, from_b58_string
+
+durability_modes = ('none', 'group', 'strict')
+STALE_SECONDS = 3600    # temporary files of unknown owners whose inode changed this long ago are abandoned
 
 
 class FileBasedDataService(DataService):
@@ -24,7 +34,23 @@ class FileBasedDataService(DataService):
                  encoder: Callable[[bytes],str] = to_b58_string, 
                  decoder: Callable[[str],bytes] = from_b58_string, 
                  hasher: Callable[[],HashAlgorithm] = MultiHashEncoder,
-                 levels: int = 2):  
+                 levels: int = 2,
+                 durability: str = 'none',
+                 group_files: int = 1000,
+                 group_seconds: float = 1.0):  
+        """durability decides when stored data is forced to disk (data is always written to a
+            temporary file renamed into place, so no partial file is ever visible):
+
+                'none'    the operating system writes data back when it chooses
+                'group'   files are synced to disk together (with one syncfs of the store's
+                          filesystem on linux, else an fsync each) and renamed into place,
+                          after which their directories are synced, once group_files are
+                          waiting or group_seconds after the first (and on flush/close).
+                          until then they're served from their temporary files; a crash
+                          loses at most the uncommitted group, never leaving a truncated
+                          file in place. temporary files a crashed process left behind are
+                          removed when a store is opened (see sweep_temporary_files)
+                'strict'  every file and its directory is fsynced before know returns"""
         if not os.path.exists(path):
             raise ValueError('Path {path} does not exist.'.format(path=path))
             
@@ -32,6 +58,39 @@ class FileBasedDataService(DataService):
         super().__init__(encoder, decoder, hasher)
         self.path = path
         self.levels = levels
+        self.locks = StripedLock()  # by id; guards checking for and placing a file
+        self.index = CidIndex(os.path.join(path, INDEX_NAME))
+        self.index.recover()                # rescanned if a writer died with unlogged changes
+        self.index.create_if_empty(path)    # a new store can be indexed from the start
+        if durability not in durability_modes:
+            raise ValueError('durability must be one of {modes}'.format(modes=', '.join(durability_modes)))
+        self.durability = durability
+        self.group_files = group_files
+        self.group_seconds = group_seconds
+        self.pending = dict()               # id -> temporary file awaiting the next group commit
+        self.pending_lock = threading.Lock()
+        self.commit_lock = threading.Lock()
+        self.timer = None
+        self.sweep_temporary_files()
+
+    def sweep_temporary_files(self) -> int:
+        """remove temporary files abandoned by processes that died, returning how many
+
+            temporary files are named after the process writing them (see temporary_prefix),
+            so those of this host are removed once their process is gone. those of other
+            hosts (or without an owner) are removed once their inode hasn't changed for
+            STALE_SECONDS; the ctime is used as a hardlinked file keeps its source's mtime"""
+        removed = 0
+        cutoff = time.time() - STALE_SECONDS
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                if is_temporary(entry.name) and entry.is_file() and abandoned(entry, cutoff):
+                    try:
+                        os.remove(entry.path)
+                        removed += 1
+                    except FileNotFoundError:
+                        pass
+        return removed
 
     def resolve_path(self, id:str):
         """find file on the path that matches the id if it exists"""
@@ -39,17 +98,100 @@ class FileBasedDataService(DataService):
         for i in range(self.levels):
             subdir += id[-i-1] + '/'
             if not exists(self.path+'/'+subdir):
-                os.mkdir(self.path+'/'+subdir)
+                os.makedirs(self.path+'/'+subdir, exist_ok=True)
         path = self.path+'/'+subdir+id+'.bin' 
         return path
 
     def file_store(self, id:str, data:bytes):
-        """create new file to store data in"""
+        """create new file to store data in
+
+            data is written to a temporary file renamed into place, so readers never
+            see a partially written file"""
+        with tempfile.NamedTemporaryFile(dir=self.path, prefix=temporary_prefix(), suffix='.tmp', delete=False) as tmp:
+            tmp.write(data)
+        self.place(tmp.name, id)
+
+    def stored(self, id:str) -> bool:
+        return id in self.pending or exists(self.resolve_path(id))
+
+    def place(self, tmp:str, id:str) -> None:
+        """move a fully written temporary file into place as the data of id
+
+            called holding self.locks(id) once id is known not to be stored. in group
+            mode the file is left in place until the next commit"""
+        if self.durability == 'group':
+            with self.pending_lock:
+                self.pending[id] = tmp
+                full = len(self.pending) >= self.group_files
+                if not full and self.timer is None:
+                    self.timer = threading.Timer(self.group_seconds, self.commit)
+                    self.timer.start()
+            if full:
+                self.commit()
+            return
+        path = self.resolve_path(id)
+        if self.durability == 'strict':
+            fsync_path(tmp)
+        with self.index.changing():
+            os.replace(tmp, path)
+            self.indexed(id)
+        if self.durability == 'strict':
+            fsync_dir(os.path.dirname(path))
+
+    def commit(self) -> None:
+        """durably place the files stored since the last group commit"""
+        with self.commit_lock:
+            with self.pending_lock:
+                if self.timer is not None:
+                    self.timer.cancel()
+                    self.timer = None
+                batch = list(self.pending.items())
+            if not batch:
+                return
+            fsync_paths([tmp for _, tmp in batch], self.path)
+            directories = set()
+            for id, tmp in batch:
+                path = self.resolve_path(id)
+                with self.pending_lock:
+                    if self.pending.get(id) != tmp:
+                        continue
+                    del self.pending[id]
+                    with self.index.changing():
+                        try:
+                            os.replace(tmp, path)
+                        except FileNotFoundError:    # removed behind our back; the data is lost
+                            continue
+                        self.index.add(id)
+                directories.add(os.path.dirname(path))
+            if os.name != 'nt' and not (len(directories) > 1 and syncfs(self.path)):
+                for directory in directories:
+                    fsync_dir(directory)
+
+    def flush(self) -> None:
+        """commit pending files and save the listing index"""
+        self.commit()
+        self.index.flush()
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def open_data(self, id:str) -> BinaryIO|None:
+        tmp = self.pending.get(id)
+        if tmp is not None:
+            try:
+                return open(tmp, 'rb')
+            except FileNotFoundError:    # committed (or forgotten) meanwhile
+                pass
         path = self.resolve_path(id)
-        if not exists(path):
-            fp = open(path, 'wb')
-            fp.write(data)
-            fp.close()
+        if exists(path):
+            return open(path, 'rb')
 
 
 
@@ -59,71 +201,293 @@ class FileBasedDataService(DataService):
         m = self.hasher()
         m.update(data)
         id = self.encode(m.digest())
-        if not exists(self.resolve_path(id)):
+        with self.locks(id):
+            if self.stored(id):
+                return self.decode(id), False
             self.file_store(id, data)
-            return self.decode(id), True
-        else:
-            return self.decode(id), False
+        return self.decode(id), True
 
     def known_binary(self, id:bytes):
-        return exists(self.resolve_path(self.encode(id)))
+        return self.stored(self.encode(id))
         
     def recall_binary(self, id:bytes):
         """retrieve data associated with name"""
-        path = self.resolve_path(self.encode(id))
-        if exists(path):
-            fp = open(path, 'rb')
-            data = fp.read()
-            fp.close()
-            return data
+        fp = self.open_data(self.encode(id))
+        if fp is not None:
+            with fp:
+                return fp.read()
 
     def forget_binary(self, id:bytes):
         """forget data associated with name"""
-        path = self.resolve_path(self.encode(id))
-        if exists(path):
-            os.remove(path)
+        key = self.encode(id)
+        path = self.resolve_path(key)
+        with self.locks(key):
+            with self.pending_lock:
+                tmp = self.pending.pop(key, None)
+            if tmp is not None:
+                os.remove(tmp)
+            elif exists(path):
+                with self.index.changing():
+                    os.remove(path)
+                    self.index.discard(key)
+
+    def indexed(self, id:str):
+        """record a newly stored cid in the listing index (saved in batches, see CidIndex)"""
+        self.index.add(id)
+
+    def list_known_cids(self, prefix:str|None = None, after:str|None = None, limit:int|None = None) -> Iterator[bytes]:
+        """Yield known CIDs in order of their encoded form (see DataService.list_known_cids)
 
-    def list_known_cids(self) -> Iterator[str]:
-        """Yield all known CIDs"""
-        for root, dirs, files in os.walk(self.path):
-            for file in files:
-                if file.endswith('.bin'):
-                    yield self.decode(file[:-4])  # Strip ".bin" to get the CID
+            the store is scanned (one thread per top level shard) only if it has no
+            listing index yet, and the index is built from that scan"""
+        self.commit()
+        if not self.index.active:
+            self.index.build(scan_parallel(shard_dirs(self.path, self.levels), self.scan_shard))
+        yield from map(self.decode, self.index.page(prefix, after, limit))
+
+    def scan_shard(self, root:str) -> list[str]:
+        """the encoded cids of the files stored under a shard directory"""
+        cids = []
+        with os.scandir(root) as entries:
+            for entry in entries:
+                if entry.name.endswith('.bin') and not entry.name.startswith('.'):
+                    cids.append(entry.name[:-4])  # Strip ".bin" to get the CID
+                elif root != self.path and entry.is_dir():
+                    cids += self.scan_shard(entry.path)
+        return cids
 
 
 
     def know_file(self, fp:BinaryIO):
-        m = self.hasher()
-        while True:
-            data = fp.read(104857600)
-            if not data:
-                break
-            m.update(data)
-            print(".", end="", flush=True, file=sys.stderr)
-        digest = m.digest()
-        id = self.encode(digest)
-        path = self.resolve_path(id)
-        if not exists(path):
-            fp.seek(0)
-            fpo = open(path, 'wb')
+        """remember data read from fp, hashing and writing it in a single pass
+
+            data is streamed to a temporary file in the store which is renamed into place
+            once the cid is known (or discarded if the data was already stored). seekable
+            input is hashed first instead, and only copied if it isn't stored yet"""
+        start = seekable_start(fp)
+        if start is not None:
+            m = self.hasher()
             while True:
                 data = fp.read(104857600)
                 if not data:
                     break
-                fpo.write(data)
-                print(".", end="", flush=True, file=sys.stderr)
-            fpo.close()
+                m.update(data)
+                self.progress("know_file", len(data))
+            id = self.encode(m.digest())
+            if self.stored(id):
+                return self.decode(id), False
+            fp.seek(start)
+        m = self.hasher()    # hashed again as it's copied, in case the input changed
+        tmp = tempfile.NamedTemporaryFile(dir=self.path, prefix=temporary_prefix(), suffix='.tmp', delete=False)
+        placed = False
+        try:
+            with tmp:
+                while True:
+                    data = fp.read(104857600)
+                    if not data:
+                        break
+                    m.update(data)
+                    tmp.write(data)
+                    if start is None:
+                        self.progress("know_file", len(data))
+            id = self.encode(m.digest())
+            with self.locks(id):
+                if self.stored(id):
+                    return self.decode(id), False
+                self.place(tmp.name, id)
+                placed = True
             return self.decode(id), True
-        else:
-            return self.decode(id), False
+        finally:
+            if not placed and exists(tmp.name):
+                os.remove(tmp.name)
             
 
+    def know_path(self, path:str, link:str|None = None):
+        """remember data in the file at path, linking rather than copying it if requested
+
+            with link='reflink' the file is cloned into the store, sharing its blocks
+            copy-on-write, so later changes to the source don't alter the stored data.
+            with link='hardlink' the store and the source share the inode: once the link
+            is placed the file (and so the source) is made read-only, but a source made
+            writable again still changes the stored data. the data is hashed after
+            linking. if linking isn't possible (e.g. across devices) the data is copied."""
+        if link not in ('reflink', 'hardlink'):
+            return super().know_path(path, link)
+        tmp = os.path.join(self.path, '{prefix}{name}.tmp'.format(prefix=temporary_prefix(), name=os.urandom(8).hex()))
+        try:
+            if link == 'hardlink':
+                os.link(path, tmp)
+            else:
+                with open(path, 'rb') as fin, open(tmp, 'wb') as fout:
+                    if not reflink(fin.fileno(), fout.fileno()):
+                        raise OSError('reflink not supported')
+        except OSError:
+            if exists(tmp):
+                os.remove(tmp)
+            return super().know_path(path)
+        placed = False
+        try:
+            m = self.hasher()
+            with open(tmp, 'rb') as fp:
+                while True:
+                    data = fp.read(104857600)
+                    if not data:
+                        break
+                    m.update(data)
+                    self.progress("know_path", len(data))
+            id = self.encode(m.digest())
+            with self.locks(id):
+                if self.stored(id):
+                    return self.decode(id), False
+                if link == 'hardlink':    # only once it's stored, as the source shares the mode
+                    os.chmod(tmp, os.stat(tmp).st_mode & ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+                self.place(tmp, id)
+                placed = True
+            return self.decode(id), True
+        finally:
+            if not placed and exists(tmp):
+                os.remove(tmp)
+
     def recall_stream(self, id:bytes|str):
         """retrieve data associated with name"""
-        if type(id) == bytes: id = self.encode(id)
-        path = self.resolve_path(id)
+        if type(id) != str: id = self.encode(self.binary(id))
+        return self.open_data(id)
 
-        if exists(path):
-            fp = open(path, 'rb')
-            return fp
+    def recall_file(self, id:bytes|str, fp:BinaryIO) -> int|None:
+        """write data associated with id to fp without copying it through python
+
+            when fp is backed by a file descriptor the data is cloned (reflink) if fp is an 
+            empty regular file on a filesystem supporting it, otherwise copied in the kernel 
+            with copy_file_range or sendfile. other streams are written in chunks."""
+        try:
+            out_fd = fp.fileno()
+        except (AttributeError, OSError, UnsupportedOperation):
+            return super().recall_file(id, fp)
+        fin = self.recall_stream(id)
+        if fin is None:
+            return None
+        with fin:
+            fp.flush()
+            in_fd = fin.fileno()
+            size = os.fstat(in_fd).st_size
+            if reflink(in_fd, out_fd):
+                os.lseek(out_fd, size, os.SEEK_SET)
+                return size
+            offset = 0
+            for copy in kernel_copies:
+                try:
+                    while offset < size:
+                        n = copy(in_fd, out_fd, offset, size - offset)
+                        if n == 0:
+                            break
+                        offset += n
+                    break
+                except OSError:
+                    continue
+            fin.seek(offset)
+            while True:
+                data = fin.read(1048576)
+                if not data:
+                    break
+                offset += len(data)
+                while data:
+                    data = data[os.write(out_fd, data):]
+            return offset
+
+
+def fsync_path(path:str) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def fsync_dir(path:str) -> None:
+    """make renames into the directory at path durable (not possible, nor needed, on windows)"""
+    if os.name != 'nt':
+        fsync_path(path)
+
+
+def fsync_paths(paths:list[str], root:str) -> None:
+    """force the data of several files under root to disk, with a single syncfs where possible"""
+    if len(paths) > 1 and syncfs(root):
+        return
+    for path in paths:
+        try:
+            fsync_path(path)
+        except FileNotFoundError:    # forgotten meanwhile
+            pass
+
+
+@functools.cache
+def _libc():
+    import ctypes
+    return ctypes.CDLL(None, use_errno=True)
+
+
+def syncfs(path:str) -> bool:
+    """flush all data written to the filesystem holding path in one call
+
+        cheaper than an fsync per file for a batch, but also flushes whatever else is
+        waiting to be written to that filesystem. returns False where syncfs isn't
+        available (it's linux only)"""
+    if not sys.platform.startswith('linux'):
+        return False
+    try:
+        syncfs = _libc().syncfs
+        fd = os.open(path, os.O_RDONLY)
+    except (OSError, AttributeError):
+        return False
+    try:
+        return syncfs(fd) == 0
+    finally:
+        os.close(fd)
+
+
+def is_temporary(name:str) -> bool:
+    """whether name is that of a temporary file written while storing data"""
+    return name.endswith('.tmp') and (name.startswith('.') or name.startswith('tmp'))
+
+
+def seekable_start(fp:BinaryIO) -> int|None:
+    """the position fp can be rewound to after reading it, or None if it can't be"""
+    try:
+        return fp.tell() if fp.seekable() else None
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def temporary_prefix() -> str:
+    """the start of the names of the temporary files written by this process: .<pid>-<host>."""
+    return '.' + owner_tag() + '.'
+
+
+def abandoned(entry:os.DirEntry, cutoff:float) -> bool:
+    """whether the temporary file entry was left behind by a process that died"""
+    alive = owner_alive(entry.name[1:].split('.', 1)[0])
+    if alive is not None:
+        return not alive
+    return entry.stat().st_ctime < cutoff
+
+
+FICLONE = 0x40049409
+
+def reflink(in_fd:int, out_fd:int) -> bool:
+    """clone in_fd into out_fd if out_fd is an empty regular file on a filesystem with reflinks"""
+    if not sys.platform.startswith('linux'):
+        return False
+    st = os.fstat(out_fd)
+    if not stat.S_ISREG(st.st_mode) or st.st_size or os.lseek(out_fd, 0, os.SEEK_CUR):
+        return False
+    try:
+        import fcntl
+        fcntl.ioctl(out_fd, FICLONE, in_fd)
+        return True
+    except OSError:
+        return False
 
+kernel_copies = []
+if hasattr(os, 'copy_file_range'):
+    kernel_copies.append(lambda in_fd, out_fd, offset, count: os.copy_file_range(in_fd, out_fd, count, offset))
+if hasattr(os, 'sendfile'):
+    kernel_copies.append(lambda in_fd, out_fd, offset, count: os.sendfile(out_fd, in_fd, offset, count))
@@ -0,0 +1,200 @@
+"""
+Copyright © 2025 Joseph Kendall-Morwick
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import contextmanager
+from http.client import HTTPConnection, HTTPException
+from io import UnsupportedOperation
+from typing import BinaryIO
+from urllib.parse import quote, urlencode, urlsplit
+import json
+import os
+import queue
+
+from .cid import to_b58_string, from_b58_string
+
+from .main import DataService, HashAlgorithm, MultiHashEncoder
+from .sync import SHARD_DEPTH
+
+
+class ConnectionPool:
+    """keeps up to size idle keep-alive connections to one http server for reuse"""
+
+    def __init__(self, host: str, port: int, size: int = 8, timeout: float | None = 60):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.idle = queue.LifoQueue(size)
+        self.created = 0
+
+    def acquire(self) -> HTTPConnection:
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            self.created += 1
+            return HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def release(self, conn: HTTPConnection) -> None:
+        try:
+            self.idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    @contextmanager
+    def response(self, method: str, path: str, body=None, headers: dict | None = None):
+        """send a request, yielding the response; the connection is reused once it's read
+
+            a request failing on an idle connection the server has since closed is
+            retried once on a new connection"""
+        for attempt in (0, 1):
+            conn = self.acquire()
+            reused = conn.sock is not None
+            try:
+                conn.request(method, path, body=body, headers=headers or {})
+                response = conn.getresponse()
+                break
+            except (ConnectionError, HTTPException):
+                conn.close()
+                if not reused or attempt or (body is not None and not isinstance(body, bytes)):
+                    raise
+        try:
+            yield response
+        except BaseException:
+            conn.close()
+            raise
+        if response.isclosed() and not response.will_close:
+            self.release(conn)
+        else:
+            conn.close()
+
+    def request(self, method: str, path: str, body=None, headers: dict | None = None) -> tuple[int, bytes]:
+        with self.response(method, path, body, headers) as response:
+            return response.status, response.read()
+
+    def close(self) -> None:
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class HttpDataService(DataService):
+    """a data service stored by a `cidni serve` server at url"""
+
+    def __init__(self,
+                 url: str,
+                 encoder: Callable[[bytes],str] = to_b58_string,
+                 decoder: Callable[[str],bytes] = from_b58_string,
+                 hasher: Callable[[],HashAlgorithm] = MultiHashEncoder,
+                 pool_size: int = 8):
+        super().__init__(encoder, decoder, hasher)
+        parts = urlsplit(url)
+        self.url = url
+        self.base = parts.path.rstrip('/')     # e.g. /knowledge for the server's triple store
+        self.pool = ConnectionPool(parts.hostname, parts.port or 80, pool_size)
+
+    def cid_url(self, id: bytes) -> str:
+        return self.base + '/cid/' + quote(self.encode(id))
+
+    def get(self, path: str) -> bytes:
+        status, data = self.pool.request('GET', self.base + path)
+        if status != 200:
+            raise IOError(f'GET {self.base + path} failed with status {status}')
+        return data
+
+    def put(self, path: str, body, length: int) -> tuple[bytes, bool]:
+        status, data = self.pool.request('PUT', path, body, {'Content-Length': str(length)})
+        if status not in (200, 201):
+            raise IOError(f'PUT {path} failed with status {status}: {data[:200]!r}')
+        return self.decode(data.decode('ascii')), status == 201
+
+    def know_binary(self, data: bytes):
+        return self.put(self.base + '/cid', data, len(data))
+
+    def know_file(self, fp: BinaryIO):
+        """remember data read from fp, streaming regular files to the server without reading them"""
+        try:
+            length = os.fstat(fp.fileno()).st_size - fp.tell()
+        except (AttributeError, OSError, UnsupportedOperation):
+            return self.know_binary(fp.read())
+        return self.put(self.base + '/cid', fp, length)
+
+    def known_binary(self, id: bytes) -> bool:
+        status, _ = self.pool.request('HEAD', self.cid_url(id))
+        return status == 200
+
+    def recall_binary(self, id: bytes):
+        status, data = self.pool.request('GET', self.cid_url(id))
+        return data if status == 200 else None
+
+    def recall_range(self, id: bytes, offset: int, length: int) -> bytes | None:
+        """retrieve length bytes of the data associated with id, starting at offset"""
+        status, data = self.pool.request('GET', self.cid_url(id), headers={'Range': f'bytes={offset}-{offset + length - 1}'})
+        if status == 206:
+            return data
+        if status == 200:
+            return data[offset:offset + length]
+        return b'' if status == 416 else None
+
+    def recall_file(self, id: bytes|str, fp: BinaryIO) -> int|None:
+        """write data associated with id to fp as it arrives from the server"""
+        id = self.binary(id)
+        with self.pool.response('GET', self.cid_url(id)) as response:
+            if response.status != 200:
+                response.read()
+                return None
+            size = 0
+            while True:
+                data = response.read(1048576)
+                if not data:
+                    return size
+                fp.write(data)
+                size += len(data)
+
+    def forget_binary(self, id: bytes):
+        status, data = self.pool.request('DELETE', self.cid_url(id))
+        if status not in (204, 404):
+            raise IOError(f'DELETE {self.cid_url(id)} failed with status {status}: {data[:200]!r}')
+
+    def list_known_cids(self, prefix: str|None = None, after: str|None = None, limit: int|None = None) -> Iterator[bytes]:
+        """Yield known CIDs, fetching them from the server a page at a time"""
+        page_size = 10000
+        while limit is None or limit > 0:
+            size = page_size if limit is None else min(page_size, limit)
+            query = {'limit': size, **({'prefix': prefix} if prefix else {}), **({'after': after} if after else {})}
+            cids = self.get('/cid?' + urlencode(query)).decode('ascii').split()
+            yield from map(self.decode, cids)
+            if len(cids) < size:
+                return
+            after = cids[-1]
+            if limit is not None:
+                limit -= len(cids)
+
+    def shard_digests(self, depth: int = SHARD_DEPTH) -> dict[str, str]:
+        """shard digests computed by the server"""
+        return json.loads(self.get('/digests?' + urlencode({'depth': depth})))
+
+    def list_shard_cids(self, shards: Iterable[str], depth: int = SHARD_DEPTH) -> Iterator[bytes]:
+        """cids in the given shards, listed by the server"""
+        shards = list(shards)
+        for i in range(0, len(shards), 500):    # keep request lines short
+            query = urlencode({'shards': ','.join(shards[i:i + 500]), 'depth': depth})
+            yield from map(self.decode, self.get('/cid?' + query).decode('ascii').split())
+
+    def close(self):
+        self.pool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
@@ -0,0 +1,84 @@
+"""
+Copyright © 2025 Joseph Kendall-Morwick
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+from .main import DataService
+from .typers import match_window, read_window, DETECTION_PROPERTY, DETECTION_VERSION, TAIL_SIZE, TYPE_PROPERTY, UNKNOWN_TYPE
+from typing import BinaryIO, NamedTuple
+
+# length of the resource header examined by the WHATWG mime sniffing algorithm
+SNIFF_SIZE = 1445
+
+
+class IngestRecord(NamedTuple):
+    cid: bytes
+    isnew: bool
+    properties: list[tuple[str, str]]    # (property, value) pairs to believe about cid
+
+
+class HeaderTap:
+    """wraps a binary stream, keeping the first and last bytes read through it"""
+
+    def __init__(self, fp: BinaryIO, size: int = SNIFF_SIZE, tail_size: int = TAIL_SIZE):
+        self.fp = fp
+        self.size = size
+        self.tail_size = tail_size
+        self.header = b''
+        self.tail = b''
+
+    def read(self, n: int = -1) -> bytes:
+        data = self.fp.read(n)
+        if len(self.header) < self.size:
+            self.header += data[:self.size - len(self.header)]
+        if data:
+            self.tail = (self.tail + data[-self.tail_size:])[-self.tail_size:]
+        return data
+
+
+def describe(header: bytes, tail: bytes = b'') -> list[tuple[str, str]]:
+    """determine the mime type and file types of data from its header and tail windows
+
+        the types come with the DETECTION_VERSION they were found by, as typers.detect
+        believes them, so detect doesn't repeat the work"""
+    properties = []
+    try:
+        import sniffpy
+        mime = sniffpy.sniff(header[:SNIFF_SIZE])
+        properties.append(('mime_type', mime.type))
+        properties.append(('mime_subtype', mime.subtype))
+    except Exception:
+        properties.append(('mime_type', 'error'))
+    for t in sorted(match_window(header, tail)) or [UNKNOWN_TYPE]:
+        properties.append((TYPE_PROPERTY, t))
+    properties.append((DETECTION_PROPERTY, DETECTION_VERSION))
+    return properties
+
+
+def ingest(ds: DataService, fp: BinaryIO) -> IngestRecord:
+    """remember data read from fp and describe it, reading fp only once
+
+        the chunks read by ds.know_file are tapped for the header and tail windows
+        used for mime sniffing and type detection, so memory is bounded by the
+        data service's chunk size rather than the size of the data"""
+    tap = HeaderTap(fp)
+    cid, isnew = ds.know_file(tap)
+    return IngestRecord(cid, isnew, describe(tap.header, tap.tail))
+
+
+def ingest_path(ds: DataService, path: str, link: str | None = None) -> IngestRecord:
+    """remember and describe the file at path (see DataService.know_path for link)"""
+    if link is None:
+        with open(path, 'rb') as fp:
+            return ingest(ds, fp)
+    cid, isnew = ds.know_path(path, link)
+    with open(path, 'rb') as fp:
+        header = fp.read(SNIFF_SIZE)
+        fp.seek(0)
+        _, tail = read_window(fp)
+    return IngestRecord(cid, isnew, describe(header, tail))
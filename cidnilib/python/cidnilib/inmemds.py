@@ -8,12 +8,127 @@ The above copyright notice and this permission notice shall be included in all c
 THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
 
-from .main import DataService, KnowledgeService, HashAlgorithm, MultiHashEncoder
+from .main import DataService, KnowledgeService, HashAlgorithm, MultiHashEncoder, InMemoryDataService
+from .cidindex import page_cids
+from collections import OrderedDict
 from collections.abc import Callable
 from typing import BinaryIO, Iterator
 from io import BytesIO
 import os
 import sys
-from multihash import to_b58_string, from_b58_string
+import tempfile
+import threading
+from .cid import to_b58_string, from_b58_string
+
+
+class BoundedInMemoryDataService(InMemoryDataService):
+    """keeps at most max_bytes of data in memory, spilling the least recently used to disk
+
+        spilled data goes to the backing data service if one is given, otherwise it is
+        appended to a temporary spill file which is removed on close. recalling spilled
+        data faults it back into memory. data is immutable, so data already spilled
+        is evicted again without being rewritten. self.db holds only the resident data."""
+
+    def __init__(self,
+                 max_bytes: int = 64 * 1048576,
+                 backing: DataService | None = None,
+                 encoder: Callable[[bytes],str] = to_b58_string,
+                 decoder: Callable[[str],bytes] = from_b58_string,
+                 hasher: Callable[[],HashAlgorithm] = MultiHashEncoder):
+        super().__init__(encoder, decoder, hasher)
+        self.db = OrderedDict()     # resident data, least recently used first
+        self.max_bytes = max_bytes
+        self.size = 0               # bytes of resident data
+        self.backing = backing
+        self.spill_file = None      # created on first spill without a backing data service
+        self.spilled = dict()       # id -> (offset, length) in the spill file, or None if in backing
+        self.lock = threading.Lock()
+
+    def know_binary(self, data:bytes):
+        m = self.hasher()
+        m.update(data)
+        id = m.digest()
+        with self.lock:
+            if id in self.db:
+                self.db.move_to_end(id)
+                return id, False
+            if id in self.spilled:
+                return id, False
+            self._cache(id, data)
+        return id, True
+
+    def known_binary(self, id:bytes):
+        return id in self.db or id in self.spilled
+
+    def recall_binary(self, id:bytes):
+        with self.lock:
+            data = self.db.get(id)
+            if data is not None:
+                self.db.move_to_end(id)
+                self.cache_outcome('resident', True)
+                return data
+            if id not in self.spilled:
+                return None
+            self.cache_outcome('resident', False)
+            data = self._unspill(id)
+            self._cache(id, data)
+            return data
+
+    def forget_binary(self, id:bytes):
+        with self.lock:
+            data = self.db.pop(id, None)
+            if data is not None:
+                self.size -= len(data)
+            if id in self.spilled and self.spilled.pop(id) is None:
+                self.backing.forget_binary(id)    # space in the spill file is reclaimed on close
+
+    def list_known_cids(self, prefix:str|None = None, after:str|None = None, limit:int|None = None) -> Iterator[bytes]:
+        with self.lock:
+            ids = list(self.db) + [id for id in self.spilled if id not in self.db]
+        if prefix is None and after is None and limit is None:
+            return ids
+        return [self.decode(cid) for cid in page_cids(sorted(map(self.encode, ids)), prefix, after, limit)]
+
+    def _cache(self, id, data):
+        self.db[id] = data
+        self.size += len(data)
+        while self.size > self.max_bytes and self.db:
+            old, old_data = self.db.popitem(last=False)
+            self.size -= len(old_data)
+            if old not in self.spilled:
+                self._spill(old, old_data)
+
+    def _spill(self, id, data):
+        if self.backing is not None:
+            self.backing.know_binary(data)
+            self.spilled[id] = None
+            return
+        if self.spill_file is None:
+            self.spill_file = tempfile.TemporaryFile(prefix='cidni-spill-')
+        offset = self.spill_file.seek(0, os.SEEK_END)
+        self.spill_file.write(data)
+        self.spilled[id] = (offset, len(data))
+
+    def _unspill(self, id):
+        location = self.spilled[id]
+        if location is None:
+            return self.backing.recall_binary(id)
+        offset, length = location
+        self.spill_file.seek(offset)
+        return self.spill_file.read(length)
+
+    def close(self):
+        with self.lock:
+            if self.spill_file is not None:
+                self.spill_file.close()
+                self.spill_file = None
+            self.spilled = {id: None for id, location in self.spilled.items() if location is None}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
 
 
@@ -0,0 +1,311 @@
+"""
+Copyright © 2025 Joseph Kendall-Morwick
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+from .main import DataService, KnowledgeService, value_order
+from bisect import bisect_left, bisect_right
+from collections.abc import Callable, Iterable
+from typing import Iterator
+from collections import defaultdict
+from .triples import decode_triple
+from .textindex import TextIndex
+from .metrics import Observer
+from .locks import RWLock
+import threading
+from time import perf_counter
+
+
+class SortedValues:
+    """the distinct values of a property, kept sorted by key for bisection"""
+
+    def __init__(self, key: Callable[[str], object], values: Iterable[str] = ()):
+        self.key = key
+        pairs = sorted((key(value), value) for value in values)
+        self.keys = [k for k, _ in pairs]
+        self.values = [v for _, v in pairs]
+
+    def add(self, value: str) -> None:
+        k = self.key(value)
+        i = bisect_right(self.keys, k)
+        self.keys.insert(i, k)
+        self.values.insert(i, value)
+
+    def remove(self, value: str) -> None:
+        k = self.key(value)
+        i = bisect_left(self.keys, k)
+        while i < len(self.keys) and self.keys[i] == k:
+            if self.values[i] == value:
+                del self.keys[i]
+                del self.values[i]
+                return
+            i += 1
+
+    def between(self, lo: object | None, hi: object | None, include_lo: bool, include_hi: bool) -> list[str]:
+        """the values with keys between the keys lo and hi"""
+        start = 0 if lo is None else (bisect_left if include_lo else bisect_right)(self.keys, lo)
+        end = len(self.keys) if hi is None else (bisect_right if include_hi else bisect_left)(self.keys, hi)
+        return self.values[start:end]
+
+
+class Closure:
+    """the transitive closure of a property: what each subject reaches by chaining its triples
+
+        adding a triple joins everything reaching its subject to everything its value
+        reaches. removing one recomputes what the subjects which reached it now reach,
+        walking the remaining triples (given by successors)"""
+
+    def __init__(self, successors: Callable[[str], Iterable[str]], subjects: Iterable[str] = ()):
+        self.successors = successors
+        self.down = dict()      # subject -> everything it reaches
+        self.up = dict()        # value -> everything reaching it
+        for subject in subjects:
+            reached = self.walk(subject)
+            if reached:
+                self.down[subject] = reached
+                for value in reached:
+                    self.up.setdefault(value, set()).add(subject)
+
+    def walk(self, start: str) -> set[str]:
+        reached = set()
+        frontier = [start]
+        while frontier:
+            for value in self.successors(frontier.pop()):
+                if value not in reached:
+                    reached.add(value)
+                    frontier.append(value)
+        return reached
+
+    def add(self, subject: str, value: str) -> None:
+        if value in self.down.get(subject, ()):
+            return
+        above = self.up.get(subject, set()) | {subject}
+        below = self.down.get(value, set()) | {value}
+        for node in above:
+            self.down.setdefault(node, set()).update(below)
+        for node in below:
+            self.up.setdefault(node, set()).update(above)
+
+    def remove(self, subject: str, value: str) -> None:
+        """update the closure after the triple (subject, value) was removed from successors
+
+            only pairs from what reached subject to what value reached can be lost. without
+            cycles among them, each node keeps a pair if one of its successors (updated
+            first, having more ancestors) still reaches the value of the pair"""
+        above = self.up.get(subject, set()) | {subject}
+        below = self.down.get(value, set()) | {value}
+        lost = []
+        if any(node in self.down.get(node, ()) for node in above):
+            for node in above:      # on a cycle; recompute by walking the remaining triples
+                reached = self.walk(node)
+                lost += ((node, y) for y in self.down.get(node, set()) - reached)
+                self.down[node] = reached
+        else:
+            for node in sorted(above, key=lambda node: len(self.up.get(node, ())), reverse=True):
+                reached = self.down.get(node, set())
+                successors = self.successors(node)
+                gone = [y for y in below if y in reached and y not in successors
+                        and not any(y in self.down.get(s, ()) for s in successors)]
+                reached.difference_update(gone)
+                lost += ((node, y) for y in gone)
+        for node, y in lost:
+            self.up[y].discard(node)
+        for index in (self.down, self.up):
+            for node in above | below:
+                if not index.get(node, True):
+                    del index[node]
+
+
+class InMemoryKnowledgeService(KnowledgeService):
+    """indexes triples in memory for queries by any combination of subject, property and value
+
+        the service may be shared between threads: updates to the indexes take a write
+        lock and queries a read lock, snapshotting what they match before yielding it so
+        callers can believe while iterating (inquire copies only the matching sets of
+        values or subjects and builds the triples lazily). indexes built on first use,
+        such as the closure of each transitive property on its first inquire_transitive,
+        are built by one query at a time and kept up to date from then on"""
+
+    def __init__(self, 
+                 ds: DataService | None = None,    # data service holding serialized triples (a new InMemoryDataService by default)
+                 triple_encoding: str = 'json',
+                 observers: Iterable[Observer] = (),
+                 transitive: Iterable[str] = ('CONTAINS',)):    # properties whose closure is indexed
+        super().__init__(ds, triple_encoding, observers)
+        self.transitive = frozenset(transitive)
+        self.closures = dict()          # transitive property -> Closure, built on first use
+        self.subj_to_prop_to_vals = defaultdict(lambda: defaultdict(set))
+        self.prop_to_val_to_subjs = defaultdict(lambda: defaultdict(set))
+        self.ordered_values = dict()    # property -> SortedValues in value_order, built on first use
+        self.lexical_values = dict()    # property -> SortedValues in string order, built on first use
+        self.text_indexes = dict()      # property -> TextIndex, built on first search of the property
+        self.lock = RWLock()
+        self.build_lock = threading.Lock()    # taken under the read lock to build an index on first use
+
+        start = perf_counter()
+        for cid in self.ds.list_known_cids():
+            triple = decode_triple(self.ds.recall_binary(cid))
+            if triple is not None:
+                self._index(*triple)
+        for observer in self.observers:
+            observer.operation(self, 'rebuild', perf_counter() - start)
+
+    def believe(self, subject: str, property: str, value: str) -> tuple[bytes, bool]:
+        """Associate a string annotation with a string subject."""
+        result = super().believe(subject, property, value)
+        with self.lock.write():
+            self._index(subject, property, value)
+        return result
+
+    def believe_many(self, triples: Iterable[tuple[str, str, str]]) -> list[tuple[bytes, bool]]:
+        """Associate each (subject, property, value) triple, writing them as one batch."""
+        triples = list(triples)
+        results = super().believe_many(triples)
+        with self.lock.write():
+            for subject, property, value in triples:
+                self._index(subject, property, value)
+        return results
+
+    def _index(self, subject: str, property: str, value: str) -> None:
+        self.subj_to_prop_to_vals[subject][property].add(value)
+        subjects = self.prop_to_val_to_subjs[property][value]
+        if not subjects:
+            for indexes in (self.ordered_values, self.lexical_values):
+                if property in indexes:
+                    indexes[property].add(value)
+        subjects.add(subject)
+        if property in self.text_indexes:
+            self.text_indexes[property].add(subject, value)
+        if property in self.closures:
+            self.closures[property].add(subject, value)
+
+    def retract(self, subject: str, property: str, value: str) -> None:
+        """Forget a triple, removing it from every index."""
+        super().retract(subject, property, value)
+        with self.lock.write():
+            self.subj_to_prop_to_vals.get(subject, {}).get(property, set()).discard(value)
+            subjects = self.prop_to_val_to_subjs.get(property, {}).get(value)
+            if subjects and subject in subjects:
+                subjects.discard(subject)
+                if not subjects:
+                    for indexes in (self.ordered_values, self.lexical_values):
+                        if property in indexes:
+                            indexes[property].remove(value)
+                if property in self.closures:
+                    self.closures[property].remove(subject, value)
+            if property in self.text_indexes:
+                self.text_indexes[property].remove(subject, value)
+
+    def search(self, text: str, property: str | None = None) -> Iterator[tuple[str, str, str]]:
+        """Retrieve triples whose values mention every word of text, using per-property text indexes."""
+        with self.lock.read():
+            results = []
+            for prop in ([property] if property is not None else self.text_properties):
+                index = self._built(self.text_indexes, prop, lambda: TextIndex(
+                    (subject, value) for value, subjects in self.prop_to_val_to_subjs.get(prop, {}).items()
+                    for subject in subjects))
+                results += ((subject, prop, value) for subject, value in index.search(text))
+        yield from results
+
+    def inquire_transitive(self, subject: str | None, property: str, value: str | None = None) -> Iterator[tuple[str, str, str]]:
+        """Retrieve the triples implied by chaining triples of property, from its closure if it's transitive."""
+        if property not in self.transitive:
+            yield from super().inquire_transitive(subject, property, value)
+            return
+        with self.lock.read():
+            closure = self._built(self.closures, property,
+                                  lambda: Closure(self._successors(property), list(self.subj_to_prop_to_vals)))
+            if subject is not None:
+                reached = closure.down.get(subject, ())
+                if value is not None:
+                    reached = [value] if value in reached else []
+                results = [(subject, property, v) for v in reached]
+            elif value is not None:
+                results = [(s, property, value) for s in closure.up.get(value, ())]
+            else:
+                results = [(s, property, v) for s, reached in closure.down.items() for v in reached]
+        yield from results
+
+    def _successors(self, property: str) -> Callable[[str], Iterable[str]]:
+        def successors(subject):
+            return self.subj_to_prop_to_vals.get(subject, {}).get(property, ())
+        return successors
+
+    def _built(self, indexes: dict, property: str, build: Callable[[], object]):
+        """the index of property in indexes, built first if needed (called holding the read lock)"""
+        index = indexes.get(property)
+        if index is None:
+            with self.build_lock:
+                index = indexes.get(property)
+                if index is None:
+                    index = indexes[property] = build()
+        return index
+
+    def sorted_values(self, indexes: dict, property: str, key: Callable[[str], object]) -> SortedValues:
+        values = self.prop_to_val_to_subjs.get(property, {})
+        return self._built(indexes, property,
+                           lambda: SortedValues(key, (value for value, subjects in values.items() if subjects)))
+
+    def _triples(self, property: str, values: Iterable[str]) -> list[tuple[str, str, str]]:
+        subjects = self.prop_to_val_to_subjs.get(property, {})
+        return [(subject, property, value) for value in values for subject in subjects.get(value, ())]
+
+    def inquire_range(self, property: str, lo: str | None = None, hi: str | None = None,
+                      include_lo: bool = True, include_hi: bool = False) -> Iterator[tuple[str, str, str]]:
+        """Retrieve triples of property with values between lo and hi, by bisecting a sorted index."""
+        with self.lock.read():
+            index = self.sorted_values(self.ordered_values, property, value_order)
+            values = index.between(value_order(lo) if lo is not None else None,
+                                   value_order(hi) if hi is not None else None, include_lo, include_hi)
+            results = self._triples(property, values)
+        yield from results
+
+    def inquire_prefix(self, property: str, prefix: str) -> Iterator[tuple[str, str, str]]:
+        """Retrieve triples of property whose values start with prefix, by bisecting a sorted index."""
+        with self.lock.read():
+            index = self.sorted_values(self.lexical_values, property, str)
+            values = index.between(prefix, prefix + '\U0010ffff', True, False)
+            results = self._triples(property, values)
+        yield from results
+
+    def inquire(
+        self,
+        subject: str | None = None,
+        property: str | None = None,
+        value: str | None = None,
+    ) -> Iterator[tuple[str, str, str]]:
+        """Retrieve matching string triples."""
+        with self.lock.read():
+            by_subject, by_value = self._matching(subject, property, value)
+        for subj, prop, vals in by_subject:
+            for val in vals:
+                yield subj, prop, val
+        for prop, val, subjs in by_value:
+            for subj in subjs:
+                yield subj, prop, val
+
+    def _matching(self, subject: str | None, property: str | None, value: str | None
+                  ) -> tuple[list[tuple[str, str, tuple]], list[tuple[str, str, tuple]]]:
+        """copies of the sets of values (by subject and property) and of subjects (by
+        property and value) holding the matching triples"""
+        def values(vals):
+            return tuple(vals) if value is None else (value,) if value in vals else ()
+
+        if subject is not None:
+            prop_to_vals = self.subj_to_prop_to_vals.get(subject, {})
+            props = [property] if property is not None else list(prop_to_vals)
+            return [(subject, prop, values(prop_to_vals.get(prop, ()))) for prop in props], []
+
+        elif property is not None:
+            val_to_subjs = self.prop_to_val_to_subjs.get(property, {})
+            vals = [value] if value is not None else list(val_to_subjs)
+            return [], [(property, val, tuple(val_to_subjs.get(val, ()))) for val in vals]
+
+        else:
+            return [(subj, prop, values(vals)) for subj, prop_to_vals in self.subj_to_prop_to_vals.items()
+                    for prop, vals in prop_to_vals.items()], []
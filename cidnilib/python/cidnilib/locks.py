@@ -0,0 +1,123 @@
+"""
+Copyright © 2025 Joseph Kendall-Morwick
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+from contextlib import contextmanager
+from hashlib import blake2b
+import os
+import socket
+import threading
+
+try:
+    import fcntl
+except ImportError:     # not posix; files are updated without coordination between processes
+    fcntl = None
+
+
+def lock_path(path: str) -> str:
+    """the hidden file locked in place of path (e.g. store/.cids.idx.lock for store/cids.idx)
+
+        lock files are left behind, as removing one while another process waits on it
+        would let a third lock a new file of the same name at the same time"""
+    head, tail = os.path.split(path)
+    return os.path.join(head, '.' + tail + '.lock')
+
+
+@contextmanager
+def file_lock(path: str, shared: bool = False):
+    """hold an advisory lock on path (through the file at lock_path(path)) for the duration
+
+        processes updating the same files serialize on these locks; readers of files that
+        are only ever replaced atomically don't need to take them"""
+    if fcntl is None:
+        yield
+        return
+    fd = os.open(lock_path(path), os.O_RDWR | os.O_CREAT, 0o666)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+
+HOST = blake2b(socket.gethostname().encode('utf-8'), digest_size=4).hexdigest()
+
+
+def owner_tag() -> str:
+    """names this process in files it leaves behind while working: <pid>-<host>"""
+    return '{pid}-{host}'.format(pid=os.getpid(), host=HOST)
+
+
+def owner_alive(tag: str) -> bool | None:
+    """whether the process an owner_tag names still runs (None if that can't be told,
+    e.g. for a process on another host sharing the directory)"""
+    pid, _, host = tag.partition('-')
+    if host != HOST or not pid.isdigit():
+        return None
+    if os.name == 'nt':    # os.kill would signal the process; assume it runs
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:    # someone else's
+        pass
+    return True
+
+
+class StripedLock:
+    """a fixed set of locks shared out by key, so unrelated keys rarely contend"""
+
+    def __init__(self, stripes: int = 64):
+        self.locks = [threading.Lock() for _ in range(stripes)]
+
+    def __call__(self, key) -> threading.Lock:
+        return self.locks[hash(key) % len(self.locks)]
+
+
+class RWLock:
+    """allows any number of readers or a single writer
+
+        waiting writers hold off new readers so a steady stream of reads can't starve
+        them. the lock isn't reentrant: don't take it again while holding it"""
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writing = False
+        self._waiting = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writing or self._waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._waiting += 1
+            while self._writing or self._readers:
+                self._cond.wait()
+            self._waiting -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
@@ -9,14 +9,19 @@ THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR I
 """
 
 from abc import abstractmethod
-from collections.abc import Callable
+from collections.abc import Callable, Iterable
 from typing import BinaryIO, Iterator
 from hashlib import sha256
 from typing import Protocol, runtime_checkable
-from multihash import to_b58_string, from_b58_string, encode
+from multihash import encode
+from .cid import CID, to_b58_string, from_b58_string
 from io import BytesIO
-from collections import defaultdict
 import json
+from .triples import triple_encoders
+from .metrics import Observable, Observer, instrument, instrumented, instrumented_generator
+from .cidindex import page_cids
+from .textindex import text_matches, tokenize
+from .sync import SHARD_DEPTH, shard_digests, shard_of
 
 @runtime_checkable
 class HashAlgorithm(Protocol):
@@ -39,7 +44,18 @@ class MultiHashEncoder(HashAlgorithm):
     def digest(self):
         return encode(self.hasher.digest(), self.code)
     
-class DataService:
+data_service_operations = {
+    'know_binary': instrumented('know_binary', lambda args, result: len(args[0])),
+    'known_binary': instrumented('known_binary'),
+    'recall_binary': instrumented('recall_binary', lambda args, result: len(result) if result else 0),
+    'forget_binary': instrumented('forget_binary'),
+    'know_file': instrumented('know_file'),
+    'know_path': instrumented('know_path'),
+    'know_many': instrumented('know_many'),
+    'recall_file': instrumented('recall_file', lambda args, result: result or 0),
+}
+
+class DataService(Observable):
 
     def __init__(self, 
                  encoder: Callable[[bytes],str] = to_b58_string, 
@@ -50,6 +66,10 @@ class DataService:
         self.decode = decoder
         self.hasher = hasher
         self.text_encoding = text_encoding
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        instrument(cls, data_service_operations)
         
     #TODO finish/test/integrate
     def cid(self, data:bytes|str) -> bytes:
@@ -58,6 +78,13 @@ class DataService:
         id = self.encode(m.digest())
         return id
 
+    def binary(self, id:bytes|str|CID) -> bytes:
+        """the binary form of an id given in any of the accepted forms"""
+        if type(id) == bytes:
+            return id
+        if type(id) == str:
+            return self.decode(id)
+        return id.binary
 
     @abstractmethod
     def know_binary(self, data:bytes) -> tuple[bytes, bool]:
@@ -80,8 +107,13 @@ class DataService:
         pass
 
     @abstractmethod
-    def list_known_cids(self) -> Iterator[bytes]:
-        """list all known cids"""
+    def list_known_cids(self, prefix:str|None = None, after:str|None = None, limit:int|None = None) -> Iterator[bytes]:
+        """list known cids
+        
+            only cids whose encoded form starts with prefix are listed. after is an 
+            encoded cid to resume from (the last one of a previous page) and limit the 
+            most cids to list. paged listings (given any of these) are in the order of 
+            the cids' encoded form."""
         pass
         
     def know_file(self, fp:BinaryIO) -> tuple[bytes, bool]: 
@@ -91,6 +123,18 @@ class DataService:
             the data was unknown to the data service"""
         return self.know_binary(fp.read())
 
+    def know_path(self, path:str, link:str|None = None) -> tuple[bytes, bool]: 
+        """remember data in the file at path
+        
+            link requests the file be placed in storage as a 'reflink' clone or a 
+            read-only 'hardlink' where the data service supports it; data services 
+            which can't link copy the data instead
+        
+            returns the cid of the data along with a boolean representing whether 
+            the data was unknown to the data service"""
+        with open(path, 'rb') as fp:
+            return self.know_file(fp)
+
     def know(self, data:str|bytes) -> tuple[bytes, bool]: 
         """remember given data for future retrieval
         
@@ -101,51 +145,96 @@ class DataService:
         """
         return self.know_binary(bytes(data, self.text_encoding)) if type(data) == str else self.know_binary(data)
 
-    def recall(self, id:bytes|str) -> bytes:
+    def know_many(self, items:Iterable[str|bytes]) -> list[tuple[bytes, bool]]: 
+        """remember each of the given strings or binary data
+        
+            data services with a bulk write path override this to store a batch at once
+        
+            returns a (cid, unknown) pair for each item, as returned by know
+        """
+        return [self.know(data) for data in items]
+
+    def recall(self, id:bytes|str|CID) -> bytes:
         """retrieve data associated with id
         
-            id is either binary hash or binary hash encoded as a string (using self.encode)
+            id is a binary hash, a binary hash encoded as a string (using self.encode) or a CID
         
         """
-        return self.recall_binary(self.decode(id)) if type(id) == str else self.recall_binary(id)
+        return self.recall_binary(self.binary(id))
 
-    def recall_text(self, id:bytes|str) -> str:
+    def recall_text(self, id:bytes|str|CID) -> str:
         """retrieve data associated with id as a string
         
-            id is either binary hash or binary hash encoded as a string (using self.encode)
+            id is a binary hash, a binary hash encoded as a string (using self.encode) or a CID
             
             returns data as a string (decoded from binary storage)
             """
         return self.recall(id).decode(self.text_encoding)
 
-    def recall_stream(self, id:bytes|str) -> BinaryIO:
+    def recall_stream(self, id:bytes|str|CID) -> BinaryIO:
         """retrieve data associated with id
         
-            id is either binary hash or binary hash encoded as a string (using self.encode)
+            id is a binary hash, a binary hash encoded as a string (using self.encode) or a CID
             
         """
-        id = id if type(id) == bytes else self.decode(id)
-        return BytesIO(self.recall_binary(id))
+        return BytesIO(self.recall_binary(self.binary(id)))
+        
+    def recall_file(self, id:bytes|str|CID, fp:BinaryIO) -> int|None:
+        """write data associated with id to fp in chunks
+        
+            id is a binary hash, a binary hash encoded as a string (using self.encode) or a CID
+            
+            returns the number of bytes written or None if the id is unknown
+            """
+        if not self.known(id):
+            return None
+        stream = self.recall_stream(id)
+        size = 0
+        with stream:
+            while True:
+                data = stream.read(1048576)
+                if not data:
+                    break
+                fp.write(data)
+                size += len(data)
+        return size
         
-    def forget(self, id:bytes|str) -> bytes:
+    def forget(self, id:bytes|str|CID) -> bytes:
         """forget data associated with id
         
-            id is either binary hash or binary hash encoded as a string (using self.encode)
+            id is a binary hash, a binary hash encoded as a string (using self.encode) or a CID
             
         """
-        return self.forget_binary(id) if type(id) == bytes else self.forget_binary(self.decode(id))
+        return self.forget_binary(self.binary(id))
 
-    def known(self, id:bytes|str) -> bool:
+    def known(self, id:bytes|str|CID) -> bool:
         """determine if value is available for given id
         
-            id is either binary hash or binary hash encoded as a string (using self.encode)
+            id is a binary hash, a binary hash encoded as a string (using self.encode) or a CID
             
         """
-        return self.known_binary(id) if type(id) == bytes else self.known_binary(self.decode(id))
+        return self.known_binary(self.binary(id))
+
+    def shard_digests(self, depth:int = SHARD_DEPTH) -> dict[str, str]:
+        """digest of the known cids in each shard, named by the last depth characters of encoded cids
+        
+            stores with the same digest for a shard know the same cids in it. depth 0 
+            gives one digest for the whole store"""
+        return shard_digests(map(self.encode, self.list_known_cids()), depth)
+
+    def list_shard_cids(self, shards:Iterable[str], depth:int = SHARD_DEPTH) -> Iterator[bytes]:
+        """list the known cids in the given shards (see shard_digests)"""
+        shards = set(shards)
+        for id in self.list_known_cids():
+            if shard_of(self.encode(id), depth) in shards:
+                yield id
 
 
 
 
+instrument(DataService, data_service_operations)
+
+
 class InMemoryDataService(DataService):
     def __init__(self,
                  encoder: Callable[[bytes],str] = to_b58_string, 
@@ -174,17 +263,54 @@ class InMemoryDataService(DataService):
         try: del self.db[id]
         except: return None
 
-    def list_known_cids(self) -> Iterator[bytes]:
-        return self.db.keys()
+    def list_known_cids(self, prefix:str|None = None, after:str|None = None, limit:int|None = None) -> Iterator[bytes]:
+        if prefix is None and after is None and limit is None:
+            return list(self.db)
+        return [self.decode(cid) for cid in page_cids(sorted(map(self.encode, self.db)), prefix, after, limit)]
+
+
+
 
+knowledge_service_operations = {
+    'believe': instrumented('believe'),
+    'believe_many': instrumented('believe_many'),
+    'inquire': instrumented_generator('inquire'),
+    'inquire_range': instrumented_generator('inquire_range'),
+    'inquire_prefix': instrumented_generator('inquire_prefix'),
+    'search': instrumented_generator('search'),
+    'inquire_transitive': instrumented_generator('inquire_transitive'),
+    'retract': instrumented('retract'),
+}
+
+
+def value_order(value: str) -> tuple:
+    """sort key ordering numeric values by number, before all other values in string order"""
+    try:
+        number = float(value)
+    except ValueError:
+        return (1, value)
+    if number != number:    # nan doesn't order
+        return (1, value)
+    return (0, number)
 
 
+class KnowledgeService(Observable):
 
-class KnowledgeService:
+    # properties holding text worth searching when search isn't given a property
+    text_properties = ('had_path', 'HAD_PATH', 'mime_type', 'mime_subtype', 'HAS_TYPE')
 
     def __init__(self, 
-                 ds: DataService = InMemoryDataService()):   # data  holding serialized triples
-        self.ds = ds
+                 ds: DataService | None = None,             # data holding serialized triples (a new InMemoryDataService by default)
+                 triple_encoding: str = 'json',             # 'json' or 'binary' (see triples.py)
+                 observers: Iterable[Observer] = ()):
+        self.ds = ds if ds is not None else InMemoryDataService()
+        self.triple_encoding = triple_encoding
+        self.serialize = triple_encoders[triple_encoding]
+        self.observers = tuple(observers)
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        instrument(cls, knowledge_service_operations)
 
     #TODO finish/test/integrate
     def encode(self, subject: str, property: str, value: str) -> bytes:
@@ -194,63 +320,92 @@ class KnowledgeService:
 
     def believe(self, subject: str, property: str, value: str) -> tuple[bytes, bool]:
         """Associate a string annotation with a string subject."""
-        triple_text = json.dumps([subject, property, value])
-        return self.ds.know(triple_text)
+        return self.ds.know(self.serialize(subject, property, value))
+
+    def believe_many(self, triples: Iterable[tuple[str, str, str]]) -> list[tuple[bytes, bool]]:
+        """Associate each (subject, property, value) triple, writing them as one batch."""
+        return self.ds.know_many([self.serialize(subject, property, value) for subject, property, value in triples])
+
+    def retract(self, subject: str, property: str, value: str) -> None:
+        """Forget a previously believed triple."""
+        data = self.serialize(subject, property, value)
+        m = self.ds.hasher()
+        m.update(bytes(data, self.ds.text_encoding) if type(data) == str else data)
+        self.ds.forget_binary(m.digest())
 
     @abstractmethod
     def inquire(self, subject:str|None, property:str|None, value:str|None) -> Iterator[tuple[str, str, str]]:
         """retrieve annotations associated with id"""
         pass
-        
-class InMemoryKnowledgeService(KnowledgeService):
-    def __init__(self, ds: DataService = InMemoryDataService()):    # data service holding serialized triples 
-        self.ds = ds
-        self.subj_to_prop_to_vals = defaultdict(lambda: defaultdict(set))
-        self.prop_to_val_to_subjs = defaultdict(lambda: defaultdict(set))
 
-        for cid in ds.list_known_cids():
-            
-            try:
-                data = ds.recall_binary(cid)
-                text = data.decode("utf-8")
-                triple = json.loads(text)
-            except (UnicodeDecodeError, json.JSONDecodeError, TypeError):
+    def inquire_range(self, property:str, lo:str|None = None, hi:str|None = None,
+                      include_lo:bool = True, include_hi:bool = False) -> Iterator[tuple[str, str, str]]:
+        """retrieve triples of property with values between lo and hi (either may be open)
+        
+            values are compared as numbers where they parse as numbers (see value_order).
+            knowledge services with sorted value indexes override this to avoid scanning 
+            every value of the property"""
+        low = value_order(lo) if lo is not None else None
+        high = value_order(hi) if hi is not None else None
+        matches = []
+        for triple in self.inquire(None, property, None):
+            key = value_order(triple[2])
+            if low is not None and (key < low or key == low and not include_lo):
                 continue
+            if high is not None and (key > high or key == high and not include_hi):
+                continue
+            matches.append((key, triple))
+        matches.sort(key=lambda match: match[0])
+        for _, triple in matches:
+            yield triple
+
+    def inquire_prefix(self, property:str, prefix:str) -> Iterator[tuple[str, str, str]]:
+        """retrieve triples of property whose values start with prefix, in value order"""
+        yield from sorted((t for t in self.inquire(None, property, None) if t[2].startswith(prefix)),
+                          key=lambda t: t[2])
+
+    def search(self, text:str, property:str|None = None) -> Iterator[tuple[str, str, str]]:
+        """retrieve triples (of property, else of the text_properties) whose values mention every word of text
+        
+            words of three or more characters match anywhere in a value, shorter ones only
+            match whole words (see textindex.text_matches). knowledge services with a text 
+            index override this to avoid scanning every triple"""
+        query = tokenize(text)
+        if not query:
+            return
+        for prop in ([property] if property is not None else self.text_properties):
+            for triple in self.inquire(None, prop, None):
+                if text_matches(query, triple[2]):
+                    yield triple
+
+    def inquire_transitive(self, subject:str|None, property:str, value:str|None = None) -> Iterator[tuple[str, str, str]]:
+        """retrieve the triples of property implied by chaining its triples (e.g. CONTAINS)
+        
+            with a subject, a triple for each value it reaches (everything an archive 
+            ultimately contains); with only a value, one for each subject reaching it 
+            (every archive ultimately containing it); with both, the triple if the subject
+            reaches the value. knowledge services maintaining the closure of transitive 
+            properties override this to avoid walking the graph"""
+        if subject is None and value is None:
+            for start in {s for s, _, _ in self.inquire(None, property, None)}:
+                yield from self.inquire_transitive(start, property)
+            return
+        forward = subject is not None
+        seen = set()
+        frontier = [subject if forward else value]
+        while frontier:
+            node = frontier.pop()
+            for s, _, v in (self.inquire(node, property, None) if forward else self.inquire(None, property, node)):
+                reached = v if forward else s
+                if reached not in seen:
+                    seen.add(reached)
+                    frontier.append(reached)
+        if not forward:
+            yield from ((s, property, value) for s in seen)
+        elif value is None:
+            yield from ((subject, property, v) for v in seen)
+        elif value in seen:
+            yield subject, property, value
+        
 
-            if (
-                isinstance(triple, list)
-                and len(triple) == 3
-                and all(isinstance(x, str) for x in triple)
-            ):
-                subject, property, value = triple
-                self._index(subject, property, value)
-
-    def _index(self, subject: str, property: str, value: str) -> None:
-        self.subj_to_prop_to_vals[subject][property].add(value)
-        self.prop_to_val_to_subjs[property][value].add(subject)
-
-    def inquire(
-        self,
-        subject: str | None = None,
-        property: str | None = None,
-        value: str | None = None,
-    ) -> Iterator[tuple[str, str, str]]:
-        """Retrieve matching string triples."""
-        if subject is not None:
-            for prop in ([property] if property is not None else self.subj_to_prop_to_vals[subject].keys()):
-                vals = self.subj_to_prop_to_vals[subject][prop]
-                for val in vals:
-                    if value is None or value == val:
-                        yield subject, prop, val
-
-        elif property is not None:
-            for val in ([value] if value is not None else self.prop_to_val_to_subjs[property].keys()):
-                for subj in self.prop_to_val_to_subjs[property][val]:
-                    yield subj, property, val
-
-        else:
-            for subj, prop_to_vals in self.subj_to_prop_to_vals.items():
-                for prop, vals in prop_to_vals.items():
-                    for val in vals:
-                        if value is None or value == val:
-                            yield subj, prop, val
+instrument(KnowledgeService, knowledge_service_operations)
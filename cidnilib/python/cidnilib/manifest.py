@@ -0,0 +1,116 @@
+"""
+Copyright © 2025 Joseph Kendall-Morwick
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import json
+import os
+
+
+class StatManifest:
+    """remembers the cid each file had when last stored, keyed by its path and stat signature
+
+        a file whose device, inode, size and modification time are unchanged since it was
+        recorded is assumed to still hold the recorded data, so it can be skipped without
+        being read again. callers should check the recorded cid is still stored, as the
+        manifest doesn't learn about data forgotten since.
+
+        the manifest file holds the entries as of its last compaction. entries recorded or
+        forgotten since are appended to a log alongside it as a json line each, in batches
+        of flush_every, and folded into the manifest once the log grows past compact_bytes"""
+
+    def __init__(self, path: str, flush_every: int = 256, compact_bytes: int = 16 * 1048576):
+        self.path = path
+        self.log_path = path + '.log'
+        self.flush_every = flush_every
+        self.compact_bytes = compact_bytes
+        self.entries = dict()
+        self.pending = []
+        self._closed = False
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, 'r') as fp:
+                self.entries = json.load(fp)
+        self.log_size = 0
+        if os.path.exists(self.log_path):
+            with open(self.log_path, 'r') as fp:
+                for line in fp:
+                    try:
+                        change = json.loads(line)
+                    except ValueError:    # a line torn by a crash mid-append
+                        continue
+                    if len(change) == 1:
+                        self.entries.pop(change[0], None)
+                    else:
+                        self.entries[change[0]] = change[1:]
+            self.log_size = os.path.getsize(self.log_path)
+
+    @staticmethod
+    def signature(st: os.stat_result) -> list[int]:
+        return [st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns]
+
+    def lookup(self, file_path: str, st: os.stat_result | None = None) -> str | None:
+        """return the recorded cid for file_path if its stat signature is unchanged"""
+        entry = self.entries.get(os.path.abspath(file_path))
+        if entry is None:
+            return None
+        st = st if st is not None else os.stat(file_path)
+        if entry[:4] != self.signature(st):
+            return None
+        return entry[4]
+
+    def record(self, file_path: str, cid: str, st: os.stat_result | None = None):
+        """remember that file_path (with the given stat signature) holds data identified by cid"""
+        st = st if st is not None else os.stat(file_path)
+        path = os.path.abspath(file_path)
+        self.entries[path] = self.signature(st) + [cid]
+        self._change([path] + self.entries[path])
+
+    def forget(self, file_path: str):
+        path = os.path.abspath(file_path)
+        if self.entries.pop(path, None) is not None:
+            self._change([path])
+
+    def _change(self, change: list) -> None:
+        self.pending.append(json.dumps(change) + '\n')
+        if len(self.pending) >= self.flush_every:
+            self.save()
+
+    def save(self):
+        """append pending changes to the log, compacting it once it grows large"""
+        if not self.pending:
+            return
+        with open(self.log_path, 'a') as fp:
+            fp.write(''.join(self.pending))
+        self.pending = []
+        self.log_size = os.path.getsize(self.log_path)
+        if self.log_size > self.compact_bytes:
+            self.compact()
+
+    def compact(self):
+        """atomically rewrite the manifest with all entries and drop the log"""
+        self.pending = []
+        temp = self.path + '.tmp'
+        with open(temp, 'w') as fp:
+            json.dump(self.entries, fp)
+        os.replace(temp, self.path)
+        if os.path.exists(self.log_path):
+            os.remove(self.log_path)
+        self.log_size = 0
+
+    def close(self):
+        if self._closed:
+            return
+        self.save()
+        self._closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
@@ -0,0 +1,208 @@
+"""
+Copyright © 2025 Joseph Kendall-Morwick
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+from collections import defaultdict
+from collections.abc import Callable
+from functools import wraps
+from time import perf_counter
+import json
+import os
+import sys
+import threading
+
+
+class Observer:
+    """receives instrumentation events from the services it is registered with
+
+        the base class ignores every event; subclasses override the events they need"""
+
+    def operation(self, service, name: str, seconds: float, nbytes: int = 0) -> None:
+        """an instrumented operation completed"""
+
+    def progress(self, service, name: str, nbytes: int) -> None:
+        """a long running operation processed another chunk of nbytes"""
+
+    def cache(self, service, name: str, hit: bool) -> None:
+        """a lookup in the named cache hit or missed"""
+
+    def note(self, service, name: str, message: str) -> None:
+        """a human readable account of a step of an operation (e.g. an archive member stored)"""
+
+
+class Metrics(Observer):
+    """counts operations, bytes, latency (as power of two microsecond buckets) and cache outcomes"""
+
+    def __init__(self):
+        self.operations = defaultdict(lambda: {'count': 0, 'bytes': 0, 'seconds': 0.0, 'histogram_us': defaultdict(int)})
+        self.caches = defaultdict(lambda: {'hits': 0, 'misses': 0})
+        self.lock = threading.Lock()    # services may report from several threads
+
+    @staticmethod
+    def key(service, name: str) -> str:
+        return type(service).__name__ + '.' + name
+
+    def operation(self, service, name, seconds, nbytes=0):
+        with self.lock:
+            entry = self.operations[self.key(service, name)]
+            entry['count'] += 1
+            entry['bytes'] += nbytes
+            entry['seconds'] += seconds
+            entry['histogram_us'][str(1 << int(seconds * 1e6).bit_length())] += 1
+
+    def progress(self, service, name, nbytes):
+        with self.lock:
+            self.operations[self.key(service, name)]['bytes'] += nbytes
+
+    def cache(self, service, name, hit):
+        with self.lock:
+            self.caches[self.key(service, name)]['hits' if hit else 'misses'] += 1
+
+    def snapshot(self) -> dict:
+        """the collected numbers as a json-serializable dict"""
+        return {
+            'operations': {name: {**entry, 'histogram_us': dict(entry['histogram_us'])}
+                           for name, entry in self.operations.items()},
+            'caches': {name: dict(entry) for name, entry in self.caches.items()},
+        }
+
+    def merge(self, snapshot: dict) -> None:
+        """add the numbers from a snapshot (e.g. of an earlier run) to these metrics"""
+        for name, other in snapshot.get('operations', {}).items():
+            entry = self.operations[name]
+            for field in ('count', 'bytes', 'seconds'):
+                entry[field] += other[field]
+            for bucket, count in other['histogram_us'].items():
+                entry['histogram_us'][bucket] += count
+        for name, other in snapshot.get('caches', {}).items():
+            self.caches[name]['hits'] += other['hits']
+            self.caches[name]['misses'] += other['misses']
+
+    def save(self, path: str) -> None:
+        """merge these metrics into those saved at path"""
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path) as fp:
+                self.merge(json.load(fp))
+        temp = path + '.tmp'
+        with open(temp, 'w') as fp:
+            json.dump(self.snapshot(), fp, indent=2)
+        os.replace(temp, path)
+
+
+class ProgressDots(Observer):
+    """prints a dot for every chunk processed by a long running operation, and notes on lines of their own"""
+
+    def __init__(self, file=None):
+        self.file = file
+
+    def progress(self, service, name, nbytes):
+        print(".", end="", flush=True, file=self.file or sys.stderr)
+
+    def note(self, service, name, message):
+        print(message, flush=True, file=self.file or sys.stderr)
+
+
+def instrumented(name: str, nbytes: Callable | None = None) -> Callable:
+    """decorate a service method so registered observers are told about each call
+
+        nbytes computes the bytes processed from the call's arguments and result.
+        without observers the call goes straight through to the method."""
+    def decorate(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            observers = self.observers
+            if not observers:
+                return method(self, *args, **kwargs)
+            active = _active_operations()
+            key = (id(self), name)
+            if key in active:    # an override calling super(); count the call once
+                return method(self, *args, **kwargs)
+            active.add(key)
+            start = perf_counter()
+            try:
+                result = method(self, *args, **kwargs)
+            finally:
+                active.discard(key)
+            seconds = perf_counter() - start
+            size = nbytes(args, result) if nbytes else 0
+            for observer in observers:
+                observer.operation(self, name, seconds, size)
+            return result
+        wrapper.instrumented = True
+        return wrapper
+    return decorate
+
+
+_local = threading.local()
+
+def _active_operations() -> set:
+    """the (service id, operation) pairs currently being timed on this thread"""
+    try:
+        return _local.active
+    except AttributeError:
+        _local.active = set()
+        return _local.active
+
+
+def instrumented_generator(name: str) -> Callable:
+    """like instrumented, for methods returning iterators (timed until exhausted)"""
+    def decorate(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            observers = self.observers
+            if not observers:
+                return method(self, *args, **kwargs)
+            return _timed_iteration(self, name, observers, method(self, *args, **kwargs))
+        wrapper.instrumented = True
+        return wrapper
+    return decorate
+
+
+def _timed_iteration(service, name, observers, iterator):
+    start = perf_counter()
+    try:
+        yield from iterator
+    finally:    # also when the caller stops early (or the iterator raises)
+        seconds = perf_counter() - start
+        for observer in observers:
+            observer.operation(service, name, seconds)
+
+
+def instrument(cls, methods: dict[str, Callable]) -> None:
+    """wrap the methods cls defines itself with the decorators given by name"""
+    for name, decorate in methods.items():
+        method = cls.__dict__.get(name)
+        if callable(method) and not getattr(method, 'instrumented', False):
+            setattr(cls, name, decorate(method))
+
+
+class Observable:
+    """mixin holding a service's observer registry"""
+
+    observers = ()
+
+    def observe(self, observer: Observer) -> Observer:
+        """register observer to receive this service's instrumentation events"""
+        self.observers = (*self.observers, observer)
+        return observer
+
+    def unobserve(self, observer: Observer) -> None:
+        self.observers = tuple(o for o in self.observers if o is not observer)
+
+    def progress(self, name: str, nbytes: int) -> None:
+        for observer in self.observers:
+            observer.progress(self, name, nbytes)
+
+    def cache_outcome(self, name: str, hit: bool) -> None:
+        for observer in self.observers:
+            observer.cache(self, name, hit)
+
+    def note(self, name: str, message: str) -> None:
+        for observer in self.observers:
+            observer.note(self, name, message)
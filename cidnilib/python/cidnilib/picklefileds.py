@@ -9,14 +9,20 @@ THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR I
 """
 
 from .main import DataService, KnowledgeService, HashAlgorithm, MultiHashEncoder
-from collections.abc import Callable
-from typing import BinaryIO, Iterator
+from .cidindex import CidIndex, page_cids, scan_parallel, shard_dirs
+from .locks import file_lock, StripedLock
+from collections.abc import Callable, Iterable
+from typing import BinaryIO, Iterator, TYPE_CHECKING
 from io import BytesIO
-from pickledb import PickleDB
 import os
 import sys
 from os.path import exists
-from multihash import to_b58_string, from_b58_string
+from .cid import to_b58_string, from_b58_string
+
+if TYPE_CHECKING:
+    from pickledb import PickleDB
+
+INDEX_NAME = 'pickle-cids.idx'  # not cids.idx, which a FileBasedDataService may keep in the same directory
 
 
 class PickleFileBasedDataService(DataService):
@@ -34,81 +40,157 @@ class PickleFileBasedDataService(DataService):
         self.levels = levels
         self.dbcache = dict()
         self._closed = False
-        self.dirty_dbs = set()
+        self.changes = dict()   # shard -> {key: value, or None if removed} since its last flush
+        self.shard_locks = StripedLock()
+        self.index = None       # unsharded stores are listed straight from their one shard
+        if levels:
+            self.index = CidIndex(os.path.join(path, INDEX_NAME))
+            self.index.create_if_empty(path)    # a new store can be indexed from the start
         
+    def shard(self, id:str) -> str:
+        """the characters of an encoded id naming its shard's directories"""
+        return id[-self.levels:] if self.levels else ''
         
-    def resolve_db(self, id:str) -> PickleDB:
+    def resolve_db(self, id:str) -> 'PickleDB':
         """find pickledb on the path that matches the name and generate if it doesn't exist"""
-        if self.levels == 0:
-            if self.dbcache:
-              return self.dbcache['']
-            self.dbcache[''] = PickleDB(self.path+'/'+'pickle.db') 
-            self.dbcache[''].load()
-            return self.dbcache['']
-        
-        if id[-self.levels-1:-1] in self.dbcache:
-            return self.dbcache[id[-self.levels-1:-1]]
-        subdir = ''
-        for i in range(self.levels):
-            subdir += id[-i-1] + '/'
-            if not exists(self.path+'/'+subdir):
-                os.mkdir(self.path+'/'+subdir)
-        db = PickleDB(self.path+'/'+subdir+'pickle.db') 
-        db.load()
-        self.dbcache[id[-self.levels-1:-1]] = db
-        return db
+        key = self.shard(id)
+        db = self.dbcache.get(key)
+        if db is not None:
+            self.cache_outcome('shard', True)
+            return db
+        from pickledb import PickleDB  # deferred, pickledb pulls in asyncio
+        with self.shard_locks(key):
+            if key in self.dbcache:     # loaded by another thread meanwhile
+                self.cache_outcome('shard', True)
+                return self.dbcache[key]
+            self.cache_outcome('shard', False)
+            subdir = ''.join(id[-i-1] + '/' for i in range(self.levels))
+            os.makedirs(self.path+'/'+subdir, exist_ok=True)
+            db = PickleDB(self.path+'/'+subdir+'pickle.db') 
+            db.load()
+            self.dbcache[key] = db
+            return db
+
+    def store(self, id:bytes, data:bytes) -> bool:
+        """store data under id in its shard unless already known, returning whether it was new
+
+            entries are written straight into the shard's in-memory table rather than
+            through PickleDB.set, which runs an event loop per call; shards are saved
+            on flush"""
+        key = self.encode(id)
+        shard = self.shard(key)
+        db = self.resolve_db(key)
+        if db.db.get(key):
+            return False
+        value = self.encode(data)
+        with self.shard_locks(shard):
+            if db.db.get(key):
+                return False
+            db.db[key] = value
+            self.changes.setdefault(shard, {})[key] = value
+            if self.index is not None:
+                self.index.add(key)
+        return True
 
     def know_binary(self, data:bytes):
         m = self.hasher()
         m.update(data)
         id = m.digest()
-        
-        db = self.resolve_db(self.encode(id))
-        if not db.get(self.encode(id)):
-            db.set(self.encode(id), self.encode(data))
-            self.dirty_dbs.add(db)
-            return id, True
-        else:
-            return id, False
+        return id, self.store(id, data)
+
+    def know_many(self, items:Iterable[str|bytes]) -> list[tuple[bytes, bool]]:
+        """remember each of the given strings or binary data as one batch"""
+        results = []
+        for data in items:
+            if type(data) == str:
+                data = bytes(data, self.text_encoding)
+            m = self.hasher()
+            m.update(data)
+            id = m.digest()
+            results.append((id, self.store(id, data)))
+        return results
 
     def known_binary(self, id:bytes) -> bool:
         """determine if value is available for given id"""
-        db = self.resolve_db(self.encode(id))
-        return db.get(self.encode(id))
+        key = self.encode(id)
+        return bool(self.resolve_db(key).db.get(key))
 
     def recall_binary(self, id:bytes):
         """retrieve data associated with name"""
-        db = self.resolve_db(self.encode(id))
-        data = db.get(self.encode(id))
+        key = self.encode(id)
+        data = self.resolve_db(key).db.get(key)
         if not data: return None
         return self.decode(data)
 
     def forget_binary(self, id:bytes) -> bytes:
         """forget data associated with id"""
-        db = self.resolve_db(self.encode(id))
-        db.remove(self.encode(id))
-        self.dirty_dbs.add(db)
-
-    def list_known_cids(self) -> Iterator[bytes]:
-        """Yield all known CIDs"""
+        key = self.encode(id)
+        shard = self.shard(key)
+        db = self.resolve_db(key)
+        with self.shard_locks(shard):
+            db.db.pop(key, None)
+            self.changes.setdefault(shard, {})[key] = None
+            if self.index is not None:
+                self.index.discard(key)
+
+    def list_known_cids(self, prefix:str|None = None, after:str|None = None, limit:int|None = None) -> Iterator[bytes]:
+        """Yield known CIDs in order of their encoded form (see DataService.list_known_cids)
+
+            sharded stores are listed from the listing index. without one, the shards are
+            read in parallel (using those already loaded in dbcache) to build it."""
         if self.levels == 0:
-          db = self.resolve_db('')
-          yield from map(self.decode, db.all())  
-          
-        else:
-            self.flush()
-            for root, dirs, files in os.walk(self.path):
-                if 'pickle.db' in files:
-                    db_path = os.path.join(root, 'pickle.db')
-                    db = PickleDB(db_path)
-                    db.load()
-                    yield from map(self.decode, db.all())
-                
+            db = self.resolve_db('')
+            with self.shard_locks(''):
+                cids = sorted(db.db)
+            yield from map(self.decode, page_cids(cids, prefix, after, limit))
+            return
+        if not self.index.active:
+            cached = []
+            for shard, db in list(self.dbcache.items()):
+                with self.shard_locks(shard):
+                    cached += db.db
+            self.index.build(cached + scan_parallel(shard_dirs(self.path, self.levels), self.scan_shard))
+        yield from map(self.decode, self.index.page(prefix, after, limit))
+
+    def scan_shard(self, root:str) -> list[str]:
+        """the encoded cids saved in the shards under root which aren't in dbcache"""
+        from pickledb import PickleDB
+        cids = []
+        with os.scandir(root) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    cids += self.scan_shard(entry.path)
+                elif entry.name == 'pickle.db':
+                    key = ''.join(reversed(os.path.relpath(root, self.path).split(os.sep)))
+                    if key not in self.dbcache:
+                        db = PickleDB(entry.path)
+                        db.load()
+                        cids += db.db.keys()
+        return cids
 
     def flush(self):
-        for db in self.dirty_dbs:
-            db.save()
-        self.dirty_dbs = set()
+        """save changed shards, merging in what other processes saved since they were loaded
+
+            each shard is reloaded, has this service's changes applied and is saved while
+            holding the shard's lock, so concurrent writers to a store don't lose writes"""
+        from pickledb import PickleDB
+        for shard in list(self.changes):
+            db = self.dbcache[shard]
+            with self.shard_locks(shard), file_lock(db.location):
+                changes = self.changes.pop(shard, None)
+                if changes is None:     # flushed by another thread
+                    continue
+                saved = PickleDB(db.location)
+                saved.load()
+                for key, value in changes.items():
+                    if value is None:
+                        saved.db.pop(key, None)
+                    else:
+                        saved.db[key] = value
+                db.db = saved.db
+                db.save()
+        if self.index is not None:
+            self.index.flush()
 
     def close(self):
         if getattr(self, "_closed", False):
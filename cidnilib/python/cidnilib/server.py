@@ -0,0 +1,262 @@
+"""
+Copyright © 2025 Joseph Kendall-Morwick
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+# serves a data service (and optionally the triples of a knowledge service) over http
+#
+#     GET/HEAD /cid/<cid>    the data; ETag is the cid and responses are cacheable forever.
+#                            single byte ranges (Range: bytes=a-b) are supported
+#     PUT /cid/<cid>         store data, which must have the given cid
+#     PUT /cid               store data, answering with its cid (201 if it was new)
+#     GET /cid?prefix=&after=&limit=
+#                            known cids, one per line (see DataService.list_known_cids)
+#     GET /digests?depth=    the digest of each shard's cids as json (see DataService.shard_digests)
+#     GET /cid?shards=&depth=
+#                            known cids in the given (comma separated) shards
+#     GET /triples?subject=&property=&value=
+#                            matching triples as a json list
+#
+# the data service holding the triples can be served too; the same endpoints under
+# /knowledge (e.g. /knowledge/cid/<cid>) address it, so stores can be synced with triples.
+# services with a flush method are flushed every few seconds and on shutdown.
+#
+# connections are kept alive (http/1.1) and file backed data is sent with sendfile
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+import json
+import os
+import re
+import tempfile
+import time
+from typing import BinaryIO
+
+from .main import DataService, KnowledgeService
+from .sync import SHARD_DEPTH
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+SPOOL_BYTES = 8 * 1048576    # put bodies checked against their cid are kept in memory up to this size
+
+_range = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def parse_range(header: str | None, size: int) -> tuple[int, int] | None:
+    """the (offset, length) selected by a single byte range header, None for the whole entity
+
+        raises ValueError for ranges that can't be satisfied"""
+    if not header:
+        return None
+    match = _range.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None     # multiple or malformed ranges are ignored, as RFC 9110 allows
+    first, last = match.groups()
+    if first == '':
+        length = min(int(last), size)
+        if length == 0:
+            raise ValueError(header)
+        return size - length, length
+    first = int(first)
+    last = min(int(last), size - 1) if last else size - 1
+    if first >= size or last < first:
+        raise ValueError(header)
+    return first, last - first + 1
+
+
+class BodyReader:
+    """reads at most length bytes of a request body"""
+
+    def __init__(self, fp, length: int):
+        self.fp = fp
+        self.remaining = length
+
+    def read(self, n: int = -1) -> bytes:
+        if n < 0 or n > self.remaining:
+            n = self.remaining
+        data = self.fp.read(n) if n else b''
+        self.remaining -= len(data)
+        return data
+
+
+class CidRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'   # keep-alive
+    server_version = 'cidni'
+    disable_nagle_algorithm = True  # headers and body are written separately
+
+    def resolve(self) -> tuple[DataService | None, str]:
+        """the data service a request addresses and the path within it"""
+        path = urlsplit(self.path).path
+        if path == '/knowledge' or path.startswith('/knowledge/'):
+            return self.server.kds, path[len('/knowledge'):]
+        return self.server.ds, path
+
+    def do_GET(self):
+        self.route(head=False)
+
+    def do_HEAD(self):
+        self.route(head=True)
+
+    def route(self, head: bool):
+        self.ds, path = self.resolve()
+        query = {k: v[-1] for k, v in parse_qs(urlsplit(self.path).query).items()}
+        depth = int(query['depth']) if query.get('depth', '').isdigit() else SHARD_DEPTH
+        if self.ds is None:
+            self.send_error(404)
+        elif path.startswith('/cid/'):
+            self.send_data(unquote(path[5:]), head)
+        elif path in ('/cid', '/cid/') and 'shards' in query:
+            cids = self.ds.list_shard_cids(filter(None, query['shards'].split(',')), depth)
+            self.send_body('\n'.join(map(self.ds.encode, cids)).encode('ascii'), 'text/plain', head)
+        elif path in ('/cid', '/cid/'):
+            limit = int(query['limit']) if query.get('limit', '').isdigit() else None
+            cids = self.ds.list_known_cids(query.get('prefix'), query.get('after'), limit)
+            self.send_body('\n'.join(map(self.ds.encode, cids)).encode('ascii'), 'text/plain', head)
+        elif path == '/digests':
+            self.send_body(json.dumps(self.ds.shard_digests(depth)).encode('ascii'), 'application/json', head)
+        elif path == '/triples' and self.server.ks is not None:
+            triples = self.server.ks.inquire(query.get('subject'), query.get('property'), query.get('value'))
+            self.send_body(json.dumps([list(t) for t in triples]).encode('utf-8'), 'application/json', head)
+        else:
+            self.send_error(404)
+
+    def decoded(self, cid: str) -> bytes | None:
+        try:
+            return self.ds.decode(cid)
+        except Exception:
+            return None
+
+    def send_data(self, cid: str, head: bool):
+        id = self.decoded(cid)
+        if id is None or not self.ds.known_binary(id):
+            self.send_error(404)
+            return
+        etag = '"' + cid + '"'
+        if self.headers.get('If-None-Match') in (etag, '*'):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', IMMUTABLE)
+            self.end_headers()
+            return
+        stream = self.ds.recall_stream(id)
+        with stream:
+            size = stream.seek(0, os.SEEK_END)
+            try:
+                selected = parse_range(self.headers.get('Range'), size)
+            except ValueError:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{size}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            offset, length = selected or (0, size)
+            self.send_response(206 if selected else 200)
+            if selected:
+                self.send_header('Content-Range', f'bytes {offset}-{offset + length - 1}/{size}')
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Length', str(length))
+            self.send_header('Accept-Ranges', 'bytes')
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', IMMUTABLE)
+            self.end_headers()
+            if not head and length:
+                self.wfile.flush()
+                # socket.sendfile uses os.sendfile for real files and falls back to send
+                self.connection.sendfile(stream, offset, length)
+
+    def send_body(self, body: bytes, content_type: str, head: bool = False, status: int = 200, headers: dict | None = None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def spool(self, body: BodyReader) -> tuple[BinaryIO, bytes]:
+        """copy a request body to a rewound temporary file (in memory while small) and hash it"""
+        spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES, dir=getattr(self.ds, 'path', None))
+        m = self.ds.hasher()
+        while True:
+            data = body.read(1048576)
+            if not data:
+                break
+            m.update(data)
+            spooled.write(data)
+        spooled.seek(0)
+        return spooled, m.digest()
+
+    def do_PUT(self):
+        self.ds, path = self.resolve()
+        if self.ds is None or not (path.startswith('/cid/') or path == '/cid'):
+            self.close_connection = True
+            self.send_error(404)
+            return
+        length = self.headers.get('Content-Length')
+        if length is None or not length.isdigit():
+            self.close_connection = True
+            self.send_error(411)
+            return
+        expected = unquote(path[5:])
+        body = BodyReader(self.rfile, int(length))
+        if expected:    # check the data before storing it, as a concurrent put may store it too
+            spooled, digest = self.spool(body)
+            with spooled:
+                cid = self.ds.encode(digest)
+                if expected != cid:
+                    self.send_error(422, f'data has cid {cid}')
+                    return
+                id, isnew = self.ds.know_file(spooled)
+        else:
+            id, isnew = self.ds.know_file(body)
+        cid = self.ds.encode(id)
+        self.send_body(cid.encode('ascii'), 'text/plain', status=201 if isnew else 200,
+                       headers={'Location': '/cid/' + cid, 'ETag': '"' + cid + '"'})
+
+    def do_DELETE(self):
+        self.ds, path = self.resolve()
+        id = self.decoded(unquote(path[5:])) if path.startswith('/cid/') else None
+        if self.ds is None or id is None or not self.ds.known_binary(id):
+            self.send_error(404)
+            return
+        self.ds.forget_binary(id)
+        self.send_response(204)
+        self.end_headers()
+
+
+class CidServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], ds: DataService, ks: KnowledgeService | None = None,
+                 kds: DataService | None = None, flush_interval: float = 5.0, handler=CidRequestHandler):
+        super().__init__(address, handler)
+        self.ds = ds
+        self.ks = ks
+        self.kds = kds
+        self.flush_interval = flush_interval
+        self.last_flush = time.monotonic()
+
+    def service_actions(self):
+        """called between requests by serve_forever; periodically saves written data"""
+        if time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        for service in (self.ds, self.kds):
+            if hasattr(service, 'flush'):
+                service.flush()
+
+    def server_close(self):
+        super().server_close()
+        self.flush()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
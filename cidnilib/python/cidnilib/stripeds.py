@@ -0,0 +1,258 @@
+"""
+Copyright © 2025 Joseph Kendall-Morwick
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+from .main import DataService
+from collections.abc import Callable, Iterable
+from hashlib import blake2b
+from heapq import merge
+from itertools import groupby, islice
+from typing import BinaryIO, Iterator
+import json
+import os
+import tempfile
+import uuid
+
+LAYOUT_NAME = 'stripes.json'
+
+
+def parallel(function: Callable, items: list) -> list:
+    """map function over items in a thread pool (directly when there's only one)"""
+    if len(items) < 2:
+        return list(map(function, items))
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(len(items)) as pool:
+        return list(pool.map(function, items))
+
+
+class StripedDataService(DataService):
+    """spreads data over several data services (e.g. one per disk) by rendezvous hashing of cids
+
+        each cid belongs to the stripe scoring highest for it, the score hashing the cid with
+        the stripe's name, so every operation is routed without a lookup index. the order of
+        the stripes doesn't matter. adding a stripe only moves the data the new stripe now
+        scores highest for (about 1/n of it), which rebalance does. until then lookups
+        missing the owning stripe fall back to the others.
+
+        stripes with a path record in stripes.json their name (a random id unless names are
+        given), the names of all the stripes and whether a rebalance is pending, so both
+        survive restarts. adding a stripe to a store already holding data (including a
+        plain, unstriped store) marks a rebalance pending. opening a store without one of
+        the stripes it was striped over is refused."""
+
+    def __init__(self, stripes: list[DataService], names: list[str] | None = None):
+        if not stripes:
+            raise ValueError('at least one stripe is required')
+        super().__init__(stripes[0].encode, stripes[0].decode, stripes[0].hasher)
+        self.stripes = []
+        self.names = []
+        self.keys = []
+        layouts = [read_layout(ds) for ds in stripes]
+        for i, (ds, layout) in enumerate(zip(stripes, layouts)):
+            self._attach(ds, names[i] if names else layout.get('name') or self._default_name(ds, i))
+        members = set().union(*(layout.get('members', ()) for layout in layouts))
+        missing = members - set(self.names)
+        if missing:
+            raise ValueError('stripes {names} of this store are missing'.format(names=', '.join(sorted(missing))))
+        added = set(self.names) - members
+        self.misplaced = any(layout.get('rebalance', False) for layout in layouts)
+        if added and len(self.stripes) > 1 and not self.misplaced:
+            self.misplaced = any(next(iter(ds.list_known_cids(limit=1)), None) is not None for ds in self.stripes)
+        if added or any(layout.get('rebalance', False) != self.misplaced for layout in layouts if layout):
+            self.save_layout()
+        self.path = getattr(stripes[0], 'path', None)    # where callers keep store-wide files
+
+    @staticmethod
+    def _default_name(ds: DataService, position: int) -> str:
+        return uuid.uuid4().hex if hasattr(ds, 'path') else str(position)
+
+    def _attach(self, ds: DataService, name: str) -> None:
+        key = blake2b(name.encode('utf-8'), digest_size=16).digest()
+        if key in self.keys:
+            raise ValueError('stripe {name} is already present'.format(name=name))
+        self.stripes.append(ds)
+        self.names.append(name)
+        self.keys.append(key)
+
+    def add_stripe(self, ds: DataService, name: str | None = None) -> None:
+        """add a stripe, marking a rebalance pending to move the data it now owns to it"""
+        self._attach(ds, name or read_layout(ds).get('name') or self._default_name(ds, len(self.stripes)))
+        self.misplaced = True
+        self.save_layout()
+
+    def save_layout(self) -> None:
+        """record the stripes and whether a rebalance is pending in each stripe with a path"""
+        for ds, name in zip(self.stripes, self.names):
+            path = getattr(ds, 'path', None)
+            if path is not None:
+                temp = os.path.join(path, LAYOUT_NAME + '.tmp')
+                with open(temp, 'w') as fp:
+                    json.dump({'name': name, 'members': sorted(self.names), 'rebalance': self.misplaced}, fp)
+                os.replace(temp, os.path.join(path, LAYOUT_NAME))
+
+    def stripe_index(self, id: bytes) -> int:
+        if len(self.keys) == 1:
+            return 0
+        scores = [blake2b(id, key=key, digest_size=8).digest() for key in self.keys]
+        return scores.index(max(scores))
+
+    def stripe(self, id: bytes) -> DataService:
+        """the stripe owning id"""
+        return self.stripes[self.stripe_index(id)]
+
+    def holder(self, id: bytes) -> DataService | None:
+        """the stripe holding id: its owner, or while misplaced, any stripe knowing it"""
+        owner = self.stripe(id)
+        if owner.known_binary(id) or not self.misplaced:
+            return owner
+        for ds in self.stripes:
+            if ds is not owner and ds.known_binary(id):
+                return ds
+        return owner
+
+    def id_of(self, data: bytes) -> bytes:
+        m = self.hasher()
+        m.update(data)
+        return m.digest()
+
+    def know_binary(self, data: bytes):
+        return self.stripe(self.id_of(data)).know_binary(data)
+
+    def know_many(self, items: Iterable[str|bytes]) -> list[tuple[bytes, bool]]:
+        """remember each item, storing each stripe's share of the batch in parallel"""
+        items = [bytes(data, self.text_encoding) if type(data) == str else data for data in items]
+        groups = dict()
+        for i, data in enumerate(items):
+            groups.setdefault(self.stripe_index(self.id_of(data)), []).append(i)
+        results = [None] * len(items)
+
+        def store(group):
+            stripe, positions = group
+            for i, result in zip(positions, self.stripes[stripe].know_many([items[i] for i in positions])):
+                results[i] = result
+
+        parallel(store, list(groups.items()))
+        return results
+
+    def know_file(self, fp: BinaryIO):
+        """remember data read from fp, hashing it first to find its stripe
+
+            seekable files are read twice; other streams are spooled to a temporary file"""
+        try:
+            start = fp.tell()
+            fp.seek(start)
+        except (AttributeError, OSError):
+            with tempfile.SpooledTemporaryFile(16777216) as spool:
+                id = self._hash_stream(fp, spool)
+                spool.seek(0)
+                return self.stripe(id).know_file(spool)
+        id = self._hash_stream(fp)
+        fp.seek(start)
+        return self._placed(id, self.stripe(id).know_file(fp))
+
+    def know_path(self, path: str, link: str | None = None):
+        with open(path, 'rb') as fp:
+            id = self._hash_stream(fp)
+        return self._placed(id, self.stripe(id).know_path(path, link))
+
+    def _hash_stream(self, fp, copy=None) -> bytes:
+        m = self.hasher()
+        while True:
+            data = fp.read(1048576)
+            if not data:
+                return m.digest()
+            m.update(data)
+            if copy is not None:
+                copy.write(data)
+
+    def _placed(self, expected: bytes, result: tuple[bytes, bool]) -> tuple[bytes, bool]:
+        # a file changed between hashing and storing it may have landed on a stripe
+        # which doesn't own its cid
+        id, isnew = result
+        if id != expected and self.stripe(id) is not self.stripe(expected):
+            self._move(self.stripe(expected), self.stripe(id), id)
+        return id, isnew
+
+    def known_binary(self, id: bytes) -> bool:
+        return self.holder(id).known_binary(id)
+
+    def recall_binary(self, id: bytes) -> bytes:
+        return self.holder(id).recall_binary(id)
+
+    def recall_stream(self, id: bytes|str) -> BinaryIO:
+        id = self.binary(id)
+        return self.holder(id).recall_stream(id)
+
+    def recall_file(self, id: bytes|str, fp: BinaryIO) -> int|None:
+        id = self.binary(id)
+        return self.holder(id).recall_file(id, fp)
+
+    def forget_binary(self, id: bytes):
+        if not self.misplaced:
+            return self.stripe(id).forget_binary(id)
+        for ds in self.stripes:
+            ds.forget_binary(id)
+
+    def list_known_cids(self, prefix: str|None = None, after: str|None = None, limit: int|None = None) -> Iterator[bytes]:
+        listings = parallel(lambda ds: list(ds.list_known_cids(prefix, after, limit)), self.stripes)
+        if prefix is None and after is None and limit is None:
+            if not self.misplaced:
+                return [id for ids in listings for id in ids]
+            return list(dict.fromkeys(id for ids in listings for id in ids))
+        merged = merge(*listings, key=self.encode)
+        if self.misplaced:
+            merged = (id for id, _ in groupby(merged))    # a cid may be on two stripes
+        return list(islice(merged, limit))
+
+    def rebalance(self) -> int:
+        """move data to the stripes owning it (e.g. after add_stripe), returning how many moved"""
+        def move_misplaced(ds):
+            moved = 0
+            for id in list(ds.list_known_cids()):
+                owner = self.stripe(id)
+                if owner is not ds:
+                    self._move(ds, owner, id)
+                    moved += 1
+            return moved
+
+        moved = sum(parallel(move_misplaced, self.stripes))
+        self.misplaced = False
+        self.save_layout()
+        return moved
+
+    def _move(self, source: DataService, target: DataService, id: bytes) -> None:
+        if not target.known_binary(id):
+            stream = source.recall_stream(id)
+            with stream:
+                copied, _ = target.know_file(stream)
+            if copied != id:
+                raise IOError('copy of {cid} does not match its cid'.format(cid=self.encode(id)))
+        source.forget_binary(id)
+
+    def flush(self):
+        parallel(lambda ds: ds.flush(), [ds for ds in self.stripes if hasattr(ds, 'flush')])
+
+    def close(self):
+        parallel(lambda ds: ds.close(), [ds for ds in self.stripes if hasattr(ds, 'close')])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def read_layout(ds: DataService) -> dict:
+    """the stripes.json recorded in a stripe's path (empty if it has none)"""
+    path = getattr(ds, 'path', None)
+    if path is None or not os.path.exists(os.path.join(path, LAYOUT_NAME)):
+        return {}
+    with open(os.path.join(path, LAYOUT_NAME)) as fp:
+        return json.load(fp)
@@ -0,0 +1,99 @@
+"""
+Copyright © 2025 Joseph Kendall-Morwick
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+# reconciles the cids held by two data services and copies over what one lacks
+#
+# each store summarises its cids as a digest per shard, shards being named by the last
+# characters of the encoded cids. a single store-wide digest is compared first, then the
+# per-shard digests, and only cids of shards whose digests differ are listed and diffed.
+# data services answering these summaries remotely (HttpDataService) keep the traffic
+# proportional to the difference between the stores.
+
+from collections import defaultdict
+from collections.abc import Iterable
+from hashlib import sha256
+from typing import NamedTuple
+
+SHARD_DEPTH = 2
+
+
+def shard_of(cid: str, depth: int) -> str:
+    return cid[len(cid) - depth:] if depth else ''
+
+
+def shard_digests(cids: Iterable[str], depth: int = SHARD_DEPTH) -> dict[str, str]:
+    """the digest of each shard's sorted encoded cids; depth 0 gives one store-wide digest"""
+    shards = defaultdict(list)
+    for cid in cids:
+        shards[shard_of(cid, depth)].append(cid)
+    return {shard: sha256('\n'.join(sorted(members)).encode('ascii')).hexdigest()
+            for shard, members in shards.items()}
+
+
+class SyncResult(NamedTuple):
+    copied: int                 # cids copied (in either direction)
+    shards_compared: int
+    shards_differing: int
+    failed: list[str]           # encoded cids which couldn't be copied or didn't verify
+
+
+def differing_shards(src, dst, depth: int = SHARD_DEPTH) -> tuple[list[str], int]:
+    """the shards whose digests differ between src and dst, and the number compared"""
+    if src.shard_digests(0) == dst.shard_digests(0):
+        return [], 1
+    ours, theirs = src.shard_digests(depth), dst.shard_digests(depth)
+    shards = ours.keys() | theirs.keys()
+    return sorted(s for s in shards if ours.get(s) != theirs.get(s)), len(shards)
+
+
+def copy_cids(src, dst, cids: list[str], workers: int = 8, batch: int = 64) -> tuple[int, list[str]]:
+    """copy the data of the encoded cids from src to dst in parallel batches, verifying each"""
+    def copy_batch(batch_cids):
+        copied, failed = 0, []
+        for cid in batch_cids:
+            try:
+                stream = src.recall_stream(src.decode(cid))
+                with stream:
+                    id, isnew = dst.know_file(stream)
+                if dst.encode(id) == cid:
+                    copied += 1
+                else:    # don't leave what src served wrongly behind in dst
+                    if isnew:
+                        dst.forget_binary(id)
+                    failed.append(cid)
+            except Exception:
+                failed.append(cid)
+        return copied, failed
+
+    batches = [cids[i:i + batch] for i in range(0, len(cids), batch)]
+    copied, failed = 0, []
+    if len(batches) < 2:
+        results = map(copy_batch, batches)
+    else:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(workers) as pool:
+            results = list(pool.map(copy_batch, batches))
+    for n, errors in results:
+        copied += n
+        failed += errors
+    return copied, failed
+
+
+def sync(src, dst, both: bool = False, depth: int = SHARD_DEPTH, workers: int = 8, batch: int = 64) -> SyncResult:
+    """copy the data src holds but dst lacks to dst (and the reverse too if both)"""
+    shards, compared = differing_shards(src, dst, depth)
+    ours = {src.encode(id) for id in src.list_shard_cids(shards, depth)} if shards else set()
+    theirs = {dst.encode(id) for id in dst.list_shard_cids(shards, depth)} if shards else set()
+    copied, failed = copy_cids(src, dst, sorted(ours - theirs), workers, batch)
+    if both:
+        n, errors = copy_cids(dst, src, sorted(theirs - ours), workers, batch)
+        copied += n
+        failed += errors
+    return SyncResult(copied, compared, len(shards), failed)
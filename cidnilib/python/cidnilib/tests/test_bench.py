@@ -0,0 +1,33 @@
+import json
+
+from cidnilib import bench
+
+
+def test_parse_sizes():
+    assert bench.parse_sizes("64:0.7,4096:0.3") == [(64, 0.7), (4096, 0.3)]
+    assert bench.parse_sizes("100") == [(100, 1.0)]
+
+
+def test_corpus_is_reproducible_and_distinct():
+    sizes = bench.parse_sizes("16:0.5,256:0.5")
+
+    a = bench.corpus(50, sizes, seed=3)
+
+    assert a == bench.corpus(50, sizes, seed=3)
+    assert len(set(a)) == 50
+    assert {len(o) for o in a} == {16, 256}
+
+
+def test_run_reports_every_benchmark(tmp_path):
+    out = tmp_path / "bench.json"
+
+    bench.main(["--objects", "10", "--sizes", "64", "--triples", "60", "--no-cli", "-o", str(out)])
+
+    report = json.loads(out.read_text())
+    seen = {(r["benchmark"], r["backend"]) for r in report["results"]}
+    for backend in ("memory", "file", "pickle", "splitter", "striped"):
+        for benchmark in ("know", "recall", "known", "list"):
+            assert (benchmark, backend) in seen
+    assert ("rebuild", "pickle") in seen
+    shapes = {r["shape"] for r in report["results"] if r["benchmark"] == "inquire"}
+    assert shapes == {"spo", "sp?", "s??", "?po", "?p?", "??o"}
@@ -0,0 +1,62 @@
+import os
+import random
+
+import base58
+import pytest
+
+from cidnilib.cid import CID, b58decode, b58encode, from_b58_string, to_b58_string
+from cidnilib.filebasedds import FileBasedDataService
+from cidnilib.inmemds import InMemoryDataService
+
+
+def test_codec_matches_base58_package():
+    rng = random.Random(0)
+    samples = [b"", b"\0", b"\0\0ab", bytes(34), b"\xff" * 40]
+    samples += [b"\0" * rng.randrange(3) + rng.randbytes(rng.randrange(80)) for _ in range(500)]
+    samples.append(rng.randbytes(5000))
+    for data in samples:
+        text = b58encode(data)
+        assert text == base58.b58encode(data).decode()
+        assert b58decode(text) == data
+        assert to_b58_string(data) == text
+        assert from_b58_string(text) == data
+
+
+def test_codec_rejects_bad_input():
+    with pytest.raises(ValueError):
+        b58decode("not0valid")
+    with pytest.raises(TypeError):
+        to_b58_string("text")
+    with pytest.raises(TypeError):
+        from_b58_string(b"binary")
+
+
+def test_cid_converts_each_form_once():
+    id, _ = InMemoryDataService().know_binary(b"hello")
+    text = to_b58_string(id)
+
+    from_text, from_binary = CID(text=text), CID(binary=id)
+
+    assert from_text == from_binary and hash(from_text) == hash(from_binary)
+    assert from_text.binary == id and str(from_binary) == text
+    assert bytes(from_text) is from_text.binary
+    assert CID.of(id) is CID.of(id)
+    assert CID.of(text) is CID.of(id) and CID.of(text).text == text
+    assert CID.of(from_text) is from_text
+    assert sorted([CID.of(b"\0\2"), CID.of(b"\0\1")]) == [CID.of(b"\0\1"), CID.of(b"\0\2")]
+    assert to_b58_string(from_binary) == text and from_b58_string(from_text) == id
+    with pytest.raises(AttributeError):
+        from_text.extra = 1
+
+
+def test_data_services_accept_cids(tmp_path):
+    for ds in (InMemoryDataService(), FileBasedDataService(str(tmp_path))):
+        id, _ = ds.know_binary(b"hello")
+        cid = CID(text=ds.encode(id))
+
+        assert ds.known(cid)
+        assert ds.recall(cid) == b"hello"
+        assert ds.recall_stream(cid).read() == b"hello"
+        assert ds.encode(cid) == cid.text
+        ds.forget(cid)
+        assert not ds.known(cid)
@@ -0,0 +1,135 @@
+import os
+
+from cidnilib.cidindex import CidIndex, page_cids
+from cidnilib.filebasedds import FileBasedDataService
+from cidnilib.picklefileds import PickleFileBasedDataService
+
+
+def test_page_cids_prefix_after_and_limit():
+    cids = ["a1", "a2", "a3", "b1", "b2", "c1"]
+
+    assert page_cids(cids) == cids
+    assert page_cids(cids, prefix="b") == ["b1", "b2"]
+    assert page_cids(cids, after="a2", limit=2) == ["a3", "b1"]
+    assert page_cids(cids, prefix="a", after="a1", limit=5) == ["a2", "a3"]
+    assert page_cids(cids, prefix="a", after="b1") == []
+
+
+def test_index_log_is_replayed_and_compacted(tmp_path):
+    path = str(tmp_path / "cids.idx")
+    index = CidIndex(path)
+    index.build(["b", "d"])
+    index.add("a")
+    index.discard("d")
+    index.add("c")
+    index.flush()
+
+    assert CidIndex(path).cids() == ["a", "b", "c"]
+
+    index = CidIndex(path)
+    index.compact()
+
+    assert not os.path.exists(path + ".log")
+    assert CidIndex(path).cids() == ["a", "b", "c"]
+
+
+def test_inactive_index_ignores_changes(tmp_path):
+    index = CidIndex(str(tmp_path / "cids.idx"))
+    index.add("a")
+    index.flush()
+
+    assert not index.active
+    assert not os.path.exists(index.log_path)
+
+
+def paged(ds, **kwargs):
+    return [ds.encode(cid) for cid in ds.list_known_cids(**kwargs)]
+
+
+def test_file_store_pages_through_cids(tmp_path):
+    ds = FileBasedDataService(str(tmp_path))
+    cids = sorted(ds.encode(ds.know(str(i))[0]) for i in range(20))
+
+    assert paged(ds) == cids
+    first = paged(ds, limit=7)
+    rest = paged(ds, after=first[-1])
+    assert first + rest == cids
+    assert paged(ds, prefix=cids[5][:4]) == [c for c in cids if c.startswith(cids[5][:4])]
+
+    ds.forget(cids[0])
+    ds.flush()
+    assert paged(FileBasedDataService(str(tmp_path))) == cids[1:]
+
+
+def test_file_store_without_index_is_scanned(tmp_path):
+    ds = FileBasedDataService(str(tmp_path))
+    cids = sorted(ds.encode(ds.know(str(i))[0]) for i in range(10))
+    ds.flush()
+    os.remove(tmp_path / "cids.idx")
+    os.remove(tmp_path / "cids.idx.log")
+
+    ds = FileBasedDataService(str(tmp_path))
+    assert not ds.index.active
+    assert paged(ds) == cids
+    assert ds.index.active
+
+
+def test_pickle_store_without_index_uses_loaded_shards(tmp_path):
+    with PickleFileBasedDataService(str(tmp_path)) as ds:
+        saved = [ds.encode(ds.know(str(i))[0]) for i in range(10)]
+    os.remove(tmp_path / "pickle-cids.idx")
+    os.remove(tmp_path / "pickle-cids.idx.log")
+
+    ds = PickleFileBasedDataService(str(tmp_path))
+    unsaved = [ds.encode(ds.know(str(i))[0]) for i in range(10, 20)]
+
+    assert paged(ds) == sorted(saved + unsaved)
+
+
+def test_index_changes_are_logged_in_batches(tmp_path):
+    index = CidIndex(str(tmp_path / "cids.idx"), flush_every=3)
+    index.build([])
+    index.add("a")
+    index.add("b")
+
+    assert not os.path.exists(index.log_path)
+    assert index.cids() == ["a", "b"]
+    index.add("c")
+    assert os.path.exists(index.log_path)
+
+
+def test_knowledge_store_in_a_file_store_keeps_out_of_its_listing(tmp_path):
+    ds = FileBasedDataService(str(tmp_path))
+    blob, _ = ds.know(b"blob")
+    with PickleFileBasedDataService(str(tmp_path), levels=0) as kds:
+        kds.know('["subject", "property", "value"]')
+    ds.flush()
+
+    assert list(FileBasedDataService(str(tmp_path)).list_known_cids()) == [blob]
+
+
+def test_file_store_is_rescanned_after_a_writer_dies_unflushed(tmp_path):
+    import subprocess
+    import sys
+    FileBasedDataService(str(tmp_path)).close()
+    crash = ("import os; from cidnilib.filebasedds import FileBasedDataService\n"
+             "ds = FileBasedDataService({path!r})\n"
+             "for i in range(10): ds.know(str(i))\n"
+             "os._exit(0)\n").format(path=str(tmp_path))
+    subprocess.run([sys.executable, "-c", crash], check=True, cwd=os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+    ds = FileBasedDataService(str(tmp_path))
+
+    assert len(paged(ds)) == 10
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".dirty")]
+
+
+def test_clean_writers_leave_no_marker(tmp_path):
+    ds = FileBasedDataService(str(tmp_path))
+    ds.know("a")
+    assert [name for name in os.listdir(tmp_path) if name.endswith(".dirty")]
+
+    ds.close()
+
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".dirty")]
+    assert not CidIndex(str(tmp_path / "cids.idx")).recover()
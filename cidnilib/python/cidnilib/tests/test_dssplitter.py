@@ -103,3 +103,12 @@ def test_list_known_cids_contains_all(ds):
 
     assert cid1 in cids
     assert cid2 in cids
+
+
+def test_paged_listing_merges_both_stores():
+    small, large = InMemoryDataService(), InMemoryDataService()
+    ds = SplitterDataService(small, large, size_limit=5)
+    cids = sorted(ds.encode(ds.know_binary(data)[0]) for data in (b"a", b"bb", b"cccccc", b"dddddddd"))
+
+    assert [ds.encode(c) for c in ds.list_known_cids(limit=3)] == cids[:3]
+    assert [ds.encode(c) for c in ds.list_known_cids(after=cids[1])] == cids[2:]
@@ -1,4 +1,7 @@
 import io
+import os
+import stat
+import time
 import pytest
 
 from cidnilib.filebasedds import FileBasedDataService
@@ -59,6 +62,27 @@ def test_know_file(ds):
     assert ds.recall_binary(cid) == b"file contents"
 
 
+def test_know_file_of_stored_data_only_hashes(ds, monkeypatch):
+    ds.know_file(io.BytesIO(b"file contents"))
+    monkeypatch.setattr("cidnilib.filebasedds.tempfile.NamedTemporaryFile", None)
+
+    cid, created = ds.know_file(io.BytesIO(b"file contents"))
+
+    assert not created
+    assert ds.recall_binary(cid) == b"file contents"
+
+
+def test_know_file_from_a_pipe_is_copied_once(ds):
+    read, write = os.pipe()
+    os.write(write, b"piped contents")
+    os.close(write)
+    with open(read, "rb") as fp:
+        cid, created = ds.know_file(fp)
+
+    assert created
+    assert ds.recall_binary(cid) == b"piped contents"
+
+
 def test_known_with_binary_cid(ds):
     cid, _ = ds.know_binary(b"hello")
 
@@ -77,3 +101,208 @@ def test_recall_stream(ds):
     stream = ds.recall_stream(cid)
     assert stream
     assert stream.read() == b"streamed"
+
+
+def test_recall_file(ds, tmp_path):
+    data = bytes(range(256)) * 1000
+    cid, _ = ds.know_binary(data)
+    out = tmp_path / "out.bin"
+
+    with open(out, 'wb') as f:
+        assert ds.recall_file(cid, f) == len(data)
+
+    assert out.read_bytes() == data
+
+
+def test_recall_file_appends_after_existing_data(ds, tmp_path):
+    cid, _ = ds.know_binary(b"tail")
+    out = tmp_path / "out.bin"
+
+    with open(out, 'wb') as f:
+        f.write(b"head ")
+        ds.recall_file(cid, f)
+        f.write(b"!")
+
+    assert out.read_bytes() == b"head tail!"
+
+
+def test_recall_file_to_stream_without_fileno(ds):
+    cid, _ = ds.know_binary(b"streamed")
+    out = io.BytesIO()
+
+    assert ds.recall_file(cid, out) == 8
+    assert out.getvalue() == b"streamed"
+
+
+def test_know_path_hardlink(ds, tmp_path):
+    source = tmp_path / "source.bin"
+    source.write_bytes(b"linked contents")
+
+    cid, created = ds.know_path(str(source), 'hardlink')
+
+    assert created
+    assert ds.recall_binary(cid) == b"linked contents"
+    stored = ds.resolve_path(ds.encode(cid))
+    assert os.path.samefile(stored, source)
+    assert not os.stat(stored).st_mode & stat.S_IWUSR
+
+
+def test_know_path_hardlink_of_stored_data_keeps_source_mode(ds, tmp_path):
+    ds.know_binary(b"linked contents")
+    source = tmp_path / "source.bin"
+    source.write_bytes(b"linked contents")
+    mode = os.stat(source).st_mode
+
+    cid, created = ds.know_path(str(source), 'hardlink')
+
+    assert not created
+    assert os.stat(source).st_mode == mode
+    assert not os.path.samefile(ds.resolve_path(ds.encode(cid)), source)
+
+
+def test_know_path_reflink_falls_back_to_copy(ds, tmp_path):
+    source = tmp_path / "source.bin"
+    source.write_bytes(b"cloned contents")
+
+    cid, created = ds.know_path(str(source), 'reflink')
+    _, created_again = ds.know_path(str(source), 'reflink')
+
+    assert created
+    assert not created_again
+    assert ds.recall_binary(cid) == b"cloned contents"
+    assert [f for f in os.listdir(ds.path) if f.endswith('.tmp')] == []
+
+
+def test_threads_storing_the_same_data_store_it_once(ds):
+    import threading
+    created = []
+    start = threading.Barrier(8, timeout=5)
+
+    def work():
+        start.wait()
+        created.append(ds.know_binary(b"shared")[1])
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert created.count(True) == 1
+    assert len(list(ds.list_known_cids())) == 1
+
+
+def test_unknown_durability_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        FileBasedDataService(str(tmp_path), durability="sometimes")
+
+
+def test_strict_durability_fsyncs_each_file(tmp_path, monkeypatch):
+    synced = []
+    monkeypatch.setattr("cidnilib.filebasedds.fsync_path", synced.append)
+    ds = FileBasedDataService(str(tmp_path), durability="strict")
+
+    cid, _ = ds.know_binary(b"strict")
+
+    assert len(synced) == 2    # the file, then its directory
+    assert os.path.exists(ds.resolve_path(ds.encode(cid)))
+    assert ds.recall_binary(cid) == b"strict"
+
+
+def test_group_durability_places_files_at_commit(tmp_path):
+    ds = FileBasedDataService(str(tmp_path), durability="group", group_seconds=60)
+    cid, isnew = ds.know_binary(b"grouped")
+    path = ds.resolve_path(ds.encode(cid))
+
+    assert isnew and not os.path.exists(path)
+    assert ds.known_binary(cid)
+    assert not ds.know_binary(b"grouped")[1]
+    assert ds.recall_binary(cid) == b"grouped"
+    assert ds.recall_stream(cid).read() == b"grouped"
+
+    assert list(ds.list_known_cids()) == [cid]    # listing commits first
+    assert os.path.exists(path)
+    assert not ds.pending
+    assert ds.recall_binary(cid) == b"grouped"
+
+
+def test_group_commits_when_full_or_on_timer(tmp_path):
+    ds = FileBasedDataService(str(tmp_path), durability="group", group_files=3, group_seconds=60)
+    cids = [ds.know_binary(b"object %d" % i)[0] for i in range(4)]
+
+    assert len(ds.pending) == 1
+    assert all(os.path.exists(ds.resolve_path(ds.encode(cid))) for cid in cids[:3])
+    ds.close()
+    assert not ds.pending
+
+    timed = FileBasedDataService(str(tmp_path), durability="group", group_seconds=0.01)
+    cid, _ = timed.know_binary(b"committed by timer")
+    for _ in range(500):
+        if not timed.pending:
+            break
+        time.sleep(0.01)
+    assert os.path.exists(timed.resolve_path(timed.encode(cid)))
+
+
+def test_group_commit_syncs_the_filesystem_once(tmp_path, monkeypatch):
+    synced, fsynced = [], []
+    monkeypatch.setattr("cidnilib.filebasedds.syncfs", lambda path: synced.append(path) or True)
+    monkeypatch.setattr("cidnilib.filebasedds.fsync_path", fsynced.append)
+    ds = FileBasedDataService(str(tmp_path), durability="group", group_seconds=60)
+    cids = [ds.know_binary(b"object %d" % i)[0] for i in range(20)]
+
+    ds.commit()
+
+    assert synced == [str(tmp_path)] * 2    # the files, then the directories they were renamed into
+    assert fsynced == []
+    assert all(os.path.exists(ds.resolve_path(ds.encode(cid))) for cid in cids)
+
+
+def test_temporary_files_of_dead_processes_are_swept_on_open(tmp_path):
+    import subprocess
+    import sys
+    from cidnilib.filebasedds import temporary_prefix
+    dead = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"], capture_output=True, text=True).stdout.strip()
+    ours = temporary_prefix() + "inflight.tmp"
+    theirs = ".{pid}-{host}.abandoned.tmp".format(pid=dead, host=temporary_prefix().split("-")[1].rstrip("."))
+    for name in (ours, theirs, ".unowned.tmp", "manifest.json.tmp"):
+        (tmp_path / name).write_bytes(b"partial")
+        os.utime(tmp_path / name, (0, 0))    # e.g. hardlinked, keeping its source's mtime
+
+    FileBasedDataService(str(tmp_path))
+
+    assert sorted(name for name in os.listdir(tmp_path) if name.endswith(".tmp")) == sorted([ours, ".unowned.tmp", "manifest.json.tmp"])
+
+
+def test_temporary_files_without_owner_are_swept_by_ctime(tmp_path, monkeypatch):
+    monkeypatch.setattr("cidnilib.filebasedds.STALE_SECONDS", -60)
+    (tmp_path / ".unowned.tmp").write_bytes(b"partial")
+
+    FileBasedDataService(str(tmp_path))
+
+    assert not (tmp_path / ".unowned.tmp").exists()
+
+
+def test_group_commit_drops_vanished_temporary_files(tmp_path):
+    ds = FileBasedDataService(str(tmp_path), durability="group", group_seconds=60)
+    lost, _ = ds.know_binary(b"lost")
+    kept, _ = ds.know_binary(b"kept")
+    os.remove(ds.pending[ds.encode(lost)])
+
+    ds.close()
+
+    assert not ds.pending
+    assert not ds.known_binary(lost)
+    assert ds.recall_binary(kept) == b"kept"
+
+
+def test_group_forget_before_commit(tmp_path):
+    ds = FileBasedDataService(str(tmp_path), durability="group", group_seconds=60)
+    cid, _ = ds.know_binary(b"short lived")
+
+    ds.forget_binary(cid)
+    ds.commit()
+
+    assert not ds.known_binary(cid)
+    assert list(ds.list_known_cids()) == []
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
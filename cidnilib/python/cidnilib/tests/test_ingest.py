@@ -0,0 +1,78 @@
+import io
+
+from cidnilib import FileBasedDataService, InMemoryDataService
+from cidnilib.ingest import HeaderTap, ingest, ingest_path
+from cidnilib.typers import DETECTION_VERSION
+
+
+class CountingReader(io.BytesIO):
+    def __init__(self, data):
+        super().__init__(data)
+        self.bytes_read = 0
+
+    def read(self, n=-1):
+        data = super().read(n)
+        self.bytes_read += len(data)
+        return data
+
+
+def test_header_tap_keeps_header_and_tail():
+    data = bytes(range(256)) * 40
+    tap = HeaderTap(io.BytesIO(data), size=100, tail_size=10)
+
+    while tap.read(64):
+        pass
+
+    assert tap.header == data[:100]
+    assert tap.tail == data[-10:]
+
+
+def test_ingest_reads_data_once(tmp_path):
+    ds = FileBasedDataService(str(tmp_path))
+    data = b'%PDF-1.4\n' + b'x' * 100000
+    fp = CountingReader(data)
+
+    cid, isnew, properties = ingest(ds, fp)
+
+    assert isnew
+    assert fp.bytes_read == len(data)
+    assert ds.recall_binary(cid) == data
+    assert ('mime_type', 'application') in properties
+    assert ('mime_subtype', 'pdf') in properties
+    assert ('HAS_TYPE', 'pdf') in properties
+
+
+def test_ingest_unknown_type():
+    ds = InMemoryDataService()
+
+    cid, _, properties = ingest(ds, io.BytesIO(b'hello world'))
+
+    assert ds.recall_binary(cid) == b'hello world'
+    assert properties == [('mime_type', 'text'), ('mime_subtype', 'plain'), ('HAS_TYPE', 'unknown'),
+                          ('HAS_TYPE_DETECTION', DETECTION_VERSION)]
+
+
+def test_ingested_types_are_not_detected_again(monkeypatch):
+    from cidnilib import InMemoryKnowledgeService
+    import sys
+    from cidnilib.typers import detect
+    ds = InMemoryDataService()
+    ks = InMemoryKnowledgeService(InMemoryDataService())
+    cid, _, properties = ingest(ds, io.BytesIO(b'\x89PNG\r\n\x1a\n' + b'\x00' * 64))
+    ks.believe_many([(ds.encode(cid), p, v) for p, v in properties])
+    monkeypatch.setattr(sys.modules["cidnilib.typers"], "detect_types", None)
+
+    assert detect(ds, ks, ds.encode(cid)) == {'png'}
+
+
+def test_ingest_path_with_link(tmp_path):
+    store = tmp_path / "store"
+    store.mkdir()
+    ds = FileBasedDataService(str(store))
+    source = tmp_path / "a.png"
+    source.write_bytes(b'\x89PNG\r\n\x1a\n' + b'\x00' * 64)
+
+    cid, isnew, properties = ingest_path(ds, str(source), 'hardlink')
+
+    assert isnew
+    assert ('HAS_TYPE', 'png') in properties
@@ -1,7 +1,7 @@
 import io
 import pytest
 
-from cidnilib.inmemds import InMemoryDataService
+from cidnilib.inmemds import BoundedInMemoryDataService, InMemoryDataService
 
 
 @pytest.fixture
@@ -75,3 +75,41 @@ def test_recall_stream(ds):
     stream = ds.recall_stream(cid)
 
     assert stream.read() == b"streamed"
+
+
+def test_recall_file(ds):
+    cid, _ = ds.know_binary(b"streamed")
+    out = io.BytesIO()
+
+    assert ds.recall_file(cid, out) == 8
+    assert out.getvalue() == b"streamed"
+
+
+def test_bounded_spills_least_recently_used_to_file():
+    with BoundedInMemoryDataService(max_bytes=250) as ds:
+        cids = [ds.know_binary(bytes([i]) * 100)[0] for i in range(5)]
+
+        assert ds.size <= 250
+        assert list(ds.db) == cids[3:]
+        assert all(ds.known_binary(cid) for cid in cids)
+        assert set(ds.list_known_cids()) == set(cids)
+        assert ds.recall_binary(cids[0]) == bytes([0]) * 100
+        assert list(ds.db) == [cids[4], cids[0]]
+        assert not ds.know_binary(bytes([1]) * 100)[1]
+
+
+def test_bounded_spills_to_backing_data_service():
+    backing = InMemoryDataService()
+    ds = BoundedInMemoryDataService(max_bytes=10, backing=backing)
+    big, _ = ds.know_binary(b"x" * 100)
+    small, _ = ds.know_binary(b"small")
+
+    assert big not in ds.db and backing.known_binary(big)
+    assert ds.recall_binary(big) == b"x" * 100
+    assert ds.recall_binary(small) == b"small"
+
+    ds.forget_binary(big)
+
+    assert not ds.known_binary(big)
+    assert not backing.known_binary(big)
+    assert ds.recall_binary(big) is None
@@ -1,7 +1,10 @@
 import json
 
+import pytest
+
 from cidnilib.inmemds import InMemoryDataService
 from cidnilib.inmemks import InMemoryKnowledgeService
+from cidnilib.main import KnowledgeService
 
 
 def test_believe_adds_and_returns_triple():
@@ -187,3 +190,177 @@ def test_can_use_encoded_binary_cid_as_subject():
     ks.believe(subj, "mime", "application/octet-stream")
 
     assert (subj, "mime", "application/octet-stream") in list(ks.inquire(subj))
+
+
+def test_believe_many_indexes_all_triples():
+    ds = InMemoryDataService()
+    ks = InMemoryKnowledgeService(ds)
+
+    results = ks.believe_many([("s1", "p1", "v1"), ("s1", "p2", "v2"), ("s2", "p1", "v1")])
+
+    assert len(results) == 3
+    assert all(ds.known(cid) for cid, _ in results)
+    assert results[0][0] == ks.believe("s1", "p1", "v1")[0]
+    assert set(ks.inquire(None, "p1", "v1")) == {
+        ("s1", "p1", "v1"),
+        ("s2", "p1", "v1"),
+    }
+
+
+def test_inquire_range_orders_numbers_numerically():
+    ks = InMemoryKnowledgeService(InMemoryDataService())
+    ks.believe_many([("a", "size", "9"), ("b", "size", "10"), ("c", "size", "100.5"), ("d", "size", "big")])
+
+    assert [s for s, _, _ in ks.inquire_range("size", "9", "100.5")] == ["a", "b"]
+    assert [s for s, _, _ in ks.inquire_range("size", "9", include_lo=False)] == ["b", "c", "d"]
+    assert [s for s, _, _ in ks.inquire_range("size", hi="10", include_hi=True)] == ["a", "b"]
+
+    ks.believe("e", "size", "50")
+    assert [s for s, _, _ in ks.inquire_range("size", "10", "100")] == ["b", "e"]
+
+
+def test_inquire_prefix_matches_path_values():
+    ks = InMemoryKnowledgeService(InMemoryDataService())
+    ks.believe_many([("a", "had_path", "/data/projects/x"), ("b", "had_path", "/data/other"),
+                     ("c", "had_path", "/data/projects/y/z")])
+    assert sorted(s for s, _, _ in ks.inquire_prefix("had_path", "/data/projects/")) == ["a", "c"]
+
+    ks.believe("d", "had_path", "/data/projects/new")
+    assert [v for _, _, v in ks.inquire_prefix("had_path", "/data/projects/")] == [
+        "/data/projects/new", "/data/projects/x", "/data/projects/y/z"]
+
+
+def test_value_queries_match_base_class_scan():
+    ks = InMemoryKnowledgeService(InMemoryDataService())
+    ks.believe_many([(f"s{i}", "t", str(i * 7 % 13)) for i in range(20)] + [("x", "t", "/p"), ("y", "t", "-1")])
+
+    assert list(ks.inquire_range("t", "3", "11")) == list(KnowledgeService.inquire_range(ks, "t", "3", "11"))
+    assert list(ks.inquire_prefix("t", "1")) == list(KnowledgeService.inquire_prefix(ks, "t", "1"))
+
+
+def test_queries_run_alongside_believing_threads():
+    import threading
+    ks = InMemoryKnowledgeService(InMemoryDataService())
+    errors = []
+
+    def believe(worker):
+        for i in range(200):
+            ks.believe("s%d" % worker, "n", str(i))
+
+    def query():
+        try:
+            for _ in range(200):
+                list(ks.inquire(None, "n"))
+                list(ks.inquire_range("n", "10", "20"))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=believe, args=(w,)) for w in range(3)] + [threading.Thread(target=query)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    assert len(list(ks.inquire(None, "n"))) == 600
+    assert len(list(ks.inquire_range("n", "10", "20"))) == 30
+
+
+def test_inquire_yields_a_snapshot_lazily():
+    ks = InMemoryKnowledgeService(InMemoryDataService())
+    ks.believe_many([("s", "n", str(i)) for i in range(3)])
+
+    results = ks.inquire("s", "n")
+    first = next(results)
+    ks.believe("s", "n", "3")    # the read lock isn't held between results
+
+    assert sorted([first] + list(results)) == [("s", "n", str(i)) for i in range(3)]
+    assert list(ks.inquire(None, "n", "3")) == [("s", "n", "3")]
+
+
+def test_indexes_are_built_once_by_concurrent_queries(monkeypatch):
+    import threading
+    import time
+    from cidnilib import inmemks
+    built = []
+
+    class SlowTextIndex(inmemks.TextIndex):
+        def __init__(self, entries=()):
+            built.append(self)
+            time.sleep(0.05)
+            super().__init__(entries)
+
+    monkeypatch.setattr(inmemks, "TextIndex", SlowTextIndex)
+    ks = InMemoryKnowledgeService(InMemoryDataService())
+    ks.believe("a", "had_path", "/data/invoice.pdf")
+    threads = [threading.Thread(target=lambda: list(ks.search("invoice", "had_path"))) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(built) == 1
+
+
+def test_default_data_service_is_not_shared():
+    first, second = InMemoryKnowledgeService(), InMemoryKnowledgeService()
+    first.believe("subject1", "color", "blue")
+
+    assert first.ds is not second.ds
+    assert list(second.inquire("subject1", None, None)) == []
+    assert list(InMemoryKnowledgeService().inquire("subject1", None, None)) == []
+
+
+def containment(ks):
+    ks.believe_many([("upload", "CONTAINS", "a.zip"), ("a.zip", "CONTAINS", "b.tar"),
+                     ("b.tar", "CONTAINS", "blob"), ("other", "CONTAINS", "blob")])
+
+
+def test_inquire_transitive_follows_contains_chains():
+    ks = InMemoryKnowledgeService()
+    containment(ks)
+
+    assert {s for s, _, _ in ks.inquire_transitive(None, "CONTAINS", "blob")} == {"upload", "a.zip", "b.tar", "other"}
+    assert {v for _, _, v in ks.inquire_transitive("upload", "CONTAINS")} == {"a.zip", "b.tar", "blob"}
+    assert list(ks.inquire_transitive("upload", "CONTAINS", "blob")) == [("upload", "CONTAINS", "blob")]
+    assert list(ks.inquire_transitive("other", "CONTAINS", "a.zip")) == []
+    assert len(list(ks.inquire_transitive(None, "CONTAINS"))) == 7
+    assert list(ks.inquire("upload", "CONTAINS", None)) == [("upload", "CONTAINS", "a.zip")]
+
+
+def test_closure_is_maintained_as_triples_change():
+    ks = InMemoryKnowledgeService()
+    containment(ks)
+    list(ks.inquire_transitive("upload", "CONTAINS"))    # builds the closure
+
+    ks.believe("blob", "CONTAINS", "inner")
+    assert ("upload", "CONTAINS", "inner") in ks.inquire_transitive("upload", "CONTAINS")
+
+    ks.retract("a.zip", "CONTAINS", "b.tar")
+    assert {s for s, _, _ in ks.inquire_transitive(None, "CONTAINS", "inner")} == {"blob", "b.tar", "other"}
+    assert {v for _, _, v in ks.inquire_transitive("upload", "CONTAINS")} == {"a.zip"}
+
+    ks.believe("upload", "CONTAINS", "blob")
+    assert {v for _, _, v in ks.inquire_transitive("upload", "CONTAINS")} == {"a.zip", "blob", "inner"}
+
+
+@pytest.mark.parametrize("acyclic", [True, False])
+def test_closure_matches_graph_walk(acyclic):
+    import random
+    rng = random.Random(0)
+    ks = InMemoryKnowledgeService(transitive=["LINKS"])
+    scan = InMemoryKnowledgeService(transitive=[])
+    pairs = [sorted(rng.sample(range(40), 2)) if acyclic else (rng.randrange(40), rng.randrange(40)) for _ in range(80)]
+    edges = [("n%d" % a, "LINKS", "n%d" % b) for a, b in pairs]
+    for i, triple in enumerate(edges):
+        for service in (ks, scan):
+            service.believe(*triple)
+        if i == 40:
+            list(ks.inquire_transitive(None, "LINKS"))
+    for triple in edges[::3]:
+        for service in (ks, scan):
+            service.retract(*triple)
+
+    for node in ("n%d" % i for i in range(40)):
+        assert set(ks.inquire_transitive(node, "LINKS")) == set(scan.inquire_transitive(node, "LINKS"))
+        assert set(ks.inquire_transitive(None, "LINKS", node)) == set(scan.inquire_transitive(None, "LINKS", node))
@@ -0,0 +1,61 @@
+import os
+import threading
+import time
+
+from cidnilib.locks import RWLock, StripedLock, file_lock
+
+
+def test_readers_share_the_lock():
+    lock = RWLock()
+    inside = threading.Barrier(3, timeout=5)
+
+    def read():
+        with lock.read():
+            inside.wait()    # fails unless all three readers are inside at once
+
+    threads = [threading.Thread(target=read) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not inside.broken
+
+
+def test_writer_excludes_readers():
+    lock = RWLock()
+    events = []
+
+    def write():
+        with lock.write():
+            events.append("write start")
+            time.sleep(0.05)
+            events.append("write end")
+
+    with lock.read():
+        writer = threading.Thread(target=write)
+        writer.start()
+        time.sleep(0.02)
+        events.append("read")
+    writer.join()
+    with lock.read():
+        events.append("read again")
+
+    assert events == ["read", "write start", "write end", "read again"]
+
+
+def test_striped_lock_gives_the_same_lock_for_a_key():
+    locks = StripedLock(8)
+
+    assert locks("abc") is locks("abc")
+    assert len({id(locks(str(i))) for i in range(100)}) == 8
+
+
+def test_file_lock_creates_lock_file(tmp_path):
+    path = str(tmp_path / "shard.db")
+    with file_lock(path):
+        pass
+    with file_lock(path, shared=True):
+        pass
+
+    assert (tmp_path / ".shard.db.lock").exists()
+    assert os.listdir(tmp_path) == [".shard.db.lock"]
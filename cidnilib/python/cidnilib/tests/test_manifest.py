@@ -0,0 +1,77 @@
+import os
+
+from cidnilib.manifest import StatManifest
+
+
+def test_lookup_unrecorded_file(tmp_path):
+    f = tmp_path / "a.txt"
+    f.write_text("a")
+    manifest = StatManifest(str(tmp_path / "manifest.json"))
+
+    assert manifest.lookup(str(f)) is None
+
+
+def test_lookup_unchanged_file(tmp_path):
+    f = tmp_path / "a.txt"
+    f.write_text("a")
+    manifest = StatManifest(str(tmp_path / "manifest.json"))
+
+    manifest.record(str(f), "cid-a")
+
+    assert manifest.lookup(str(f)) == "cid-a"
+
+
+def test_lookup_changed_file(tmp_path):
+    f = tmp_path / "a.txt"
+    f.write_text("a")
+    manifest = StatManifest(str(tmp_path / "manifest.json"))
+    manifest.record(str(f), "cid-a")
+
+    f.write_text("changed")
+
+    assert manifest.lookup(str(f)) is None
+
+
+def test_lookup_touched_file(tmp_path):
+    f = tmp_path / "a.txt"
+    f.write_text("a")
+    manifest = StatManifest(str(tmp_path / "manifest.json"))
+    manifest.record(str(f), "cid-a")
+
+    st = os.stat(f)
+    os.utime(f, ns=(st.st_atime_ns, st.st_mtime_ns + 1000))
+
+    assert manifest.lookup(str(f)) is None
+
+
+def test_manifest_persists(tmp_path):
+    f = tmp_path / "a.txt"
+    f.write_text("a")
+    path = str(tmp_path / "manifest.json")
+
+    with StatManifest(path) as manifest:
+        manifest.record(str(f), "cid-a")
+
+    assert StatManifest(path).lookup(str(f)) == "cid-a"
+
+
+def test_changes_are_logged_and_compacted(tmp_path):
+    a, b = tmp_path / "a.txt", tmp_path / "b.txt"
+    a.write_text("a")
+    b.write_text("b")
+    path = str(tmp_path / "manifest.json")
+
+    with StatManifest(path, flush_every=1) as manifest:
+        manifest.record(str(a), "cid-a")
+        manifest.record(str(b), "cid-b")
+        manifest.forget(str(a))
+    assert not os.path.exists(path)
+
+    reopened = StatManifest(path, compact_bytes=0)
+    assert reopened.lookup(str(a)) is None
+    assert reopened.lookup(str(b)) == "cid-b"
+    reopened.record(str(a), "cid-a")
+    reopened.close()
+
+    assert not os.path.exists(path + ".log")
+    assert StatManifest(path).lookup(str(a)) == "cid-a"
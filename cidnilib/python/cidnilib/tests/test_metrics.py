@@ -0,0 +1,125 @@
+import io
+import json
+
+from cidnilib import FileBasedDataService, InMemoryDataService, InMemoryKnowledgeService, PickleFileBasedDataService
+from cidnilib.metrics import Metrics, Observer, ProgressDots
+
+
+class Recorder(Observer):
+    def __init__(self):
+        self.events = []
+
+    def operation(self, service, name, seconds, nbytes=0):
+        self.events.append((name, nbytes))
+
+
+def test_no_observers_by_default():
+    assert InMemoryDataService().observers == ()
+
+
+def test_operations_are_reported_once():
+    ds = InMemoryDataService()
+    recorder = ds.observe(Recorder())
+
+    cid, _ = ds.know_binary(b"hello")
+    ds.recall_binary(cid)
+    ds.known_binary(cid)
+
+    assert recorder.events == [("know_binary", 5), ("recall_binary", 5), ("known_binary", 0)]
+
+
+def test_unobserve():
+    ds = InMemoryDataService()
+    recorder = ds.observe(Recorder())
+    ds.unobserve(recorder)
+
+    ds.know_binary(b"hello")
+
+    assert recorder.events == []
+
+
+def test_metrics_counts_bytes_and_latency():
+    ds = InMemoryDataService()
+    metrics = ds.observe(Metrics())
+
+    ds.know_binary(b"abc")
+    ds.know_binary(b"defg")
+
+    entry = metrics.snapshot()["operations"]["InMemoryDataService.know_binary"]
+    assert entry["count"] == 2
+    assert entry["bytes"] == 7
+    assert sum(entry["histogram_us"].values()) == 2
+
+
+def test_knowledge_service_overrides_counted_once():
+    metrics = Metrics()
+    ks = InMemoryKnowledgeService(InMemoryDataService(), observers=[metrics])
+
+    ks.believe("s", "p", "v")
+    list(ks.inquire("s"))
+
+    operations = metrics.snapshot()["operations"]
+    assert operations["InMemoryKnowledgeService.believe"]["count"] == 1
+    assert operations["InMemoryKnowledgeService.inquire"]["count"] == 1
+    assert operations["InMemoryKnowledgeService.rebuild"]["count"] == 1
+
+
+def test_cache_outcomes(tmp_path):
+    ds = PickleFileBasedDataService(str(tmp_path))
+    metrics = ds.observe(Metrics())
+
+    cid, _ = ds.know_binary(b"hello")
+    ds.recall_binary(cid)
+
+    assert metrics.snapshot()["caches"]["PickleFileBasedDataService.shard"] == {"hits": 1, "misses": 1}
+
+
+def test_progress_routed_through_observers(tmp_path):
+    ds = FileBasedDataService(str(tmp_path))
+    out = io.StringIO()
+    ds.observe(ProgressDots(out))
+
+    ds.know_file(io.BytesIO(b"data"))
+
+    assert out.getvalue() == "."
+
+
+def test_partially_consumed_query_is_reported():
+    ks = InMemoryKnowledgeService(InMemoryDataService())
+    ks.believe_many([("s", "p", "1"), ("s", "p", "2")])
+    recorder = ks.observe(Recorder())
+
+    results = ks.inquire("s", "p")
+    next(results)
+    results.close()
+
+    assert recorder.events == [("inquire", 0)]
+
+
+def test_extraction_notes_go_to_observers():
+    import zipfile
+    from cidnilib.typers import extractors
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as z:
+        z.writestr("a.txt", "hello")
+    ds = InMemoryDataService()
+    cid = ds.encode(ds.know(buf.getvalue())[0])
+    out = io.StringIO()
+    ds.observe(ProgressDots(out))
+
+    extractors["zip"](ds, InMemoryKnowledgeService(InMemoryDataService()), cid)
+
+    assert "Storing a.txt... STORED AS " in out.getvalue()
+
+
+def test_metrics_save_accumulates(tmp_path):
+    path = str(tmp_path / "stats.json")
+    for _ in range(2):
+        ds = InMemoryDataService()
+        metrics = ds.observe(Metrics())
+        ds.know_binary(b"abc")
+        metrics.save(path)
+
+    with open(path) as fp:
+        saved = json.load(fp)
+    assert saved["operations"]["InMemoryDataService.know_binary"]["count"] == 2
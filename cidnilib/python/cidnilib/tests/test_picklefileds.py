@@ -3,6 +3,7 @@
 import io
 import pytest
 
+from cidnilib.inmemds import InMemoryDataService
 from cidnilib.picklefileds import PickleFileBasedDataService
 
 
@@ -48,7 +49,7 @@ def test_list_known_cids(ds):
     cid1, _ = ds.know_binary(b"one")
     cid2, _ = ds.know_binary(b"two")
 
-    assert set(ds.list_known_cids()).issubset({cid1, cid2})
+    assert set(ds.list_known_cids()) == {cid1, cid2}
 
 
 def test_forget_binary_removes_data(ds):
@@ -102,3 +103,66 @@ def test_no_levels(tmp_path):
       cid, _ = ds.know(b'haha')
     with PickleFileBasedDataService(str(test_dir), levels=0) as ds:
       assert ds.recall_binary(cid) == b'haha'
+
+
+def test_know_many(tmp_path):
+    test_dir = tmp_path / "cidnilib_pickle_test_store"
+    test_dir.mkdir()
+    with PickleFileBasedDataService(str(test_dir)) as ds:
+        results = ds.know_many([b"one", "two", b"one"])
+        assert [created for _, created in results] == [True, True, False]
+        assert results[0][0] == results[2][0]
+    with PickleFileBasedDataService(str(test_dir)) as ds:
+        assert ds.recall_binary(results[0][0]) == b"one"
+        assert ds.recall_binary(results[1][0]) == b"two"
+
+
+def _write_concurrently(path, worker, levels):
+    ds = PickleFileBasedDataService(path, levels=levels)
+    for i in range(30):
+        ds.know("worker %d item %d" % (worker, i))
+        if i % 3 == 0:
+            ds.flush()
+    ds.close()
+
+
+@pytest.mark.parametrize("levels", [0, 1])
+def test_concurrent_processes_do_not_lose_writes(tmp_path, levels):
+    import multiprocessing
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=_write_concurrently, args=(str(tmp_path), w, levels)) for w in range(4)]
+    for p in workers:
+        p.start()
+    for p in workers:
+        p.join()
+        assert p.exitcode == 0
+
+    ds = PickleFileBasedDataService(str(tmp_path), levels=levels)
+    for w in range(4):
+        for i in range(30):
+            cid, _ = InMemoryDataService().know("worker %d item %d" % (w, i))
+            assert ds.recall_text(cid) == "worker %d item %d" % (w, i)
+    assert len(list(ds.list_known_cids())) == 120
+
+
+def test_threads_share_a_store(tmp_path):
+    import threading
+    ds = PickleFileBasedDataService(str(tmp_path))
+    items = ["item %d" % i for i in range(400)]
+
+    def work(part):
+        for i, item in enumerate(items[part::4]):
+            ds.know(item)
+            if i % 25 == 0:
+                ds.flush()
+
+    threads = [threading.Thread(target=work, args=(part,)) for part in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    ds.close()
+
+    reopened = PickleFileBasedDataService(str(tmp_path))
+    assert len(list(reopened.list_known_cids())) == 400
+    assert all(reopened.known_binary(InMemoryDataService().know(item)[0]) for item in items)
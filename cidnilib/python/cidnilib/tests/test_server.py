@@ -0,0 +1,170 @@
+import json
+import threading
+from http.client import HTTPConnection
+
+import pytest
+
+from cidnilib.filebasedds import FileBasedDataService
+from cidnilib.httpds import HttpDataService
+from cidnilib.inmemds import InMemoryDataService
+from cidnilib.inmemks import InMemoryKnowledgeService
+from cidnilib.server import CidServer, parse_range
+
+
+@pytest.fixture
+def store(tmp_path):
+    ds = FileBasedDataService(str(tmp_path))
+    ks = InMemoryKnowledgeService(InMemoryDataService())
+    server = CidServer(("127.0.0.1", 0), ds, ks)
+    server.RequestHandlerClass.log_message = lambda *args: None
+    thread = threading.Thread(target=server.serve_forever, args=(0.01,), daemon=True)
+    thread.start()
+    yield ds, ks, server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(store):
+    _, _, server = store
+    with HttpDataService(server.url) as client:
+        yield client
+
+
+def test_parse_range():
+    assert parse_range(None, 10) is None
+    assert parse_range("bytes=2-4", 10) == (2, 3)
+    assert parse_range("bytes=7-", 10) == (7, 3)
+    assert parse_range("bytes=-4", 10) == (6, 4)
+    assert parse_range("bytes=5-100", 10) == (5, 5)
+    assert parse_range("bytes=0-1,4-5", 10) is None
+    with pytest.raises(ValueError):
+        parse_range("bytes=10-", 10)
+
+
+def test_put_then_get_round_trip(store, client):
+    ds, _, _ = store
+    cid, isnew = client.know(b"hello over http")
+
+    assert isnew
+    assert not client.know(b"hello over http")[1]
+    assert ds.recall(cid) == b"hello over http"
+    assert client.recall(cid) == b"hello over http"
+    assert client.known(cid)
+    assert not client.known(InMemoryDataService().know(b"never stored")[0])
+    assert client.recall(InMemoryDataService().know(b"never stored")[0]) is None
+
+
+def test_forget_deletes_from_the_server(store, client):
+    ds, _, _ = store
+    cid, _ = client.know(b"forget me")
+
+    client.forget(cid)
+
+    assert not ds.known(cid)
+    assert not client.known(cid)
+    client.forget(cid)    # already gone
+
+
+def test_http_store_has_no_directory(store, client):
+    from cidnilib.stripeds import StripedDataService
+    from cidnilib.triples import stored_triple_encoding
+    striped = StripedDataService([client])
+    cid, _ = striped.know(b"striped over http")
+
+    assert striped.path is None
+    assert client.recall(cid) == b"striped over http"
+    assert stored_triple_encoding(client) is None
+
+
+def test_know_file_streams_regular_files(client, tmp_path):
+    source = tmp_path / "big.bin"
+    source.write_bytes(bytes(range(256)) * 4096)
+    with open(source, "rb") as fp:
+        cid, _ = client.know_file(fp)
+
+    out = tmp_path / "copy.bin"
+    with open(out, "wb") as fp:
+        assert client.recall_file(cid, fp) == 256 * 4096
+    assert out.read_bytes() == source.read_bytes()
+
+
+def test_responses_are_immutable_and_support_ranges(store, client):
+    ds, _, server = store
+    cid, _ = ds.know(b"0123456789")
+    ecid = ds.encode(cid)
+    conn = HTTPConnection("127.0.0.1", server.server_address[1])
+
+    conn.request("GET", "/cid/" + ecid)
+    response = conn.getresponse()
+    assert response.read() == b"0123456789"
+    assert response.getheader("ETag") == '"' + ecid + '"'
+    assert "immutable" in response.getheader("Cache-Control")
+
+    conn.request("GET", "/cid/" + ecid, headers={"Range": "bytes=3-5"})
+    response = conn.getresponse()
+    assert response.status == 206
+    assert response.read() == b"345"
+    assert response.getheader("Content-Range") == "bytes 3-5/10"
+
+    conn.request("GET", "/cid/" + ecid, headers={"If-None-Match": '"' + ecid + '"'})
+    response = conn.getresponse()
+    response.read()
+    assert response.status == 304
+
+    conn.request("HEAD", "/cid/" + ecid)
+    response = conn.getresponse()
+    assert response.read() == b""
+    assert response.getheader("Content-Length") == "10"
+    conn.close()
+
+    assert client.recall_range(cid, 8, 5) == b"89"
+
+
+def test_put_with_wrong_cid_is_rejected(store, client):
+    ds, _, server = store
+    wrong = ds.encode(InMemoryDataService().know(b"something else")[0])
+    conn = HTTPConnection("127.0.0.1", server.server_address[1])
+    conn.request("PUT", "/cid/" + wrong, body=b"payload")
+
+    assert conn.getresponse().status == 422
+    assert list(ds.list_known_cids()) == []
+
+
+def test_put_is_checked_before_storing(store, client, monkeypatch):
+    ds, _, server = store
+    stored = []
+    know_file = ds.know_file
+    monkeypatch.setattr(ds, "know_file", lambda fp: stored.append(fp) or know_file(fp))
+    payload = b"payload" * 1000
+    right = ds.encode(InMemoryDataService().know(payload)[0])
+    wrong = ds.encode(InMemoryDataService().know(b"something else")[0])
+    conn = HTTPConnection("127.0.0.1", server.server_address[1])
+
+    conn.request("PUT", "/cid/" + wrong, body=payload)
+    response = conn.getresponse()
+    response.read()
+    assert response.status == 422 and not stored
+    conn.request("PUT", "/cid/" + right, body=payload)
+    assert conn.getresponse().status == 201
+    assert ds.recall_binary(ds.decode(right)) == payload
+
+
+def test_listing_and_triples(store, client):
+    ds, ks, server = store
+    cids = sorted(ds.encode(client.know(str(i))[0]) for i in range(5))
+    ks.believe(cids[0], "had_path", "/a")
+
+    assert [client.encode(c) for c in client.list_known_cids()] == cids
+    assert [client.encode(c) for c in client.list_known_cids(after=cids[1], limit=2)] == cids[2:4]
+
+    conn = HTTPConnection("127.0.0.1", server.server_address[1])
+    conn.request("GET", "/triples?property=had_path")
+    assert json.loads(conn.getresponse().read()) == [[cids[0], "had_path", "/a"]]
+
+
+def test_connections_are_kept_alive(client):
+    for i in range(20):
+        client.recall(client.know(str(i))[0])
+
+    assert client.pool.created == 1
@@ -0,0 +1,121 @@
+import io
+
+import pytest
+
+from cidnilib.filebasedds import FileBasedDataService
+from cidnilib.inmemds import InMemoryDataService
+from cidnilib.stripeds import StripedDataService
+
+
+@pytest.fixture
+def roots(tmp_path):
+    paths = []
+    for name in ("disk1", "disk2", "disk3"):
+        (tmp_path / name).mkdir()
+        paths.append(str(tmp_path / name))
+    return paths
+
+
+@pytest.fixture
+def ds(roots):
+    return StripedDataService([FileBasedDataService(path) for path in roots])
+
+
+def test_data_is_spread_over_stripes_and_routed_back(ds):
+    cids = [ds.know_binary(b"object %d" % i)[0] for i in range(300)]
+
+    counts = [len(list(stripe.list_known_cids())) for stripe in ds.stripes]
+    assert sum(counts) == 300
+    assert all(count > 50 for count in counts)
+    for i, cid in enumerate(cids):
+        assert ds.stripe(cid).known_binary(cid)
+        assert ds.recall_binary(cid) == b"object %d" % i
+    assert set(ds.list_known_cids()) == set(cids)
+
+
+def test_routing_ignores_stripe_order(roots):
+    forward = StripedDataService([FileBasedDataService(path) for path in roots])
+    backward = StripedDataService([FileBasedDataService(path) for path in reversed(roots)])
+    cids = [forward.know_binary(b"object %d" % i)[0] for i in range(50)]
+
+    assert [forward.stripe(cid).path for cid in cids] == [backward.stripe(cid).path for cid in cids]
+    assert all(backward.recall_binary(cid) for cid in cids)
+
+
+def test_paged_listing_merges_stripes(ds):
+    cids = sorted(ds.encode(ds.know_binary(b"object %d" % i)[0]) for i in range(40))
+
+    first = [ds.encode(id) for id in ds.list_known_cids(limit=15)]
+    rest = [ds.encode(id) for id in ds.list_known_cids(after=first[-1])]
+
+    assert first + rest == cids
+
+
+def test_know_many_file_and_path(ds, tmp_path):
+    results = ds.know_many([b"one", "two", b"three"])
+    source = tmp_path / "source.bin"
+    source.write_bytes(b"from a file")
+
+    assert [ds.recall(cid) for cid, _ in results] == [b"one", b"two", b"three"]
+    cid, isnew = ds.know_path(str(source))
+    assert isnew and ds.stripe(cid).recall_binary(cid) == b"from a file"
+    assert ds.know_file(io.BytesIO(b"from a file")) == (cid, False)
+    forgotten, _ = ds.know_binary(b"forget me")
+    ds.forget(forgotten)
+    assert not ds.known(forgotten)
+
+
+def test_adding_a_stripe_moves_only_its_share(roots, tmp_path):
+    ds = StripedDataService([FileBasedDataService(path) for path in roots])
+    cids = [ds.know_binary(b"object %d" % i)[0] for i in range(400)]
+    (tmp_path / "disk4").mkdir()
+    ds.add_stripe(FileBasedDataService(str(tmp_path / "disk4")))
+
+    assert all(ds.recall_binary(cid) is not None for cid in cids)    # found before rebalancing
+    moved = ds.rebalance()
+
+    assert moved == len(list(ds.stripes[3].list_known_cids()))
+    assert 50 < moved < 150
+    assert all(ds.stripe(cid).known_binary(cid) for cid in cids)
+    assert sum(len(list(stripe.list_known_cids())) for stripe in ds.stripes) == 400
+
+
+def test_stripe_names_default_to_position():
+    ds = StripedDataService([InMemoryDataService(), InMemoryDataService()])
+    cid, _ = ds.know_binary(b"hello")
+
+    assert ds.stripe(cid).recall_binary(cid) == b"hello"
+    with pytest.raises(ValueError):
+        ds.add_stripe(InMemoryDataService(), "1")
+
+
+def test_membership_and_pending_rebalance_survive_reopening(roots):
+    single = StripedDataService([FileBasedDataService(roots[0])])
+    cids = [single.know_binary(b"object %d" % i)[0] for i in range(100)]
+    single.close()
+
+    grown = StripedDataService([FileBasedDataService(path) for path in roots[:2]])
+    assert grown.misplaced
+    reopened = StripedDataService([FileBasedDataService(path) for path in reversed(roots[:2])])
+    assert reopened.misplaced and reopened.names == grown.names[::-1]
+    assert all(reopened.recall_binary(cid) is not None for cid in cids)
+    assert set(reopened.list_known_cids()) == set(cids)
+
+    reopened.rebalance()
+    assert not StripedDataService([FileBasedDataService(path) for path in roots[:2]]).misplaced
+    with pytest.raises(ValueError):
+        StripedDataService([FileBasedDataService(roots[0])])
+
+
+def test_plain_store_grown_into_stripes_needs_rebalancing(roots):
+    plain = FileBasedDataService(roots[0])
+    cid, _ = plain.know_binary(b"stored before striping")
+    plain.close()
+
+    ds = StripedDataService([FileBasedDataService(path) for path in roots])
+    assert ds.misplaced and ds.recall_binary(cid) == b"stored before striping"
+
+
+def test_new_empty_stripes_need_no_rebalancing(ds, roots):
+    assert not ds.misplaced
+    assert not StripedDataService([FileBasedDataService(path) for path in roots]).misplaced
@@ -0,0 +1,109 @@
+import io
+import threading
+
+import pytest
+
+from cidnilib.filebasedds import FileBasedDataService
+from cidnilib.httpds import HttpDataService
+from cidnilib.inmemds import InMemoryDataService
+from cidnilib.server import CidServer
+from cidnilib.sync import shard_digests, shard_of, sync
+
+
+class CountingDataService(InMemoryDataService):
+    """counts how many cids are listed so tests can check only differing shards are read"""
+
+    def __init__(self):
+        super().__init__()
+        self.listed = 0
+
+    def list_shard_cids(self, shards, depth):
+        for id in super().list_shard_cids(shards, depth):
+            self.listed += 1
+            yield id
+
+
+def fill(ds, start, stop):
+    return [ds.know(b"object %d" % i)[0] for i in range(start, stop)]
+
+
+def test_shard_digests_ignore_order():
+    cids = ["abc", "xbc", "abd"]
+    assert shard_of("abc", 2) == "bc"
+    assert shard_of("abc", 0) == ""
+    assert shard_digests(cids) == shard_digests(reversed(cids))
+    assert shard_digests(cids).keys() == {"bc", "bd"}
+    assert shard_digests(cids, 0).keys() == {""}
+
+
+def test_sync_copies_only_missing_data(tmp_path):
+    src, dst = FileBasedDataService(str(tmp_path)), CountingDataService()
+    fill(src, 0, 500)
+    fill(dst, 0, 499)
+
+    result = sync(src, dst)
+
+    assert result.copied == 1
+    assert result.shards_differing == 1
+    assert not result.failed
+    assert dst.listed < 10
+    assert set(dst.list_known_cids()) == set(src.list_known_cids())
+    assert sync(src, dst) == (0, 1, 0, [])
+
+
+def test_sync_both_directions():
+    a, b = InMemoryDataService(), InMemoryDataService()
+    fill(a, 0, 20)
+    fill(b, 10, 30)
+
+    result = sync(a, b, both=True, workers=2, batch=4)
+
+    assert result.copied == 20
+    assert set(a.list_known_cids()) == set(b.list_known_cids())
+    assert len(a.db) == 30
+
+
+class CorruptingDataService(InMemoryDataService):
+    """serves other data than was stored"""
+
+    def recall_stream(self, id):
+        return io.BytesIO(self.recall_binary(id) + b" corrupted")
+
+
+def test_sync_reports_and_drops_corrupted_copies():
+    src, dst = CorruptingDataService(), InMemoryDataService()
+    cids = fill(src, 0, 3)
+
+    result = sync(src, dst)
+
+    assert result.copied == 0
+    assert sorted(result.failed) == sorted(src.encode(id) for id in cids)
+    assert not list(dst.list_known_cids())
+
+
+@pytest.fixture
+def remote(tmp_path):
+    ds = FileBasedDataService(str(tmp_path))
+    server = CidServer(("127.0.0.1", 0), ds)
+    server.RequestHandlerClass.log_message = lambda *args: None
+    thread = threading.Thread(target=server.serve_forever, args=(0.01,), daemon=True)
+    thread.start()
+    with HttpDataService(server.url) as client:
+        yield ds, client
+    server.shutdown()
+    server.server_close()
+
+
+def test_sync_over_http(remote):
+    ds, client = remote
+    local = InMemoryDataService()
+    fill(local, 0, 100)
+    fill(ds, 50, 150)
+
+    assert client.shard_digests() == ds.shard_digests()
+    pushed = sync(local, client)
+    pulled = sync(client, local)
+
+    assert pushed.copied == 50 and pulled.copied == 50
+    assert sorted(ds.list_known_cids()) == sorted(local.list_known_cids())
+    assert sync(local, client).shards_differing == 0
@@ -0,0 +1,78 @@
+from cidnilib.inmemds import InMemoryDataService
+from cidnilib.inmemks import InMemoryKnowledgeService
+from cidnilib.main import KnowledgeService
+from cidnilib.textindex import TextIndex, decode_postings, tokenize
+
+
+def test_tokenize_lowercases_words():
+    assert tokenize("/data/Invoices_2024/ACME-report.pdf") == ["data", "invoices_2024", "acme", "report", "pdf"]
+
+
+def test_postings_are_delta_encoded():
+    index = TextIndex((f"s{i}", "invoice" if i % 100 == 0 else "other") for i in range(1000))
+
+    assert decode_postings(index.postings["inv"]) == list(range(0, 1000, 100))
+    assert len(index.postings["inv"]) == 10
+
+
+def test_search_matches_substrings_and_short_words():
+    index = TextIndex([("a", "/data/invoices_2024.pdf"), ("b", "/data/receipts/a b.txt"), ("c", "/tmp/x")])
+
+    assert list(index.search("invoice")) == [("a", "/data/invoices_2024.pdf")]
+    assert list(index.search("DATA pdf")) == [("a", "/data/invoices_2024.pdf")]
+    assert list(index.search("b")) == [("b", "/data/receipts/a b.txt")]
+    assert list(index.search("missing")) == []
+    assert list(index.search("")) == []
+
+
+def test_removed_entries_are_not_found():
+    index = TextIndex([("a", "invoice one"), ("b", "invoice two")])
+    index.remove("a", "invoice one")
+
+    assert list(index.search("invoice")) == [("b", "invoice two")]
+
+
+def test_tombstones_are_compacted():
+    index = TextIndex(((f"s{i}", f"invoice {i}") for i in range(10)), compact_after=3)
+    for i in range(6):
+        index.remove(f"s{i}", f"invoice {i}")
+
+    assert index.removed == 0 and len(index.entries) == 4
+    assert sorted(s for s, _ in index.search("invoice")) == [f"s{i}" for i in range(6, 10)]
+    index.add("s0", "invoice 0")
+    assert len(list(index.search("invoice"))) == 5
+
+
+def test_knowledge_service_search_is_updated_on_believe_and_retract():
+    ds = InMemoryDataService()
+    ks = InMemoryKnowledgeService(ds)
+    ks.believe("a", "had_path", "/data/invoice.pdf")
+    ks.believe("b", "mime_type", "invoice")
+
+    assert set(ks.search("invoice")) == {("a", "had_path", "/data/invoice.pdf"), ("b", "mime_type", "invoice")}
+    assert list(ks.search("invoice", "had_path")) == [("a", "had_path", "/data/invoice.pdf")]
+
+    ks.believe("c", "had_path", "/home/invoices/march.pdf")
+    assert {s for s, _, _ in ks.search("invoice", "had_path")} == {"a", "c"}
+
+    ks.retract("a", "had_path", "/data/invoice.pdf")
+    assert {s for s, _, _ in ks.search("invoice", "had_path")} == {"c"}
+    assert list(ks.inquire("a")) == []
+    assert {s for s, _, _ in InMemoryKnowledgeService(ds).search("invoice", "had_path")} == {"c"}
+
+
+def test_search_matches_base_class_scan():
+    ks = InMemoryKnowledgeService(InMemoryDataService())
+    ks.believe_many([(f"s{i}", "had_path", f"/data/{i % 7}/file_{i}.txt") for i in range(50)])
+
+    assert set(ks.search("data 3 file_1")) == set(KnowledgeService.search(ks, "data 3 file_1"))
+
+
+def test_default_search_covers_only_text_properties():
+    ks = InMemoryKnowledgeService(InMemoryDataService())
+    ks.believe("a", "had_path", "/data/2024/report.pdf")
+    ks.believe("b", "last_modified", "2024")
+
+    assert [s for s, _, _ in ks.search("2024")] == ["a"]
+    assert [s for s, _, _ in KnowledgeService.search(ks, "2024")] == ["a"]
+    assert [s for s, _, _ in ks.search("2024", "last_modified")] == ["b"]
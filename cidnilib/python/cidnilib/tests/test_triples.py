@@ -0,0 +1,104 @@
+import json
+
+from cidnilib.inmemds import InMemoryDataService
+from cidnilib.inmemks import InMemoryKnowledgeService
+from cidnilib.picklefileds import PickleFileBasedDataService
+from cidnilib.triples import TRIPLE_MAGIC, annotated_subject, binary_triple, decode_triple, migrate_triples, record_triple_encoding, stored_triple_encoding
+
+
+def test_binary_triple_round_trip():
+    data = binary_triple("s", "p", "välue")
+
+    assert data.startswith(TRIPLE_MAGIC)
+    assert decode_triple(data) == ("s", "p", "välue")
+
+
+def test_binary_triple_is_deterministic():
+    assert binary_triple("s", "p", "v") == binary_triple("s", "p", "v")
+    assert binary_triple("s", "p", "v") != binary_triple("s", "pv", "")
+
+
+def test_binary_triple_long_fields():
+    value = "x" * 100000
+
+    assert decode_triple(binary_triple("s", "p", value)) == ("s", "p", value)
+
+
+def test_decode_json_triple():
+    assert decode_triple(json.dumps(["s", "p", "v"]).encode()) == ("s", "p", "v")
+
+
+def test_decode_rejects_non_triples():
+    assert decode_triple(b"not a triple") is None
+    assert decode_triple(b"\xff\xfe\x00") is None
+    assert decode_triple(b"") is None
+    assert decode_triple(json.dumps(["s", "p"]).encode()) is None
+    assert decode_triple(binary_triple("s", "p", "v")[:-1]) is None
+    assert decode_triple(binary_triple("s", "p", "v") + b"x") is None
+    assert decode_triple(TRIPLE_MAGIC) is None
+
+
+def test_binary_encoded_knowledge_service_reloads():
+    ds = InMemoryDataService()
+    ks = InMemoryKnowledgeService(ds, triple_encoding='binary')
+
+    cid, _ = ks.believe("s1", "p1", "v1")
+
+    assert ds.recall(cid).startswith(TRIPLE_MAGIC)
+    assert set(InMemoryKnowledgeService(ds).inquire()) == {("s1", "p1", "v1")}
+
+
+def test_migrate_triples_rewrites_annotations():
+    ds = InMemoryDataService()
+    ks = InMemoryKnowledgeService(ds)
+    acid, _ = ks.believe("blob", "had_path", "/a")
+    ks.believe(ds.encode(acid), "last_modified", "1")
+    ds.know("not a triple")
+
+    changed = migrate_triples(ds)
+
+    assert len(changed) == 2
+    assert not ds.known(acid)
+    new_acid = changed[ds.encode(acid)]
+    ks2 = InMemoryKnowledgeService(ds)
+    assert set(ks2.inquire()) == {
+        ("blob", "had_path", "/a"),
+        (new_acid, "last_modified", "1"),
+    }
+    assert ds.recall(new_acid) == binary_triple("blob", "had_path", "/a")
+    assert migrate_triples(ds) == {}
+
+
+def test_annotated_subject_follows_annotations_to_the_data():
+    ds = InMemoryDataService()
+    ks = InMemoryKnowledgeService(ds)
+    blob = ds.encode(InMemoryDataService().know("file contents")[0])
+    acid, _ = ks.believe(blob, "had_path", "/a")
+    mcid, _ = ks.believe(ds.encode(acid), "last_modified", "1")
+
+    assert annotated_subject(ds, ds.encode(acid)) == blob
+    assert annotated_subject(ds, ds.encode(mcid)) == blob
+    assert annotated_subject(ds, blob) == blob
+
+
+def test_annotated_subject_of_a_member_path_is_the_member():
+    ds = InMemoryDataService()
+    ks = InMemoryKnowledgeService(ds)
+    data = InMemoryDataService()
+    archive, member = (data.encode(data.know(d)[0]) for d in ("archive", "member"))
+    ccid, _ = ks.believe(archive, "CONTAINS", member)
+    pcid, _ = ks.believe(ds.encode(ccid), "HAD_PATH", "docs/member.txt")
+
+    assert annotated_subject(ds, ds.encode(pcid)) == member
+
+
+def test_stored_triple_encoding_is_detected_then_recorded(tmp_path):
+    ds = PickleFileBasedDataService(str(tmp_path), levels=0)
+    assert stored_triple_encoding(ds) is None
+    InMemoryKnowledgeService(ds, triple_encoding='binary').believe("s1", "p1", "v1")
+
+    assert stored_triple_encoding(ds) == 'binary'
+    migrate_triples(ds, 'json')
+    assert (tmp_path / "triple-encoding").read_text() == "json\n"
+    record_triple_encoding(ds, 'binary')
+    assert stored_triple_encoding(ds) == 'binary'
@@ -0,0 +1,213 @@
+import gzip
+import io
+import json
+import tarfile
+import zipfile
+
+from cidnilib import FileBasedDataService, InMemoryDataService, InMemoryKnowledgeService
+from cidnilib.typers import detect, detect_types, extract_recursive, extractors, is_pdf, is_tar, is_zip, typers
+
+
+def make_zip():
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w') as z:
+        z.writestr('a.txt', 'hello')
+    return buf.getvalue()
+
+
+def make_tar():
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode='w') as t:
+        info = tarfile.TarInfo('a.txt')
+        info.size = 5
+        t.addfile(info, io.BytesIO(b'hello'))
+    return buf.getvalue()
+
+
+def test_detect_types_by_header():
+    assert detect_types(io.BytesIO(b'%PDF-1.4 ...')) == {'pdf'}
+    assert detect_types(io.BytesIO(b'\x89PNG\r\n\x1a\n....')) == {'png'}
+    assert detect_types(io.BytesIO(b'\x1f\x8b\x08\x00')) == {'gz'}
+    assert detect_types(io.BytesIO(make_zip())) == {'zip'}
+    assert detect_types(io.BytesIO(make_tar())) == {'tar'}
+
+
+def test_detect_types_unknown_data():
+    assert detect_types(io.BytesIO(b'plain text')) == set()
+    assert detect_types(io.BytesIO(b'')) == set()
+
+
+def test_zip_found_by_tail_signature():
+    data = b'\x00' * 2048 + make_zip()
+    assert detect_types(io.BytesIO(data)) == {'zip'}
+
+
+def test_zip_tail_must_end_the_data():
+    stray = b'text mentioning PK\x05\x06 in passing ' * 10
+    commented = io.BytesIO()
+    with zipfile.ZipFile(commented, 'w') as z:
+        z.writestr('a.txt', 'hello')
+        z.comment = b'a comment'
+
+    assert detect_types(io.BytesIO(stray)) == set()
+    assert detect_types(io.BytesIO(b'\x00' * 2048 + stray)) == set()
+    assert detect_types(io.BytesIO(b'\x00' * 2048 + commented.getvalue())) == {'zip'}
+    assert detect_types(io.BytesIO(make_zip() + b'trailing junk')) == {'zip'}    # by its header
+
+
+def test_predicates():
+    assert is_pdf(io.BytesIO(b'%PDF-1.7'))
+    assert is_zip(io.BytesIO(make_zip()))
+    assert is_tar(io.BytesIO(make_tar()))
+    assert not is_tar(io.BytesIO(make_zip()))
+    assert set(typers) == {'pdf', 'zip', 'jpg', 'png', 'tar', 'gz'}
+
+
+def test_detect_believes_types():
+    ds = InMemoryDataService()
+    ks = InMemoryKnowledgeService(InMemoryDataService())
+    cid = ds.encode(ds.know(make_zip())[0])
+
+    assert detect(ds, ks, cid) == {'zip'}
+    assert list(ks.inquire(cid, 'HAS_TYPE')) == [(cid, 'HAS_TYPE', 'zip')]
+
+
+def test_detect_uses_believed_types():
+    ds = InMemoryDataService()
+    ks = InMemoryKnowledgeService(InMemoryDataService())
+    cid = ds.encode(ds.know(b'plain text')[0])
+
+    assert detect(ds, ks, cid) == set()
+    assert list(ks.inquire(cid, 'HAS_TYPE')) == [(cid, 'HAS_TYPE', 'unknown')]
+
+    ks.believe(cid, 'HAS_TYPE', 'gz')
+    assert detect(ds, ks, cid) == {'gz'}
+
+
+def test_detect_redoes_types_believed_by_older_detection():
+    ds = InMemoryDataService()
+    ks = InMemoryKnowledgeService(InMemoryDataService())
+    cid = ds.encode(ds.know(b'\x00' * 2048 + make_zip())[0])
+    ks.believe(cid, 'HAS_TYPE', 'unknown')    # as believed before detection was versioned
+
+    assert detect(ds, ks, cid) == {'zip'}
+    assert list(ks.inquire(cid, 'HAS_TYPE')) == [(cid, 'HAS_TYPE', 'zip')]
+    ks.cache_outcome = lambda name, hit: hits.append(hit)
+    hits = []
+    assert detect(ds, ks, cid) == {'zip'} and hits == [True]
+
+
+def contained(ds, ks, cid):
+    members = {}
+    for _, _, bcid in ks.inquire(cid, 'CONTAINS'):
+        ccid = ds.encode(ks.ds.know(json.dumps([cid, 'CONTAINS', bcid]))[0])
+        for _, _, path in ks.inquire(ccid, 'HAD_PATH'):
+            members[path] = ds.recall(bcid)
+    return members
+
+
+def test_extract_zip(tmp_path):
+    ds = FileBasedDataService(str(tmp_path))
+    ks = InMemoryKnowledgeService(InMemoryDataService())
+    cid = ds.encode(ds.know(make_zip())[0])
+
+    stored = extractors['zip'](ds, ks, cid)
+
+    assert [path for _, path in stored] == ['a.txt']
+    assert contained(ds, ks, cid) == {'a.txt': b'hello'}
+
+
+def test_extract_tar():
+    ds = InMemoryDataService()
+    ks = InMemoryKnowledgeService(InMemoryDataService())
+    cid = ds.encode(ds.know(make_tar())[0])
+
+    extractors['tar'](ds, ks, cid)
+
+    assert contained(ds, ks, cid) == {'a.txt': b'hello'}
+
+
+def test_extract_gz_uses_original_name():
+    buf = io.BytesIO()
+    with gzip.GzipFile('a.txt', 'wb', fileobj=buf) as g:
+        g.write(b'hello')
+    ds = InMemoryDataService()
+    ks = InMemoryKnowledgeService(InMemoryDataService())
+    cid = ds.encode(ds.know(buf.getvalue())[0])
+
+    extractors['gz'](ds, ks, cid)
+
+    assert contained(ds, ks, cid) == {'a.txt': b'hello'}
+
+
+def make_nested():
+    inner = make_zip()
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode='w:gz') as t:
+        info = tarfile.TarInfo('inner.zip')
+        info.size = len(inner)
+        t.addfile(info, io.BytesIO(inner))
+    return buf.getvalue()
+
+
+def test_extract_recursive_descends_into_members(tmp_path):
+    ds = FileBasedDataService(str(tmp_path))
+    ks = InMemoryKnowledgeService(InMemoryDataService())
+    cid = ds.encode(ds.know(make_nested())[0])
+
+    extracted = extract_recursive(ds, ks, cid, workers=2)
+
+    # gz -> tar -> zip
+    assert len(extracted) == 3
+    zip_cid = ds.encode(ds.know(make_zip())[0])
+    assert zip_cid in extracted
+    assert contained(ds, ks, zip_cid) == {'a.txt': b'hello'}
+
+
+def test_extract_recursive_respects_depth():
+    ds = InMemoryDataService()
+    ks = InMemoryKnowledgeService(InMemoryDataService())
+    cid = ds.encode(ds.know(make_nested())[0])
+
+    extracted = extract_recursive(ds, ks, cid, depth=2)
+
+    assert len(extracted) == 2
+    zip_cid = ds.encode(ds.know(make_zip())[0])
+    assert list(ks.inquire(zip_cid, 'CONTAINS')) == []
+
+
+def test_extract_recursive_skips_extracted_archives():
+    ds = InMemoryDataService()
+    ks = InMemoryKnowledgeService(InMemoryDataService())
+    cid = ds.encode(ds.know(make_nested())[0])
+
+    assert len(extract_recursive(ds, ks, cid)) == 3
+    assert extract_recursive(ds, ks, cid) == []
+
+
+def test_extract_recursive_descends_into_extracted_archives():
+    ds = InMemoryDataService()
+    ks = InMemoryKnowledgeService(InMemoryDataService())
+    cid = ds.encode(ds.know(make_nested())[0])
+    zip_cid = ds.encode(ds.know(make_zip())[0])
+
+    assert len(extract_recursive(ds, ks, cid, depth=2)) == 2
+    assert extract_recursive(ds, ks, cid) == [zip_cid]
+    assert contained(ds, ks, zip_cid) == {'a.txt': b'hello'}
+
+
+def test_extract_recursive_skips_corrupt_members():
+    corrupt = b'PK\x03\x04' + b'\x00' * 40
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w') as z:
+        z.writestr('corrupt.zip', corrupt)
+        z.writestr('inner.zip', make_zip())
+    ds = InMemoryDataService()
+    ks = InMemoryKnowledgeService(InMemoryDataService())
+    cid = ds.encode(ds.know(buf.getvalue())[0])
+    zip_cid = ds.encode(ds.know(make_zip())[0])
+
+    extracted = extract_recursive(ds, ks, cid)
+
+    assert sorted(extracted) == sorted([cid, zip_cid])
+    assert contained(ds, ks, zip_cid) == {'a.txt': b'hello'}
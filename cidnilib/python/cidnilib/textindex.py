@@ -0,0 +1,137 @@
+"""
+Copyright © 2025 Joseph Kendall-Morwick
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import re
+from collections.abc import Iterable, Iterator
+
+GRAM_SIZE = 3
+
+_words = re.compile(r'\w+')
+
+
+def tokenize(text: str) -> list[str]:
+    """the lowercased words of text"""
+    return _words.findall(text.lower())
+
+
+def grams(token: str) -> set[str]:
+    """the overlapping n-grams of a token (tokens shorter than GRAM_SIZE have none)"""
+    return {token[i:i + GRAM_SIZE] for i in range(len(token) - GRAM_SIZE + 1)}
+
+
+def text_matches(query: list[str], value: str) -> bool:
+    """whether value mentions every query token
+
+        tokens of at least GRAM_SIZE characters match anywhere in value (so 'invoice'
+        matches 'invoices_2024.pdf'), shorter tokens only match whole words"""
+    lowered = value.lower()
+    words = None
+    for token in query:
+        if len(token) >= GRAM_SIZE:
+            if token not in lowered:
+                return False
+        else:
+            words = words if words is not None else set(tokenize(value))
+            if token not in words:
+                return False
+    return True
+
+
+def _append_varint(out: bytearray, n: int) -> None:
+    while n > 0x7f:
+        out.append(n & 0x7f | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def decode_postings(data: bytes) -> list[int]:
+    """the ids in a posting list stored as LEB128 varint deltas"""
+    ids = []
+    last = n = shift = 0
+    for byte in data:
+        n |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            last += n
+            ids.append(last)
+            n = shift = 0
+    return ids
+
+
+class TextIndex:
+    """an inverted index from words and n-grams to the (subject, value) pairs of one property
+
+        entries get increasing ids, so each posting list is kept as the deltas between
+        the ids containing its key, varint encoded. removed entries are tombstoned and
+        dropped from results, and the index is rebuilt from the live entries once more
+        than compact_after of them (and over half of all entries) are tombstones. a
+        search decodes only the shortest posting list among the query's keys and checks
+        those candidates' values directly."""
+
+    def __init__(self, entries: Iterable[tuple[str, str]] = (), compact_after: int = 1024):
+        self.compact_after = compact_after
+        self.entries = []       # id -> (subject, value), None once removed
+        self.ids = dict()       # (subject, value) -> id
+        self.postings = dict()  # word or gram -> bytearray of id deltas
+        self.last = dict()      # word or gram -> last id in its posting list
+        self.removed = 0        # number of tombstones in entries
+        for subject, value in entries:
+            self.add(subject, value)
+
+    @staticmethod
+    def keys(value: str) -> set[str]:
+        tokens = set(tokenize(value))
+        keys = {' ' + token for token in tokens}    # words are marked to keep them apart from grams
+        for token in tokens:
+            keys |= grams(token)
+        return keys
+
+    def add(self, subject: str, value: str) -> None:
+        if (subject, value) in self.ids:
+            return
+        id = len(self.entries)
+        self.entries.append((subject, value))
+        self.ids[subject, value] = id
+        for key in self.keys(value):
+            posting = self.postings.get(key)
+            if posting is None:
+                posting = self.postings[key] = bytearray()
+            _append_varint(posting, id - self.last.get(key, 0))
+            self.last[key] = id
+
+    def remove(self, subject: str, value: str) -> None:
+        id = self.ids.pop((subject, value), None)
+        if id is not None:
+            self.entries[id] = None
+            self.removed += 1
+            if self.removed > self.compact_after and self.removed * 2 > len(self.entries):
+                self.compact()
+
+    def compact(self) -> None:
+        """rebuild the index from its live entries, dropping the tombstones"""
+        live = [entry for entry in self.entries if entry is not None]
+        self.__init__(live, self.compact_after)
+
+    def search(self, text: str) -> Iterator[tuple[str, str]]:
+        """the (subject, value) pairs whose values mention every word of text"""
+        query = tokenize(text)
+        if not query:
+            return
+        keys = set()
+        for token in query:
+            keys |= grams(token) if len(token) >= GRAM_SIZE else {' ' + token}
+        postings = [self.postings.get(key) for key in keys]
+        if not all(postings):
+            return
+        for id in decode_postings(min(postings, key=len)):
+            entry = self.entries[id]
+            if entry is not None and text_matches(query, entry[1]):
+                yield entry
@@ -0,0 +1,201 @@
+"""
+Copyright © 2025 Joseph Kendall-Morwick
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”), to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+
+import json
+import os
+
+# binary triples start with this magic followed by a format version byte, then the
+# subject, property and value as utf-8 strings, each prefixed by its length (LEB128)
+TRIPLE_MAGIC = b'CIDT'
+TRIPLE_VERSION = 1
+TRIPLE_PREFIX = TRIPLE_MAGIC + bytes([TRIPLE_VERSION])
+
+# stores with a path record the encoding their triples were stored with in this file
+ENCODING_NAME = 'triple-encoding'
+
+# triples of these properties are annotated about their value rather than their
+# subject: HAD_PATH on a CONTAINS triple is the path of the member in that archive
+VALUE_ANNOTATED = frozenset({'CONTAINS'})
+
+
+def _varint(n: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = n & 0x7f
+        n >>= 7
+        if n:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def json_triple(subject: str, property: str, value: str) -> str:
+    """serialize a triple as a json list (the original triple format)"""
+    return json.dumps([subject, property, value])
+
+
+def binary_triple(subject: str, property: str, value: str) -> bytes:
+    """serialize a triple in the versioned, length-prefixed binary format
+
+        the encoding is deterministic so a triple always has the same cid"""
+    out = bytearray(TRIPLE_PREFIX)
+    for field in (subject, property, value):
+        data = field.encode('utf-8')
+        out += _varint(len(data))
+        out += data
+    return bytes(out)
+
+
+triple_encoders = {
+    'json': json_triple,
+    'binary': binary_triple,
+}
+
+
+def decode_binary_triple(data: bytes) -> tuple[str, str, str] | None:
+    if len(data) < len(TRIPLE_PREFIX) or data[len(TRIPLE_MAGIC)] != TRIPLE_VERSION:
+        return None
+    fields = []
+    pos = len(TRIPLE_PREFIX)
+    for _ in range(3):
+        length = shift = 0
+        while True:
+            if pos >= len(data):
+                return None
+            byte = data[pos]
+            pos += 1
+            length |= (byte & 0x7f) << shift
+            shift += 7
+            if not byte & 0x80:
+                break
+        end = pos + length
+        if end > len(data):
+            return None
+        try:
+            fields.append(data[pos:end].decode('utf-8'))
+        except UnicodeDecodeError:
+            return None
+        pos = end
+    if pos != len(data):
+        return None
+    return tuple(fields)
+
+
+def decode_json_triple(data: bytes) -> tuple[str, str, str] | None:
+    try:
+        triple = json.loads(data.decode('utf-8'))
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        return None
+    if (
+        isinstance(triple, list)
+        and len(triple) == 3
+        and all(isinstance(x, str) for x in triple)
+    ):
+        return tuple(triple)
+    return None
+
+
+def decode_triple(data: bytes | None) -> tuple[str, str, str] | None:
+    """parse stored data as a triple in either format, returning None for anything else
+
+        binary triples are recognised by their magic prefix; data which neither starts
+        with the magic nor with '[' is rejected without being parsed"""
+    if not data:
+        return None
+    if data.startswith(TRIPLE_MAGIC):
+        return decode_binary_triple(data)
+    if data[:1] == b'[':
+        return decode_json_triple(data)
+    return None
+
+
+def annotated_subject(ds, cid: str) -> str:
+    """the data an (encoded) cid is about, following triples annotating other triples
+
+        e.g. last_modified is believed on the had_path triple of a file, so for the
+        cid of that triple this is the cid of the file. annotations of a CONTAINS
+        triple are about the member (see VALUE_ANNOTATED). cids which aren't triples
+        stored in ds are returned as they are"""
+    while ds.known(cid):
+        triple = decode_triple(ds.recall(cid))
+        if triple is None:
+            break
+        cid = triple[2] if triple[1] in VALUE_ANNOTATED else triple[0]
+    return cid
+
+
+def stored_triple_encoding(ds) -> str | None:
+    """the encoding of the triples stored in ds
+
+        as recorded by record_triple_encoding, else detected from the first triple
+        found in ds. None if ds holds no triples"""
+    path = getattr(ds, 'path', None)
+    if path is not None and os.path.exists(os.path.join(path, ENCODING_NAME)):
+        with open(os.path.join(path, ENCODING_NAME)) as fp:
+            return fp.read().strip()
+    for cid in ds.list_known_cids():
+        data = ds.recall_binary(cid)
+        if data.startswith(TRIPLE_MAGIC):
+            return 'binary'
+        if decode_json_triple(data) is not None:
+            return 'json'
+    return None
+
+
+def record_triple_encoding(ds, triple_encoding: str) -> None:
+    """record the encoding of the triples stored in ds (if it has a path)"""
+    path = getattr(ds, 'path', None)
+    if path is None:
+        return
+    marker = os.path.join(path, ENCODING_NAME)
+    if os.path.exists(marker):
+        with open(marker) as fp:
+            if fp.read().strip() == triple_encoding:
+                return
+    with open(marker + '.tmp', 'w') as fp:
+        fp.write(triple_encoding + '\n')
+    os.replace(marker + '.tmp', marker)
+
+
+def migrate_triples(ds, triple_encoding: str = 'binary') -> dict[str, str]:
+    """re-encode every triple stored in ds with the given encoding
+
+        triples annotating other triples (e.g. last_modified on a had_path triple)
+        refer to them by cid, so those references are rewritten to the new cids.
+        triples that change encoding are forgotten in their old form, and the new
+        encoding is recorded in the store (see stored_triple_encoding).
+
+        returns a mapping of old to new (encoded) cids for the triples that changed"""
+    serialize = triple_encoders[triple_encoding]
+    triples = {}
+    for cid in list(ds.list_known_cids()):
+        triple = decode_triple(ds.recall_binary(cid))
+        if triple is not None:
+            triples[ds.encode(cid)] = triple
+
+    migrated = {}
+
+    def migrate(cid: str) -> str:
+        if cid not in migrated:
+            subject, property, value = triples[cid]
+            subject = migrate(subject) if subject in triples else subject
+            value = migrate(value) if value in triples else value
+            new, _ = ds.know(serialize(subject, property, value))
+            migrated[cid] = ds.encode(new)
+        return migrated[cid]
+
+    for cid in triples:
+        migrate(cid)
+    changed = {old: new for old, new in migrated.items() if old != new}
+    for old in changed:
+        ds.forget(old)
+    record_triple_encoding(ds, triple_encoding)
+    return changed
@@ -1,79 +1,279 @@
-import os
-import sys
-import sniffpy
+from collections.abc import Callable
+from typing import BinaryIO
 from .main import DataService, KnowledgeService
 
-def is_pdf(stream) -> bool:
-    try:
-        header = stream.read(8)
-        return header.startswith(b"%PDF-")
-    except:
-        return False
+# signatures are (type, offset, magic) triples matched against the header window
+signatures = [
+    ('pdf', 0, b"%PDF-"),
+    ('zip', 0, b"PK\x03\x04"),
+    ('zip', 0, b"PK\x05\x06"),
+    ('jpg', 0, b'\xFF\xD8'),
+    ('png', 0, b'\x89PNG\r\n\x1a\n'),
+    ('tar', 257, b'ustar\x00\x30\x30'),
+    ('tar', 257, b'ustar\x20\x20\x00'),
+    ('gz', 0, b'\x1f\x8b'),
+]
 
-def is_zip(stream) -> bool:
-    try:
-        header = stream.read(8)
-        return header.startswith(b"PK\x03\x04")
-    except:
-        return False
+HEADER_SIZE = 512
+TAIL_SIZE = 1024
+TYPE_PROPERTY = 'HAS_TYPE'
+UNKNOWN_TYPE = 'unknown'
+# types believed by an older detection are detected again; bump whenever detection changes
+DETECTION_VERSION = '2'
+DETECTION_PROPERTY = 'HAS_TYPE_DETECTION'
 
-def is_jpg(stream) -> bool:
-    try:
-        header = stream.read(2)
-        return header.startswith(b'\xFF\xD8')
-    except:
-        return False
+ZIP_END = b"PK\x05\x06"
+ZIP_END_SIZE = 22
+
+
+def ends_with_zip_directory(tail: bytes) -> bool:
+    """whether the final bytes of some data are a zip end of central directory record
+
+        the record is 22 bytes plus a comment whose length it holds, so it must end
+        exactly where the data ends. (zips with self-extractors or other data in front
+        of them only have this record in the right place.)"""
+    i = tail.rfind(ZIP_END)
+    while i >= 0:
+        record = tail[i:i + ZIP_END_SIZE]
+        if len(record) == ZIP_END_SIZE:
+            entries, total = int.from_bytes(record[8:10], 'little'), int.from_bytes(record[10:12], 'little')
+            comment = int.from_bytes(record[20:22], 'little')
+            if i + ZIP_END_SIZE + comment == len(tail) and entries <= total:
+                return True
+        i = tail.rfind(ZIP_END, 0, i)
+    return False
 
+# checks of the final bytes of data (the tail window)
+tail_checks = [
+    ('zip', ends_with_zip_directory),
+]
 
-def is_png(stream) -> bool:
+
+def build_prefix_table(signatures) -> dict:
+    """index signatures by offset and first magic byte so each offset is probed once"""
+    table = {}
+    for t, offset, magic in signatures:
+        table.setdefault(offset, {}).setdefault(magic[0], []).append((magic, t))
+    return table
+
+prefix_table = build_prefix_table(signatures)
+
+
+def read_window(stream) -> tuple[bytes, bytes|None]:
+    """read the header window and the tail window (the last TAIL_SIZE bytes, which may
+    overlap the header), or None for the tail if the stream can't seek to its end"""
+    header = stream.read(HEADER_SIZE)
+    if len(header) < HEADER_SIZE:
+        return header, header
     try:
-        header = stream.read(8)
-        return header.startswith(b'\x89PNG\r\n\x1a\n')
-    except:
-        return False
+        end = stream.seek(0, 2)
+        stream.seek(max(end - TAIL_SIZE, 0))
+        return header, stream.read(TAIL_SIZE)
+    except Exception:
+        return header, None
+
+
+def match_window(header:bytes, tail:bytes|None=None) -> set[str]:
+    """find the types of all signatures matching the given header and tail windows
 
-def is_tar(stream) -> bool:
+        without a tail, a header shorter than HEADER_SIZE is taken to hold all the data"""
+    found = set()
+    for offset, candidates in prefix_table.items():
+        if len(header) <= offset:
+            continue
+        for magic, t in candidates.get(header[offset], ()):
+            if header.startswith(magic, offset):
+                found.add(t)
+    if tail is None and len(header) < HEADER_SIZE:
+        tail = header
+    if tail is not None:
+        for t, check in tail_checks:
+            if t not in found and check(tail):
+                found.add(t)
+    return found
+
+
+def detect_types(stream) -> set[str]:
+    """determine all known types of the data in stream from a single read of its header and tail"""
     try:
-        stream.seek(257)
-        magic = stream.read(8)
-        return magic.startswith(b'ustar\x00\x30\x30') or magic.startswith(b'ustar\x20\x20\x00') 
-    except:
-        return False
+        return match_window(*read_window(stream))
+    except Exception:
+        return set()
+
 
-def is_gz(stream) -> bool:
+def detect(ds: DataService, ks: KnowledgeService, cid: str) -> set[str]:
+    """determine the types of the data identified by cid
+
+        results are believed as HAS_TYPE triples, along with the DETECTION_VERSION that
+        found them, so later calls skip detection. types believed without the current
+        version (including 'unknown') are detected again and replaced"""
+    known = {v for _, _, v in ks.inquire(cid, TYPE_PROPERTY)}
+    versions = {v for _, _, v in ks.inquire(cid, DETECTION_PROPERTY)}
+    current = bool(known) and versions == {DETECTION_VERSION}
+    ks.cache_outcome('types', current)
+    if current:
+        return known - {UNKNOWN_TYPE}
+    stream = ds.recall_stream(cid)
+    if stream is None:
+        return set()
     try:
-        header = stream.read(2)
-        return header.startswith(b'\x1f\x8b')
-    except:
-        return False
+        found = detect_types(stream)
+    finally:
+        stream.close()
+    types = set(found) or {UNKNOWN_TYPE}
+    for t in known - types:
+        ks.retract(cid, TYPE_PROPERTY, t)
+    for version in versions - {DETECTION_VERSION}:
+        ks.retract(cid, DETECTION_PROPERTY, version)
+    ks.believe_many([(cid, TYPE_PROPERTY, t) for t in sorted(types)] + [(cid, DETECTION_PROPERTY, DETECTION_VERSION)])
+    return found
+
+
+def is_type(t: str) -> Callable[[BinaryIO], bool]:
+    """build a predicate testing whether a stream holds data of type t"""
+    def predicate(stream) -> bool:
+        return t in detect_types(stream)
+    predicate.__name__ = 'is_' + t
+    return predicate
+
+is_pdf = is_type('pdf')
+is_zip = is_type('zip')
+is_jpg = is_type('jpg')
+is_png = is_type('png')
+is_tar = is_type('tar')
+is_gz = is_type('gz')
+
+
+def gzip_member_name(header:bytes) -> str|None:
+    """read the original file name (FNAME) from a gzip header if one is recorded"""
+    if len(header) < 10 or not header[3] & 0x08:
+        return None
+    start = 10
+    if header[3] & 0x04:  # FEXTRA
+        start += 2 + int.from_bytes(header[10:12], 'little')
+    end = header.find(b'\x00', start)
+    if end < 0:
+        return None
+    return header[start:end].decode('latin-1')
+
+
+# archive modules are imported by the readers using them to keep import time down
+def zip_members(stream):
+    import zipfile
+    with zipfile.ZipFile(stream) as z:
+        for info in z.infolist():
+            if info.is_dir():
+                continue
+            with z.open(info) as member:
+                yield info.filename, member
 
 
-def extract_generic(ds: DataService, ks:KnowledgeService, cid: str, extension: str, command: str):
-    os.mkdir('/tmp/'+cid)
+def tar_members(stream):
+    import tarfile
+    with tarfile.open(fileobj=stream, mode='r|*') as t:
+        for info in t:
+            if not info.isfile():
+                continue
+            member = t.extractfile(info)
+            yield info.name, member
+
+
+def gz_members(stream):
+    import gzip
+    name = gzip_member_name(stream.read(HEADER_SIZE))
+    stream.seek(0)
+    with gzip.GzipFile(fileobj=stream) as member:
+        yield name or 'out', member
+
+
+def store_members(ds: DataService, cid: str, members: Callable) -> list[tuple[str, str]]:
+    """store every member of the archive identified by cid without copying the archive
+
+        each member is streamed from the archive straight into ds.know_file
+
+        returns the (cid, path) pairs of the stored members"""
+    stored = []
     fin = ds.recall_stream(cid)
-    fout = open("/tmp/{cid}/{cid}.{extension}".format(cid=cid,extension=extension), 'wb')
-    print("Copying " + cid, flush=True, file=sys.stderr)
-    while True:
-        data = fin.read(104857600)
-        if not data:
-            break
-        fout.write(data)
-        print(".", end="", flush=True, file=sys.stderr)
-    fout.close()
-    print(command.format(cid=cid,extension=extension))
-    os.system(command.format(cid=cid,extension=extension))
-    os.system("rm /tmp/{cid}/{cid}.{extension}".format(cid=cid,extension=extension))
-    for root, dirs, files in os.walk("/tmp/{cid}".format(cid=cid)):
-        for file in files:
-            # TODO: handle metadata
-            print("Storing " + os.path.join(root,file) + "... ")
-            bcid, known = ds.know_file(open(os.path.join(root,file), 'rb')) 
-            if not known: print("ALREADY ", end='')
-            print("STORED AS " + bcid)
-            ks.believe(ds.decode(cid), 'CONTAINS', bcid)
-            acid, known = ks.believe(ds.decode(cid), 'HAD_PATH', os.path.join(root,file)[len(cid)+5:])
-                
-    os.system("rm -rf /tmp/"+cid)
+    try:
+        for path, member in members(fin):
+            bcid, isnew = ds.know_file(member)
+            bcid = ds.encode(bcid)
+            ds.note('extract', "Storing " + path + "... " + ("" if isnew else "ALREADY ") + "STORED AS " + bcid)
+            stored.append((bcid, path))
+    finally:
+        fin.close()
+    return stored
+
+
+def believe_members(ks: KnowledgeService, cid: str, stored: list[tuple[str, str]]):
+    """believe a CONTAINS triple (annotated with HAD_PATH) for each stored member of cid"""
+    contains = ks.believe_many([(cid, 'CONTAINS', bcid) for bcid, _ in stored])
+    ks.believe_many([(ks.ds.encode(ccid), 'HAD_PATH', path) for (ccid, _), (_, path) in zip(contains, stored)])
+
+
+def extract_generic(ds: DataService, ks:KnowledgeService, cid: str, members: Callable) -> list[tuple[str, str]]:
+    """store every member of the archive identified by cid and believe its containment
+
+        returns the (cid, path) pairs of the stored members"""
+    stored = store_members(ds, cid, members)
+    believe_members(ks, cid, stored)
+    return stored
+
+
+def archive_type(ds: DataService, ks: KnowledgeService, cid: str) -> str|None:
+    """determine which archive type (if any) the data identified by cid has"""
+    types = detect(ds, ks, cid)
+    return next((t for t in archive_typers if t in types), None)
+
+
+def extract_recursive(ds: DataService, ks: KnowledgeService, cid: str, 
+                      depth: int = 8, workers: int|None = None) -> list[str]:
+    """extract the archive identified by cid and any archives nested inside it
+
+        depth limits how many levels of nesting are unpacked (1 only unpacks cid). 
+        archives which already have CONTAINS triples were extracted before, so they
+        aren't stored again but the members they contain are still descended into.
+        archives failing to unpack are reported and skipped. independent archives are
+        unpacked in a pool of worker threads while type detection and all knowledge
+        service writes stay on the calling thread.
+
+        returns the cids of the archives extracted"""
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+    extracted = []
+    seen = set()
+    futures = {}
+    with ThreadPoolExecutor(workers) as pool:
+        def submit(c: str, level: int):
+            if c in seen or level > depth:
+                return
+            seen.add(c)
+            t = archive_type(ds, ks, c)
+            if t is None:
+                return
+            known = [member for _, _, member in ks.inquire(c, 'CONTAINS')]
+            if known:
+                ds.note('extract', "Skipping " + c + " (already extracted)")
+                for member in known:
+                    submit(member, level + 1)
+                return
+            futures[pool.submit(store_members, ds, c, member_readers[t])] = (c, level)
+
+        submit(cid, 1)
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for f in done:
+                c, level = futures.pop(f)
+                try:
+                    stored = f.result()
+                except Exception as e:
+                    ds.note('extract', "Failed to extract " + c + ": " + str(e))
+                    continue
+                believe_members(ks, c, stored)
+                extracted.append(c)
+                for bcid, _ in stored:
+                    submit(bcid, level + 1)
+    return extracted
+
 
 typers = {
     'pdf': is_pdf,
@@ -90,11 +290,14 @@ archive_typers = {
     'gz': is_gz
 }
 
+member_readers = {
+    'zip': zip_members,
+    'gz': gz_members,
+    'tar': tar_members
+}
+
 extractors = {
-    'zip': lambda ds, ks, cid : extract_generic(ds, ks, cid, 'zip', 
-                                            "unzip /tmp/{cid}/{cid}.{extension} -d /tmp/{cid}/"),
-    'gz': lambda ds, ks, cid : extract_generic(ds, ks, cid, 'gz', 
-                                            "zcat /tmp/{cid}/{cid}.{extension} > /tmp/{cid}/{cid}.out"),
-    'tar': lambda ds, ks, cid : extract_generic(ds, ks, cid, 'tar', 
-                                            "tar -xvf /tmp/{cid}/{cid}.{extension} -C /tmp/{cid}/")
+    'zip': lambda ds, ks, cid : extract_generic(ds, ks, cid, zip_members),
+    'gz': lambda ds, ks, cid : extract_generic(ds, ks, cid, gz_members),
+    'tar': lambda ds, ks, cid : extract_generic(ds, ks, cid, tar_members)
 }
@@ -8,85 +8,233 @@ The above copyright notice and this permission notice shall be included in all c
 THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
 
+import time
+STARTED = time.perf_counter()
+
 import click
+import itertools
+import json
 import os
+import re
 import stat
-import sniffpy
-from cidnilib import FileBasedDataService, InMemoryKnowledgeService, PickleFileBasedDataService, typers, archive_typers, extractors
+import sys
+from cidnilib import FileBasedDataService, StripedDataService, InMemoryKnowledgeService, PickleFileBasedDataService, typers, archive_typers, extractors, archive_type, extract_recursive, StatManifest, ingest_path, migrate_triples, stored_triple_encoding, record_triple_encoding, annotated_subject, Metrics, Observer, ProgressDots, page_cids
+from cidnilib.stripeds import read_layout
+
+
+class LazyServices(dict):
+    """services are constructed on first use so commands only pay for the services they touch"""
+
+    def __init__(self, ctx, dataservice, triple_encoding='json', observers=(), durability='none'):
+        super().__init__()
+        self.ctx = ctx
+        self.dataservice = dataservice
+        self.durability = durability
+        self.triple_encoding = triple_encoding
+        self.observers = tuple(observers)
+
+    def __missing__(self, key):
+        roots = self.dataservice.split(os.pathsep)
+        if key == "DATASERVICE":
+            stripes = [FileBasedDataService(root, durability=self.durability) for root in roots]
+            try:    # a single root that was striped must still be checked for its missing stripes
+                value = stripes[0] if len(stripes) == 1 and not read_layout(stripes[0]) else StripedDataService(stripes)
+            except ValueError as e:
+                raise click.ClickException(str(e))
+            value.observers = self.observers
+            self.ctx.call_on_close(value.close)
+        elif key == "KNOWLEDGEDATASERVICE":
+            value = PickleFileBasedDataService(roots[0], levels=0)
+            value.observers = self.observers
+            self.ctx.call_on_close(value.close)
+        elif key == "KNOWLEDGESERVICE":
+            kds = self["KNOWLEDGEDATASERVICE"]
+            stored = stored_triple_encoding(kds)
+            if stored not in (None, self.triple_encoding):
+                raise click.ClickException(f"the triples in this store are {stored} encoded; pass --triple-encoding {stored} or convert them with migrate-triples")
+            kds.observers = kds.observers + (TripleEncodingRecorder(self.triple_encoding),)
+            value = InMemoryKnowledgeService(kds, self.triple_encoding, self.observers)
+        else:
+            raise KeyError(key)
+        self[key] = value
+        return value
+
+
+class TripleEncodingRecorder(Observer):
+    """records the triple encoding of a knowledge store once triples are written to it,
+    so commands that only read triples leave the store untouched"""
+
+    def __init__(self, triple_encoding):
+        self.triple_encoding = triple_encoding
+        self.recorded = False
+
+    def operation(self, service, name, seconds, nbytes=0):
+        if not self.recorded and name in ('know_binary', 'know_many', 'know_file', 'know_path'):
+            self.recorded = True
+            record_triple_encoding(service, self.triple_encoding)
+
+
+blob_io_builtins = {
+    "<method 'read' of '_io.BufferedReader' objects>",
+    "<method 'readinto' of '_io.BufferedReader' objects>",
+    "<method 'write' of '_io.BufferedWriter' objects>",
+    "<method 'read' of '_io.FileIO' objects>",
+    "<method 'write' of '_io.FileIO' objects>",
+    '<built-in method io.open>',
+    '<built-in method posix.replace>',
+    '<built-in method posix.link>',
+    '<built-in method posix.copy_file_range>',
+    '<built-in method posix.sendfile>',
+}
+
+# profiled functions counted towards each phase of the --profile breakdown, as
+# predicates on (file name, function name); builtins have the file name '~'
+profile_phases = [
+    ('knowledge service load', lambda f, n: n == '__init__' and f.endswith('inmemks.py')),
+    ('hashing', lambda f, n: n in ('update', 'digest') and f.endswith(os.path.join('cidnilib', 'main.py'))),
+    ('base58 encoding', lambda f, n: n in ('to_b58_string', 'from_b58_string')),
+    ('blob I/O', lambda f, n: f == '~' and n in blob_io_builtins),
+    ('mime sniffing', lambda f, n: n == 'describe' and f.endswith('ingest.py')),
+    ('metadata writes', lambda f, n: n in ('believe', 'believe_many') and f.endswith(('main.py', 'inmemks.py'))),
+    ('flush', lambda f, n: (n in ('flush', 'close') and f.endswith('picklefileds.py'))
+                           or (n in ('flush', 'close', 'commit') and f.endswith('filebasedds.py'))),
+]
+
+
+def phase_breakdown(stats) -> dict[str, float]:
+    """sum the cumulative time of the outermost calls matching each profile phase"""
+    totals = {}
+    for phase, matches in profile_phases:
+        total = 0.0
+        for (filename, _, name), (_, _, _, cumtime, callers) in stats.stats.items():
+            if matches(filename, name) and not any(matches(f, n) for f, _, n in callers):
+                total += cumtime
+        totals[phase] = total
+    return totals
+
+
+def start_profile(ctx, path):
+    import cProfile
+    profiler = cProfile.Profile()
+    started = time.perf_counter()
+
+    def finish():
+        import pstats
+        profiler.disable()
+        profiler.dump_stats(path)
+        click.echo(f"\nprofile written to {path} (view with python -m pstats {path})", err=True)
+        click.echo("wall-clock by phase (seconds, phases may overlap):", err=True)
+        click.echo(f"  {'startup':<24}{started - STARTED:10.4f}", err=True)
+        for phase, seconds in phase_breakdown(pstats.Stats(profiler)).items():
+            click.echo(f"  {phase:<24}{seconds:10.4f}", err=True)
+        click.echo(f"  {'total':<24}{time.perf_counter() - STARTED:10.4f}", err=True)
+
+    ctx.call_on_close(finish)
+    profiler.enable()
+
 
 @click.group(invoke_without_command=True)
-@click.option('--dataservice', envvar="CIDNI_DATASERVICE", help="Specify data service (defaults to CIDNI_DATASERVICE)")
+@click.option('--dataservice', envvar="CIDNI_DATASERVICE", help="Specify data service (defaults to CIDNI_DATASERVICE); several directories separated by '%s' stripe the data over them" % os.pathsep.replace('%', '%%'))
+@click.option('--triple-encoding', envvar="CIDNI_TRIPLE_ENCODING", type=click.Choice(['json', 'binary']), default='json', help="Encoding of the triples in the store, which must match the one recorded there (defaults to CIDNI_TRIPLE_ENCODING or json; see migrate-triples)")
+@click.option('--durability', envvar="CIDNI_DURABILITY", type=click.Choice(['none', 'group', 'strict']), default='group', show_default=True, help="When stored data is forced to disk: left to the OS, fsynced in groups, or fsynced before each store completes (defaults to CIDNI_DURABILITY)")
+@click.option('--stats-file', envvar="CIDNI_STATS_FILE", type=click.Path(dir_okay=False), help="Accumulate operation metrics in this file (defaults to CIDNI_STATS_FILE, see `cidni stats`)")
+@click.option('--progress/--no-progress', default=True, help="Print progress dots to stderr while storing large files")
+@click.option('--profile', type=click.Path(dir_okay=False), help="Run the command under cProfile, write the stats to this file and print a breakdown by phase")
 @click.pass_context
-def main(ctx, dataservice):
+def main(ctx, dataservice, triple_encoding, durability, stats_file, progress, profile):
     """Cidni CLI requires a command to follow cidni"""
     if ctx.invoked_subcommand is None:
         click.echo("Error: Missing command\n", err=True)
         click.echo(ctx.get_help())
         ctx.exit(1)
-    ctx.ensure_object(dict)
-    ctx.obj["DATASERVICE"] = FileBasedDataService(dataservice)
-    ds_for_ks = PickleFileBasedDataService(dataservice, levels=0)
-    ctx.obj["KNOWLEDGESERVICE"] = InMemoryKnowledgeService(ds_for_ks)
-    ctx.call_on_close(ds_for_ks.close)
+    if profile:
+        start_profile(ctx, profile)
+    observers = []
+    if progress:
+        observers.append(ProgressDots())
+    if stats_file and ctx.invoked_subcommand != 'stats':
+        metrics = Metrics()
+        observers.append(metrics)
+        ctx.call_on_close(lambda: metrics.save(stats_file))
+    ctx.obj = LazyServices(ctx, dataservice, triple_encoding, observers, durability)
+    ctx.obj.stats_file = stats_file
 
 @main.command()
 @click.pass_context
 @click.argument("path", metavar="<file path>")
 @click.option('-r', '--recursive', is_flag=True, help="If set, target is treated as a directory and all files in this directory and its subdirectories are stored")
-def know(ctx, path, recursive: bool = False):
+@click.option('--link', is_flag=True, help="If set, files are cloned into storage (reflink) instead of copied where the filesystem supports it")
+@click.option('--hardlink', is_flag=True, help="If set, files are hard linked into storage and made read-only instead of copied where possible")
+@click.option('--manifest/--no-manifest', 'use_manifest', default=True, help="When recursive, skip files whose path, inode, size and modification time are unchanged since they were last stored")
+@click.option('--verify', is_flag=True, help="When recursive, re-hash files even if the manifest says they are unchanged")
+def know(ctx, path, recursive: bool = False, link: bool = False, hardlink: bool = False, use_manifest: bool = True, verify: bool = False):
     """Store data in specified file"""
     dataservice = ctx.obj["DATASERVICE"]
     knowledgeservice = ctx.obj["KNOWLEDGESERVICE"]
+    link_mode = 'hardlink' if hardlink else 'reflink' if link else None
 
-    def store_file(file_path):
-        with open(file_path, 'rb') as f:
-            cid, isnew = dataservice.know_file(f)
+    def store_file(file_path, stats=None):
+        cid, isnew, properties = ingest_path(dataservice, file_path, link_mode)
         if not isnew:
             click.echo("ALREADY STORED", err=True)
 
-        click.echo(f"'{file_path}' --> '{dataservice.encode(cid)}'")
-        acid, known = knowledgeservice.believe(dataservice.encode(cid), 'had_path', file_path)
-        stats = os.stat(file_path)
+        ecid = dataservice.encode(cid)
+        click.echo(f"'{file_path}' --> '{ecid}'")
+        if ('mime_type', 'error') in properties:
+            click.echo('sniffpy error', err=True)
+        (acid, known), *_ = knowledgeservice.believe_many(
+            [(ecid, 'had_path', file_path)] + [(ecid, property, value) for property, value in properties])
+        stats = stats if stats is not None else os.stat(file_path)
+        eacid = dataservice.encode(acid)
         click.echo(f"storing last_accessed {stats.st_atime}", err=True)
-        knowledgeservice.believe(dataservice.encode(acid), 'last_accessed', str(stats.st_atime))
         click.echo(f"storing last_modified {stats.st_mtime}", err=True)
-        knowledgeservice.believe(dataservice.encode(acid), 'last_modified', str(stats.st_mtime))
         click.echo(f"storing created {stats.st_ctime}", err=True)
-        knowledgeservice.believe(dataservice.encode(acid), 'created', str(stats.st_ctime))
-        
-        try:
-            with open(file_path, "rb") as f:
-                mime = sniffpy.sniff(f.read())
-            knowledgeservice.believe(dataservice.encode(cid), 'mime_type', mime.type)
-            knowledgeservice.believe(dataservice.encode(cid), 'mime_subtype', mime.subtype)
-        except: 
-            click.echo('sniffpy error', err=True)
-            knowledgeservice.believe(dataservice.encode(cid), 'mime_type', 'error')
+        knowledgeservice.believe_many([
+            (eacid, 'last_accessed', str(stats.st_atime)),
+            (eacid, 'last_modified', str(stats.st_mtime)),
+            (eacid, 'created', str(stats.st_ctime)),
+        ])
         return cid, isnew
 
     if recursive and os.path.isdir(path):
         savedfiles = 0
         existingfiles = 0
+        unchangedfiles = 0
         skippedfiles = 0
-        for dirpath, _, filenames in os.walk(path):
-            if stat.S_ISDIR(os.stat(dirpath).st_mode): 
-                for filename in filenames:
-                    file_path = os.path.join(dirpath, filename)
-                    try: 
-                        if stat.S_ISREG(os.stat(file_path).st_mode): 
-                            cid, isnew = store_file(file_path)
-                            if isnew and cid:
-                                savedfiles += 1
-                            elif cid: 
-                                existingfiles += 1
-                        else:
+        manifest = StatManifest(os.path.join(dataservice.path, 'manifest.json')) if use_manifest else None
+        try:
+            for dirpath, _, filenames in os.walk(path):
+                if stat.S_ISDIR(os.stat(dirpath).st_mode): 
+                    for filename in filenames:
+                        file_path = os.path.join(dirpath, filename)
+                        try: 
+                            stats = os.stat(file_path)
+                            if stat.S_ISREG(stats.st_mode): 
+                                recorded = manifest.lookup(file_path, stats) if manifest else None
+                                if recorded and not verify and dataservice.known(recorded):    # unless forgotten since
+                                    unchangedfiles += 1
+                                    continue
+                                cid, isnew = store_file(file_path, stats)
+                                if recorded and recorded != dataservice.encode(cid):
+                                    click.echo("Manifest mismatch: " + file_path, err=True)
+                                if manifest and cid:
+                                    manifest.record(file_path, dataservice.encode(cid), stats)
+                                if isnew and cid:
+                                    savedfiles += 1
+                                elif cid: 
+                                    existingfiles += 1
+                            else:
+                                click.echo("Invalid Path: " + file_path + " ...skipping", err=True)
+                                skippedfiles += 1
+                        except:
                             click.echo("Invalid Path: " + file_path + " ...skipping", err=True)
                             skippedfiles += 1
-                    except:
-                        click.echo("Invalid Path: " + file_path + " ...skipping", err=True)
-                        skippedfiles += 1
+        finally:
+            if manifest:
+                manifest.close()
         click.echo(f"new files: {savedfiles}", err=True)
         click.echo(f"already stored files: {existingfiles}", err=True)
+        click.echo(f"unchanged files: {unchangedfiles}", err=True)
         click.echo(f"skipped files: {skippedfiles}", err=True)
     elif not os.path.islink(path): 
         store_file(path)
@@ -95,10 +243,22 @@ def know(ctx, path, recursive: bool = False):
 
 @main.command()
 @click.pass_context
-@click.argument("cid", metavar="<content-id>") #TODO: add arg to switch between text/binary
-def recall(ctx, cid):
+@click.argument("cid", metavar="<content-id>")
+@click.option('-b', '--binary', is_flag=True, help="Stream raw data to stdout instead of decoding it as text")
+@click.option('-o', '--output', type=click.Path(dir_okay=False), help="Write raw data to this file instead of stdout")
+def recall(ctx, cid, binary: bool = False, output: str|None = None):
     """Retrieve data"""
-    click.echo(ctx.obj["DATASERVICE"].recall_text(cid))
+    dataservice = ctx.obj["DATASERVICE"]
+    if not dataservice.known(cid):
+        raise click.ClickException("unknown content-id " + cid)
+    if not binary and not output:
+        click.echo(dataservice.recall_text(cid))
+        return
+    if output:
+        with open(output, 'wb') as f:
+            dataservice.recall_file(cid, f)
+    else:
+        dataservice.recall_file(cid, sys.stdout.buffer)
 
 @main.command()
 @click.pass_context
@@ -119,37 +279,179 @@ def confirm(ctx, cid):
     else:
         click.echo('error: ' + cid + ' != ' + ctx.obj["DATASERVICE"].encode(ncid))
 
+property_filter = re.compile(r'^([^=<>^]+)(\^=|>=|<=|=|>|<)(.*)$', re.DOTALL)
+
 @main.command()
 @click.pass_context
-@click.option('-p', '--property', help="only enumerate data with the indicated property/value")
-def list(ctx, property):
-    """list all known CID's"""
-    v = None
-    p = property
-    if property and property.find('=') > 0:
-        p, v = property.split('=')
-        i = ctx.obj["KNOWLEDGESERVICE"].inquire(None, p, v)
-        for cid, _, _ in i:
-            click.echo(cid)
+@click.option('-p', '--property', help="only enumerate data whose property matches: prop=value, prop^=prefix, or a comparison such as 'last_modified>1700000000' (>, >=, <, <=; numbers compare numerically)")
+@click.option('--prefix', help="only list CIDs starting with this prefix")
+@click.option('--after', metavar="<content-id>", help="resume listing after this CID (the last one of a previous page)")
+@click.option('--limit', type=click.IntRange(min=0), help="list at most this many CIDs")
+@click.option('--transitive', is_flag=True, help="with -p prop=value, also list data related to value through chains of prop (e.g. every archive ultimately CONTAINS a CID)")
+def list(ctx, property, prefix, after, limit, transitive):
+    """list all known CID's (in sorted order)"""
+    match = property_filter.match(property) if property else None
+    if transitive and not (match and match.group(2) == '='):
+        raise click.BadParameter("--transitive needs a property filter of the form prop=value", ctx)
+    if match:
+        p, op, v = match.groups()
+        ks = ctx.obj["KNOWLEDGESERVICE"]
+        if transitive:
+            i = ks.inquire_transitive(None, p, v)
+        elif op == '=':
+            i = ks.inquire(None, p, v)
+        elif op == '^=':
+            i = ks.inquire_prefix(p, v)
+        elif op.startswith('>'):
+            i = ks.inquire_range(p, lo=v, include_lo=op == '>=')
+        else:
+            i = ks.inquire_range(p, hi=v, include_hi=op == '<=')
+        kds = ctx.obj["KNOWLEDGEDATASERVICE"]    # e.g. last_modified matches the had_path triple of a file
+        cids = page_cids(sorted({annotated_subject(kds, cid) for cid, _, _ in i}), prefix, after, limit)
     else:
-        for ecid in ctx.obj["DATASERVICE"].list_known_cids():
-            click.echo(ctx.obj["DATASERVICE"].encode(ecid))
+        ds = ctx.obj["DATASERVICE"]
+        cids = [ds.encode(ecid) for ecid in ds.list_known_cids(prefix, after, limit)]
+    for cid in cids:
+        click.echo(cid)
+    if limit and len(cids) == limit:
+        click.echo(f"more CIDs may follow; continue with --after {cids[-1]}", err=True)
 
 @main.command()
 @click.pass_context
 @click.argument("cid", metavar="<content-id>")
-def extract(ctx, cid):
+@click.option('-r', '--recursive', is_flag=True, help="If set, archives found inside the archive are extracted as well")
+@click.option('--depth', default=8, show_default=True, help="Maximum levels of nested archives to extract when recursive")
+@click.option('-j', '--jobs', type=int, default=None, help="Number of archives to extract in parallel when recursive (defaults to the number of CPUs)")
+def extract(ctx, cid, recursive: bool = False, depth: int = 8, jobs: int|None = None):
     """extract and know all contents of archive identified by cid"""
     ds = ctx.obj["DATASERVICE"]
     ks = ctx.obj["KNOWLEDGESERVICE"]
-    type = None
-    for t in archive_typers:
-        if typers[t](ctx.obj["DATASERVICE"].recall_stream(cid)):
-            type = t
+    type = archive_type(ds, ks, cid)
     if not type:
         raise click.BadParameter("CID must represent an archive of a known type", ctx)
-    ex = extractors[type]
-    ex(ds, ks, cid)
+    if recursive:
+        extracted = extract_recursive(ds, ks, cid, depth, jobs)
+        click.echo(f"extracted archives: {len(extracted)}", err=True)
+    else:
+        ex = extractors[type]
+        ex(ds, ks, cid)
+
+@main.command()
+@click.pass_context
+@click.argument("text")
+@click.option('-p', '--property', help="only search values of this property (default: paths, mime types and detected types)")
+@click.option('--limit', type=click.IntRange(min=0), help="show at most this many matches")
+def search(ctx, text, property, limit):
+    """find data whose property values mention every word of TEXT
+
+    the text index isn't persisted: like the rest of the knowledge service it
+    is rebuilt in memory for each invocation, so searching a large store pays
+    for indexing every searched property first"""
+    matches = ctx.obj["KNOWLEDGESERVICE"].search(text, property)
+    kds = ctx.obj["KNOWLEDGEDATASERVICE"]    # e.g. the path of an archive member annotates its contains triple
+    for subject, prop, value in (matches if limit is None else itertools.islice(matches, limit)):
+        click.echo(f"{annotated_subject(kds, subject)}\t{prop}\t{value}")
+
+@main.command()
+@click.pass_context
+@click.option('--host', default='127.0.0.1', show_default=True, help="Address to listen on")
+@click.option('--port', default=8080, show_default=True, help="Port to listen on (0 picks a free port)")
+def serve(ctx, host, port):
+    """serve stored data and triples over HTTP
+
+    GET/HEAD/PUT /cid/<cid>, GET /cid?prefix=&after=&limit= to list and
+    GET /triples?subject=&property=&value= to query triples. the store
+    holding the triples is served under /knowledge (e.g. for cidni sync)"""
+    from cidnilib import CidServer
+    import signal
+    ds = ctx.obj["DATASERVICE"]
+    server = CidServer((host, port), ds, ctx.obj["KNOWLEDGESERVICE"], ctx.obj["KNOWLEDGEDATASERVICE"])
+    click.echo(f"serving {ds.path} on {server.url}", err=True)
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, stop)    # save written data when terminated too
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+def open_store(ctx, location):
+    """the data service and triple store at a store directory or cidni serve url"""
+    if location.startswith(('http://', 'https://')):
+        from cidnilib import HttpDataService
+        ds, kds = HttpDataService(location), HttpDataService(location.rstrip('/') + '/knowledge')
+    elif os.path.isdir(location):
+        ds, kds = FileBasedDataService(location, durability=ctx.obj.durability), PickleFileBasedDataService(location, levels=0)
+    else:
+        raise click.BadParameter(f"{location} is neither a directory nor an http url", ctx)
+    for service in (ds, kds):
+        if hasattr(service, 'close'):
+            ctx.call_on_close(service.close)
+    return ds, kds
+
+@main.command()
+@click.pass_context
+@click.argument("src")
+@click.argument("dst")
+@click.option('--both', is_flag=True, help="Also copy what DST has but SRC lacks")
+@click.option('-j', '--jobs', default=8, show_default=True, help="Number of batches to copy in parallel")
+def sync(ctx, src, dst, both, jobs):
+    """copy data and triples SRC has but DST lacks to DST
+
+    SRC and DST are store directories or cidni serve urls. only shards whose
+    digests differ are compared, so syncing similar stores is cheap"""
+    from cidnilib.sync import sync as sync_stores
+    (src_ds, src_kds), (dst_ds, dst_kds) = open_store(ctx, src), open_store(ctx, dst)
+    failed = []
+    for name, a, b in (("data", src_ds, dst_ds), ("triples", src_kds, dst_kds)):
+        result = sync_stores(a, b, both, workers=jobs)
+        click.echo(f"{name}: copied {result.copied}, shards differing {result.shards_differing} of {result.shards_compared}", err=True)
+        for cid in result.failed:
+            click.echo(f"failed to copy {cid}", err=True)
+        failed += result.failed
+    if failed:
+        ctx.exit(1)
+
+@main.command()
+@click.pass_context
+def rebalance(ctx):
+    """move data to the stripe owning it after adding a directory to --dataservice
+
+    until this is run, data stored before the directory was added is looked up
+    on every stripe"""
+    ds = ctx.obj["DATASERVICE"]
+    moved = ds.rebalance() if isinstance(ds, StripedDataService) else 0
+    click.echo(f"moved: {moved}", err=True)
+
+@main.command("migrate-triples")
+@click.pass_context
+def migrate_triples_command(ctx):
+    """re-encode all stored triples with the selected --triple-encoding"""
+    changed = migrate_triples(ctx.obj["KNOWLEDGEDATASERVICE"], ctx.obj.triple_encoding)
+    click.echo(f"migrated triples: {len(changed)}", err=True)
+
+
+@main.command()
+@click.pass_context
+@click.option('--reset', is_flag=True, help="Clear the accumulated metrics")
+def stats(ctx, reset: bool = False):
+    """dump operation metrics accumulated in the --stats-file"""
+    stats_file = ctx.obj.stats_file
+    if not stats_file:
+        raise click.UsageError("no stats file given (use --stats-file or CIDNI_STATS_FILE)", ctx)
+    if reset:
+        if os.path.exists(stats_file):
+            os.remove(stats_file)
+        return
+    metrics = Metrics()
+    if os.path.exists(stats_file):
+        with open(stats_file) as fp:
+            metrics.merge(json.load(fp))
+    click.echo(json.dumps(metrics.snapshot(), indent=2))
 
 
 if __name__ == "__main__":
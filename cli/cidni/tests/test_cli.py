@@ -1,5 +1,13 @@
+import json
+import os
+import subprocess
+import sys
+import time
+import zipfile
+
 from click.testing import CliRunner
 
+import cidni.__main__
 from cidni.__main__ import main
 
 
@@ -109,3 +117,493 @@ def test_list_by_had_path_uses_persisted_knowledge_service(tmp_path):
 
     assert result.exit_code == 0
     assert cid in result.output
+
+
+def test_extract_zip_knows_members(tmp_path):
+    runner = CliRunner()
+    store_dir = tmp_path / "store"
+    store_dir.mkdir()
+
+    archive = tmp_path / "a.zip"
+    with zipfile.ZipFile(archive, "w") as z:
+        z.writestr("inner.txt", "inner contents")
+
+    know_result = runner.invoke(main, ["--dataservice", str(store_dir), "know", str(archive)])
+    cid = know_result.output.split("' --> '")[1].split("'")[0]
+
+    result = runner.invoke(main, ["--dataservice", str(store_dir), "extract", cid])
+
+    assert result.exit_code == 0
+    assert "STORED AS" in result.output
+
+    member_cid = result.output.split("STORED AS ")[1].split()[0]
+    result = runner.invoke(main, ["--dataservice", str(store_dir), "recall", member_cid])
+
+    assert "inner contents" in result.output
+
+
+def test_member_paths_find_the_member(tmp_path):
+    runner = CliRunner()
+    store_dir = tmp_path / "store"
+    store_dir.mkdir()
+    archive = tmp_path / "a.zip"
+    with zipfile.ZipFile(archive, "w") as z:
+        z.writestr("docs/inner.txt", "inner contents")
+    know_result = runner.invoke(main, ["--dataservice", str(store_dir), "know", str(archive)])
+    cid = know_result.output.split("' --> '")[1].split("'")[0]
+    result = runner.invoke(main, ["--dataservice", str(store_dir), "extract", cid])
+    member_cid = result.output.split("STORED AS ")[1].split()[0]
+
+    listed = runner.invoke(main, ["--dataservice", str(store_dir), "list", "-p", "HAD_PATH=docs/inner.txt"])
+    found = runner.invoke(main, ["--dataservice", str(store_dir), "search", "inner", "-p", "HAD_PATH"])
+
+    assert listed.stdout.split() == [member_cid]
+    assert found.stdout.splitlines() == [f"{member_cid}\tHAD_PATH\tdocs/inner.txt"]
+
+
+def test_recall_binary_to_stdout_and_file(tmp_path):
+    runner = CliRunner()
+    store_dir = tmp_path / "store"
+    store_dir.mkdir()
+
+    data = bytes(range(256))
+    input_file = tmp_path / "blob.bin"
+    input_file.write_bytes(data)
+
+    know_result = runner.invoke(main, ["--dataservice", str(store_dir), "know", str(input_file)])
+    cid = know_result.output.split("' --> '")[1].split("'")[0]
+
+    result = runner.invoke(main, ["--dataservice", str(store_dir), "recall", "-b", cid])
+
+    assert result.exit_code == 0
+    assert result.stdout_bytes == data
+
+    output_file = tmp_path / "restored.bin"
+    result = runner.invoke(main, ["--dataservice", str(store_dir), "recall", "-o", str(output_file), cid])
+
+    assert result.exit_code == 0
+    assert output_file.read_bytes() == data
+
+
+def test_know_hardlink(tmp_path):
+    runner = CliRunner()
+    store_dir = tmp_path / "store"
+    store_dir.mkdir()
+
+    input_file = tmp_path / "hello.txt"
+    input_file.write_text("hello", encoding="utf-8")
+
+    result = runner.invoke(main, ["--dataservice", str(store_dir), "know", "--hardlink", str(input_file)])
+
+    assert result.exit_code == 0
+    assert input_file.stat().st_nlink == 2
+
+
+def test_recall_does_not_build_knowledge_service(tmp_path, monkeypatch):
+    runner = CliRunner()
+    store_dir = tmp_path / "store"
+    store_dir.mkdir()
+
+    input_file = tmp_path / "hello.txt"
+    input_file.write_text("hello", encoding="utf-8")
+
+    know_result = runner.invoke(main, ["--dataservice", str(store_dir), "know", str(input_file)])
+    cid = know_result.output.split("' --> '")[1].split("'")[0]
+
+    def fail(*args, **kwargs):
+        raise AssertionError("knowledge service built")
+
+    monkeypatch.setattr(cidni.__main__, "InMemoryKnowledgeService", fail)
+    result = runner.invoke(main, ["--dataservice", str(store_dir), "recall", cid])
+
+    assert result.exit_code == 0
+    assert "hello" in result.output
+
+
+def test_startup_time_benchmark(tmp_path):
+    store_dir = tmp_path / "store"
+    store_dir.mkdir()
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}
+
+    probe = subprocess.run(
+        [sys.executable, "-c", "import sys, cidni.__main__; print('pickledb' in sys.modules, 'sniffpy' in sys.modules)"],
+        capture_output=True, text=True, env=env, check=True,
+    )
+    assert probe.stdout.split() == ["False", "False"]
+
+    timings = []
+    for _ in range(5):
+        start = time.perf_counter()
+        done = subprocess.run(
+            [sys.executable, "-m", "cidni", "--dataservice", str(store_dir), "list"],
+            capture_output=True, env=env,
+        )
+        timings.append(time.perf_counter() - start)
+        assert done.returncode == 0, done.stderr
+    assert min(timings) < 1.0
+
+
+def test_know_recursive_skips_unchanged_files(tmp_path):
+    runner = CliRunner()
+    store_dir = tmp_path / "store"
+    store_dir.mkdir()
+
+    tree = tmp_path / "tree"
+    tree.mkdir()
+    (tree / "a.txt").write_text("a", encoding="utf-8")
+    (tree / "b.txt").write_text("b", encoding="utf-8")
+
+    result = runner.invoke(main, ["--dataservice", str(store_dir), "know", "-r", str(tree)])
+    assert "new files: 2" in result.output
+
+    (tree / "b.txt").write_text("changed", encoding="utf-8")
+    result = runner.invoke(main, ["--dataservice", str(store_dir), "know", "-r", str(tree)])
+
+    assert result.exit_code == 0
+    assert "new files: 1" in result.output
+    assert "unchanged files: 1" in result.output
+
+    result = runner.invoke(main, ["--dataservice", str(store_dir), "know", "-r", "--verify", str(tree)])
+
+    assert "already stored files: 2" in result.output
+    assert "unchanged files: 0" in result.output
+
+
+def test_know_recursive_restores_forgotten_unchanged_files(tmp_path):
+    runner = CliRunner()
+    store_dir = tmp_path / "store"
+    store_dir.mkdir()
+    tree = tmp_path / "tree"
+    tree.mkdir()
+    (tree / "a.txt").write_text("a", encoding="utf-8")
+
+    result = runner.invoke(main, ["--dataservice", str(store_dir), "know", "-r", str(tree)])
+    cid = result.output.split("' --> '")[1].split("'")[0]
+    runner.invoke(main, ["--dataservice", str(store_dir), "forget", cid])
+    result = runner.invoke(main, ["--dataservice", str(store_dir), "know", "-r", str(tree)])
+
+    assert "new files: 1" in result.output
+    assert runner.invoke(main, ["--dataservice", str(store_dir), "recall", cid]).output.strip() == "a"
+
+
+def test_triple_encoding_is_recorded_once_triples_are_written(tmp_path):
+    runner = CliRunner()
+    store_dir = tmp_path / "store"
+    store_dir.mkdir()
+    input_file = tmp_path / "hello.txt"
+    input_file.write_text("hello", encoding="utf-8")
+
+    runner.invoke(main, ["--dataservice", str(store_dir), "list", "-p", "had_path=nowhere"])
+    runner.invoke(main, ["--dataservice", str(store_dir), "search", "hello"])
+    assert not (store_dir / "triple-encoding").exists()
+
+    runner.invoke(main, ["--dataservice", str(store_dir), "know", str(input_file)])
+    assert (store_dir / "triple-encoding").read_text() == "json\n"
+
+
+def test_migrate_triples_keeps_knowledge(tmp_path):
+    runner = CliRunner()
+    store_dir = tmp_path / "store"
+    store_dir.mkdir()
+
+    input_file = tmp_path / "hello.txt"
+    input_file.write_text("hello", encoding="utf-8")
+
+    know_result = runner.invoke(main, ["--dataservice", str(store_dir), "know", str(input_file)])
+    cid = know_result.output.split("' --> '")[1].split("'")[0]
+
+    result = runner.invoke(main, ["--dataservice", str(store_dir), "--triple-encoding", "binary", "migrate-triples"])
+
+    assert result.exit_code == 0
+    assert "migrated triples: 8" in result.output
+
+    result = runner.invoke(main, ["--dataservice", str(store_dir), "--triple-encoding", "binary", "list", "-p", f"had_path={input_file}"])
+
+    assert cid in result.output
+    mismatched = runner.invoke(main, ["--dataservice", str(store_dir), "list", "-p", f"had_path={input_file}"])
+    assert mismatched.exit_code != 0 and "binary encoded" in mismatched.output
+
+
+def test_stats_accumulate_across_commands(tmp_path):
+    runner = CliRunner()
+    store_dir = tmp_path / "store"
+    store_dir.mkdir()
+    stats_file = tmp_path / "stats.json"
+
+    input_file = tmp_path / "hello.txt"
+    input_file.write_text("hello", encoding="utf-8")
+
+    runner.invoke(main, ["--dataservice", str(store_dir), "--stats-file", str(stats_file), "know", str(input_file)])
+    runner.invoke(main, ["--dataservice", str(store_dir), "--stats-file", str(stats_file), "know", str(input_file)])
+
+    result = runner.invoke(main, ["--dataservice", str(store_dir), "--stats-file", str(stats_file), "stats"])
+
+    assert result.exit_code == 0
+    stats = json.loads(result.stdout)
+    assert stats["operations"]["FileBasedDataService.know_file"]["count"] == 2
+    assert stats["operations"]["InMemoryKnowledgeService.believe_many"]["count"] == 4
+
+    runner.invoke(main, ["--dataservice", str(store_dir), "--stats-file", str(stats_file), "stats", "--reset"])
+
+    assert not stats_file.exists()
+
+
+def test_no_progress_silences_dots(tmp_path):
+    runner = CliRunner()
+    store_dir = tmp_path / "store"
+    store_dir.mkdir()
+
+    input_file = tmp_path / "hello.txt"
+    input_file.write_text("hello", encoding="utf-8")
+
+    result = runner.invoke(main, ["--dataservice", str(store_dir), "--no-progress", "know", str(input_file)])
+
+    assert result.exit_code == 0
+    assert not result.stderr.startswith(".")
+
+    input_file.write_text("changed", encoding="utf-8")
+    result = runner.invoke(main, ["--dataservice", str(store_dir), "know", str(input_file)])
+
+    assert result.stderr.startswith(".")
+
+
+def test_profile_writes_stats_and_phase_breakdown(tmp_path):
+    runner = CliRunner()
+    store_dir = tmp_path / "store"
+    store_dir.mkdir()
+    profile = tmp_path / "know.prof"
+
+    input_file = tmp_path / "hello.txt"
+    input_file.write_text("hello", encoding="utf-8")
+
+    result = runner.invoke(main, ["--dataservice", str(store_dir), "--profile", str(profile), "know", str(input_file)])
+
+    assert result.exit_code == 0
+    assert profile.exists()
+    for phase in ("startup", "knowledge service load", "hashing", "blob I/O", "metadata writes", "flush", "total"):
+        assert phase in result.stderr
+
+
+def test_profile_flush_phase_counts_file_store_commits(tmp_path):
+    import cProfile
+    import pstats
+    from cidnilib import FileBasedDataService
+    ds = FileBasedDataService(str(tmp_path), durability="group")
+    ds.know("hello")
+    profiler = cProfile.Profile()
+    profiler.runcall(ds.close)
+
+    assert cidni.__main__.phase_breakdown(pstats.Stats(profiler))["flush"] > 0
+
+
+def test_list_pages_with_prefix_after_and_limit(tmp_path):
+    runner = CliRunner()
+    store_dir = tmp_path / "store"
+    store_dir.mkdir()
+    for i in range(5):
+        (tmp_path / f"f{i}.txt").write_text(str(i), encoding="utf-8")
+        runner.invoke(main, ["--dataservice", str(store_dir), "know", str(tmp_path / f"f{i}.txt")])
+
+    listed = runner.invoke(main, ["--dataservice", str(store_dir), "list"]).stdout.split()
+    assert listed == sorted(listed)
+
+    first = runner.invoke(main, ["--dataservice", str(store_dir), "list", "--limit", "2"])
+    assert first.stdout.split() == listed[:2]
+    assert f"--after {listed[1]}" in first.stderr
+
+    rest = runner.invoke(main, ["--dataservice", str(store_dir), "list", "--after", listed[1]])
+    assert rest.stdout.split() == listed[2:]
+
+    prefix = listed[3][:5]
+    filtered = runner.invoke(main, ["--dataservice", str(store_dir), "list", "--prefix", prefix])
+    assert filtered.stdout.split() == [cid for cid in listed if cid.startswith(prefix)]
+
+
+def test_list_by_property_range_and_prefix(tmp_path):
+    runner = CliRunner()
+    store_dir = tmp_path / "store"
+    store_dir.mkdir()
+    (tmp_path / "projects").mkdir()
+    old_file = tmp_path / "old.txt"
+    old_file.write_text("old", encoding="utf-8")
+    os.utime(old_file, (1000, 1000))
+    new_file = tmp_path / "projects" / "new.txt"
+    new_file.write_text("new", encoding="utf-8")
+    os.utime(new_file, (5000, 5000))
+
+    cids = {}
+    for f in (old_file, new_file):
+        result = runner.invoke(main, ["--dataservice", str(store_dir), "know", str(f)])
+        cids[f] = result.stdout.split("' --> '")[1].split("'")[0]
+
+    under = runner.invoke(main, ["--dataservice", str(store_dir), "list", "-p", f"had_path^={tmp_path / 'projects'}/"])
+    assert under.stdout.split() == [cids[new_file]]
+
+    recent = runner.invoke(main, ["--dataservice", str(store_dir), "list", "-p", "last_modified>=5000"])
+    older = runner.invoke(main, ["--dataservice", str(store_dir), "list", "-p", "last_modified<5000"])
+    assert recent.stdout.split() == [cids[new_file]]
+    assert older.stdout.split() == [cids[old_file]]
+    assert runner.invoke(main, ["--dataservice", str(store_dir), "list", "-p", "last_modified>5000"]).stdout == ""
+
+
+def test_search_finds_paths_mentioning_words(tmp_path):
+    runner = CliRunner()
+    store_dir = tmp_path / "store"
+    store_dir.mkdir()
+    invoice = tmp_path / "Invoices_2024.txt"
+    invoice.write_text("invoice", encoding="utf-8")
+    other = tmp_path / "notes.txt"
+    other.write_text("notes", encoding="utf-8")
+    for f in (invoice, other):
+        runner.invoke(main, ["--dataservice", str(store_dir), "know", str(f)])
+
+    result = runner.invoke(main, ["--dataservice", str(store_dir), "search", "invoice", "-p", "had_path"])
+
+    assert result.exit_code == 0
+    lines = result.stdout.splitlines()
+    assert len(lines) == 1
+    assert lines[0].endswith(f"\thad_path\t{invoice}")
+
+
+def test_serve_exposes_store_over_http(tmp_path):
+    from cidnilib import HttpDataService
+    store_dir = tmp_path / "store"
+    store_dir.mkdir()
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "cidni", "--dataservice", str(store_dir), "serve", "--port", "0"],
+        stderr=subprocess.PIPE, text=True, env=env,
+    )
+    try:
+        url = server.stderr.readline().split(" on ")[-1].strip()
+        with HttpDataService(url) as client:
+            cid, isnew = client.know(b"served")
+            assert isnew
+            assert client.recall(cid) == b"served"
+        assert (store_dir / "cids.idx").exists()
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def test_sync_copies_data_and_triples_between_stores(tmp_path):
+    runner = CliRunner()
+    a, b = tmp_path / "a", tmp_path / "b"
+    a.mkdir()
+    b.mkdir()
+    for name in ("one", "two"):
+        (tmp_path / name).write_text(name, encoding="utf-8")
+        runner.invoke(main, ["--dataservice", str(a), "know", str(tmp_path / name)])
+
+    result = runner.invoke(main, ["--no-progress", "sync", str(a), str(b)])
+
+    assert result.exit_code == 0, result.output
+    assert "data: copied 2" in result.output
+    listed = runner.invoke(main, ["--dataservice", str(b), "list", "-p", f"had_path={tmp_path / 'one'}"])
+    assert len(listed.output.split()) == 1
+    again = runner.invoke(main, ["sync", str(a), str(b)])
+    assert "data: copied 0, shards differing 0 of 1" in again.output
+    assert runner.invoke(main, ["sync", str(a), str(tmp_path / "missing")]).exit_code != 0
+
+
+def test_dataservice_stripes_over_several_directories(tmp_path):
+    runner = CliRunner()
+    roots = [tmp_path / "disk1", tmp_path / "disk2"]
+    for root in roots:
+        root.mkdir()
+    stores = os.pathsep.join(map(str, roots))
+    cids = []
+    for i in range(20):
+        (tmp_path / f"file{i}").write_text(f"contents {i}", encoding="utf-8")
+        result = runner.invoke(main, ["--dataservice", stores, "know", str(tmp_path / f"file{i}")])
+        cids.append(result.output.split("' --> '")[1].split("'")[0])
+
+    listed = runner.invoke(main, ["--dataservice", stores, "list"]).output.split()
+    recalled = runner.invoke(main, ["--dataservice", stores, "recall", cids[7]]).output
+
+    assert sorted(listed) == sorted(cids)
+    assert recalled.strip() == "contents 7"
+    assert all(list(root.rglob("*.bin")) for root in roots)
+    assert (roots[0] / "pickle.db").exists() and not (roots[1] / "pickle.db").exists()
+
+
+def test_adding_a_directory_to_dataservice_keeps_data_reachable(tmp_path):
+    runner = CliRunner()
+    roots = [tmp_path / "disk1", tmp_path / "disk2"]
+    for root in roots:
+        root.mkdir()
+    stores = os.pathsep.join(map(str, roots))
+    cids = []
+    for i in range(20):
+        (tmp_path / f"file{i}").write_text(f"contents {i}", encoding="utf-8")
+        result = runner.invoke(main, ["--dataservice", str(roots[0]), "know", str(tmp_path / f"file{i}")])
+        cids.append(result.output.split("' --> '")[1].split("'")[0])
+
+    def recall_all():
+        return [runner.invoke(main, ["--dataservice", stores, "recall", cid]).output.strip() for cid in cids]
+
+    assert recall_all() == [f"contents {i}" for i in range(20)]
+    assert sorted(runner.invoke(main, ["--dataservice", stores, "list"]).output.split()) == sorted(cids)
+    result = runner.invoke(main, ["--dataservice", stores, "rebalance"])
+    assert result.exit_code == 0 and "moved: " in result.output
+    assert recall_all() == [f"contents {i}" for i in range(20)]
+    assert list(roots[1].rglob("*.bin"))
+    assert runner.invoke(main, ["--dataservice", str(roots[0]), "list"]).exit_code != 0
+
+
+def test_stored_files_are_in_place_when_command_exits(tmp_path):
+    runner = CliRunner()
+    store_dir = tmp_path / "store"
+    store_dir.mkdir()
+    (tmp_path / "hello.txt").write_text("hello", encoding="utf-8")
+
+    for durability in ("group", "strict"):
+        result = runner.invoke(main, ["--durability", durability, "--dataservice", str(store_dir), "know", str(tmp_path / "hello.txt")])
+        assert result.exit_code == 0, result.output
+
+    assert len(list(store_dir.rglob("*.bin"))) == 1
+    assert not [path for path in store_dir.iterdir() if path.name.endswith(".tmp")]
+
+
+def test_list_transitive_finds_every_containing_archive(tmp_path):
+    import io
+    from cidnilib import InMemoryDataService
+    runner = CliRunner()
+    store_dir = tmp_path / "store"
+    store_dir.mkdir()
+    inner = io.BytesIO()
+    with zipfile.ZipFile(inner, "w") as z:
+        z.writestr("leaf.txt", "leaf contents")
+    archive = tmp_path / "outer.zip"
+    with zipfile.ZipFile(archive, "w") as z:
+        z.writestr("inner.zip", inner.getvalue())
+    memory = InMemoryDataService()
+    leaf, inner_cid = (memory.encode(memory.know(data)[0]) for data in (b"leaf contents", inner.getvalue()))
+
+    know_result = runner.invoke(main, ["--dataservice", str(store_dir), "know", str(archive)])
+    outer_cid = know_result.output.split("' --> '")[1].split("'")[0]
+    runner.invoke(main, ["--dataservice", str(store_dir), "extract", "-r", outer_cid])
+
+    direct = runner.invoke(main, ["--dataservice", str(store_dir), "list", "-p", f"CONTAINS={leaf}"])
+    result = runner.invoke(main, ["--dataservice", str(store_dir), "list", "-p", f"CONTAINS={leaf}", "--transitive"])
+
+    assert direct.output.split() == [inner_cid]
+    assert sorted(result.output.split()) == sorted([inner_cid, outer_cid])
+    assert runner.invoke(main, ["--dataservice", str(store_dir), "list", "--transitive"]).exit_code != 0
+
+
+def test_list_returns_exactly_the_stored_blobs(tmp_path):
+    runner = CliRunner()
+    store_dir = tmp_path / "store"
+    store_dir.mkdir()
+    cids = []
+    for name in ("a.txt", "b.txt"):
+        (tmp_path / name).write_text(name, encoding="utf-8")
+        result = runner.invoke(main, ["--dataservice", str(store_dir), "know", str(tmp_path / name)])
+        cids.append(result.output.split("' --> '")[1].split("'")[0])
+
+    listed = runner.invoke(main, ["--dataservice", str(store_dir), "list"]).output.split()
+
+    assert sorted(listed) == sorted(cids)
+    unknown = runner.invoke(main, ["--dataservice", str(store_dir), "recall", "QmUnknownCid"])
+    assert unknown.exit_code != 0 and "unknown content-id" in unknown.output